@@ -0,0 +1,74 @@
+'''
+Tailcut cleaning of many images of one camera type at once. The
+neighbours of the pixels are counted for all images with products of
+the sparse neighbour matrix and the stacked masks instead of calling
+ctapipe's tailcuts_clean for each telescope.
+'''
+
+import numpy as np
+
+
+def tailcuts_clean_batch(neighbor_matrix, images, picture_thresh=7, boundary_thresh=5,
+                         keep_isolated_pixels=False, min_number_picture_neighbors=0):
+    '''
+    Clean stacked images of one camera type with the two threshold
+    tailcut procedure of ctapipe's tailcuts_clean (ctapipe 0.6). Pixels
+    above the picture threshold with at least
+    min_number_picture_neighbors neighbours above the picture threshold
+    are in the picture, pixels above the boundary threshold are added
+    if they have a neighbour in the picture. Picture pixels without a
+    neighbour above the boundary threshold are removed unless
+    keep_isolated_pixels is True. The masks are identical to those of
+    tailcuts_clean for each image.
+
+    Parameters
+    ----------
+    neighbor_matrix : scipy.sparse.csr_matrix
+        boolean neighbour matrix of the camera, e.g.
+        neighbor_matrix_sparse of CameraGeometryInfo
+    images : numpy.array
+        images with shape (number of images, number of pixels)
+    picture_thresh, boundary_thresh : float or numpy.array
+        thresholds broadcast against the images, e.g. one per pixel or
+        with shape (number of images, 1) one per image
+    keep_isolated_pixels : bool
+        if True, pixels in the picture are kept even without neighbours
+        above the boundary threshold
+    min_number_picture_neighbors : int
+        minimum number of neighbours above the picture threshold of
+        pixels in the picture, no effect if keep_isolated_pixels is True
+
+    Returns
+    -------
+    mask : numpy.array
+        boolean masks of the clean pixels with the shape of images
+    '''
+    images = np.asarray(images)
+
+    if (images.ndim != 2) or (images.shape[1] != neighbor_matrix.shape[0]):
+        raise AttributeError("Shape of images {} and neighbor matrix {} does not match".format(
+            images.shape, neighbor_matrix.shape))
+
+    # the pixels are along the first axis for the products with the
+    # neighbour matrix, which is symmetric
+    pixels_above_picture = (images >= picture_thresh).T
+
+    if keep_isolated_pixels or min_number_picture_neighbors == 0:
+        pixels_in_picture = pixels_above_picture
+    else:
+        number_of_neighbors_above_picture = neighbor_matrix.dot(
+            pixels_above_picture.view(np.byte))
+        pixels_in_picture = pixels_above_picture & (
+            number_of_neighbors_above_picture >= min_number_picture_neighbors)
+
+    pixels_above_boundary = (images >= boundary_thresh).T
+    pixels_with_picture_neighbors = neighbor_matrix.dot(pixels_in_picture)
+
+    if keep_isolated_pixels:
+        mask = (pixels_above_boundary & pixels_with_picture_neighbors) | pixels_in_picture
+    else:
+        pixels_with_boundary_neighbors = neighbor_matrix.dot(pixels_above_boundary)
+        mask = ((pixels_above_boundary & pixels_with_picture_neighbors)
+                | (pixels_in_picture & pixels_with_boundary_neighbors))
+
+    return np.ascontiguousarray(mask.T)
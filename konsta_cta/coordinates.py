@@ -0,0 +1,99 @@
+'''
+Coordinate transformations working on plain numpy arrays. They avoid
+the overhead of the astropy frame machinery when many telescopes and
+events have to be transformed.
+'''
+
+import numpy as np
+
+
+def horizon_to_camera(alt, az, pointing_alt, pointing_az, focal_length):
+    '''
+    Project directions given in the horizon system into the camera
+    of telescopes. This is the same projection as performed by
+    transforming a HorizonFrame coordinate into the CameraFrame in
+    ctapipe (altaz_to_offset from hessioxxx kin.c, consistent with
+    sim_telarray, followed by the scaling with the focal length).
+
+    All inputs are broadcast against each other, so arrays of
+    telescopes and events can be transformed at once.
+
+    The positions agree with those of ctapipe (and
+    LookupGenerator.get_position_in_cam) within 1e-6 m for offsets up to
+    5 deg and the focal lengths of all cameras, which is checked in
+    tests/test_coordinates.py. ctapipe >= 0.6.2 scales
+    the angles to the pointing with the focal length instead of
+    projecting gnomonically, these positions differ by up to
+    f (tan(offset) - offset), e.g. about 1.3 mm at 3 deg for f = 28 m.
+
+    Parameters
+    ----------
+    alt : float or numpy.array
+        altitude of the directions in radians
+    az : float or numpy.array
+        azimuth of the directions in radians
+    pointing_alt : float or numpy.array
+        altitude of the telescope pointing in radians
+    pointing_az : float or numpy.array
+        azimuth of the telescope pointing in radians
+    focal_length : float or numpy.array
+        focal length of the telescopes
+
+    Returns
+    -------
+    x, y : numpy.array
+        position in the cameras in units of the focal length
+    '''
+    delta_az = az - pointing_az
+    cos_alt = np.cos(alt)
+
+    # direction in the system of the telescope at zero altitude
+    x_0 = -np.cos(delta_az) * cos_alt
+    y_0 = np.sin(delta_az) * cos_alt
+    z_0 = np.sin(alt)
+
+    # rotate to the altitude of the pointing
+    sin_pointing = np.sin(pointing_alt)
+    cos_pointing = np.cos(pointing_alt)
+    x_1 = sin_pointing * x_0 + cos_pointing * z_0
+    z_1 = -cos_pointing * x_0 + sin_pointing * z_0
+
+    # gnomonic projection onto the focal plane
+    x = focal_length * x_1 / z_1
+    y = focal_length * y_0 / z_1
+
+    return x, y
+
+
+def angular_distance(lon1, lat1, lon2, lat2):
+    '''
+    Angular distance between two directions on the sphere, e.g. given
+    by azimuth and altitude. The same formula (Vincenty) as in
+    astropy.coordinates.angle_utilities.angular_separation is used, but
+    on plain arrays, so that the distances for many telescopes are
+    calculated in one call.
+
+    Parameters
+    ----------
+    lon1, lat1 : float or numpy.array
+        longitude and latitude of the first directions in radians
+    lon2, lat2 : float or numpy.array
+        longitude and latitude of the second directions in radians
+
+    Returns
+    -------
+    distance : numpy.array
+        angular distance in radians
+    '''
+    sin_dlon = np.sin(lon2 - lon1)
+    cos_dlon = np.cos(lon2 - lon1)
+    sin_lat1 = np.sin(lat1)
+    sin_lat2 = np.sin(lat2)
+    cos_lat1 = np.cos(lat1)
+    cos_lat2 = np.cos(lat2)
+
+    num1 = cos_lat2 * sin_dlon
+    num2 = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_dlon
+    denominator = sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_dlon
+
+    return np.arctan2(np.hypot(num1, num2), denominator)
@@ -1,5 +1,5 @@
 import numpy as np
-from itertools import chain
+from scipy.sparse import csr_matrix
 
 
 class MultiplicityException(Exception):
@@ -9,13 +9,115 @@ class MultiplicityException(Exception):
     pass
 
 
+class CameraGeometryInfo(object):
+    '''
+    Quantities of a camera geometry used by the quality cuts and the
+    batched image cleaning and parametrization.
+
+    Attributes
+    ----------
+    edge_pixels : indices of the pixels in the edge of the camera
+    edge_mask : boolean mask, True for the pixels in the edge
+    mean_radius : mean distance of the pixels in the outermost row
+        to the center of the camera
+    max_radius : distance of the pixel furthest away from the center
+    neighbor_indptr, neighbor_indices : neighbours of the pixels in
+        compressed sparse row format, the neighbours of pixel i are
+        neighbor_indices[neighbor_indptr[i]:neighbor_indptr[i + 1]]
+    neighbor_matrix_sparse : boolean neighbour matrix as
+        scipy.sparse.csr_matrix of the same indices
+    pix_x, pix_y : coordinates of the pixels as float64 arrays in
+        units of pix_unit
+    pix_unit : unit of the pixel coordinates
+    '''
+
+    __slots__ = ("edge_pixels", "edge_mask", "mean_radius", "max_radius",
+                 "neighbor_indptr", "neighbor_indices", "neighbor_matrix_sparse",
+                 "pix_x", "pix_y", "pix_unit")
+
+    def __init__(self, camera, rows=1):
+        '''
+        Parameters
+        ----------
+        camera : CameraGeometry
+        rows : number of rows considered as edge
+        '''
+        if camera.pix_type == "hexagonal":
+            expected_number_neigbours = 6
+        else:
+            expected_number_neigbours = 4
+
+        neighbor_matrix = np.asarray(camera.neighbor_matrix, dtype=bool)
+        radius = np.sqrt(camera.pix_x ** 2 + camera.pix_y ** 2)
+
+        # get the most most outer row
+        outer_mask = neighbor_matrix.sum(axis=0) < expected_number_neigbours
+        self.mean_radius = radius[outer_mask].mean()
+        self.max_radius = radius.max()
+
+        self.edge_mask = outer_mask
+        for i in range(rows - 1):
+            # iteratively adding one line: all neighbours of the current edge
+            self.edge_mask = neighbor_matrix[self.edge_mask].any(axis=0)
+        self.edge_pixels = np.flatnonzero(self.edge_mask)
+
+        self.neighbor_indptr = np.concatenate(([0], np.cumsum(neighbor_matrix.sum(axis=1))))
+        self.neighbor_indices = np.nonzero(neighbor_matrix)[1]
+        self.neighbor_matrix_sparse = csr_matrix(
+            (np.ones(len(self.neighbor_indices), dtype=bool), self.neighbor_indices,
+             self.neighbor_indptr), shape=neighbor_matrix.shape)
+
+        self.pix_unit = camera.pix_x.unit
+        self.pix_x = np.asarray(camera.pix_x.to_value(self.pix_unit), dtype=np.float64)
+        self.pix_y = np.asarray(camera.pix_y.to_value(self.pix_unit), dtype=np.float64)
+
+
+class CameraGeometryCache(object):
+    '''
+    Process wide cache of `CameraGeometryInfo`, keyed by the camera ID
+    and the number of rows of the edge. The quantities of each camera
+    are computed once and shared by all events.
+    '''
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, camera, rows=1):
+        '''
+        Get the quantities of a camera geometry.
+
+        Parameters
+        ----------
+        camera : CameraGeometry
+        rows : number of rows considered as edge
+
+        Returns
+        -------
+        info : CameraGeometryInfo
+        '''
+        key = (camera.cam_id, rows)
+        try:
+            return self._entries[key]
+        except KeyError:
+            info = CameraGeometryInfo(camera, rows)
+            self._entries[key] = info
+            return info
+
+    def clear(self):
+        self._entries.clear()
+
+
+# geometries used by the quality cuts of all `Cutter` instances
+camera_geometry_cache = CameraGeometryCache()
+
+
 class Cutter(object):
     '''
     Base class to reject objects and apply quality cuts.
     '''
 
     def __init__(self):
-        pass
+        self.geometry_cache = camera_geometry_cache
 
     def get_edge_pixels(self, camera, rows=1):
         '''
@@ -30,26 +132,7 @@ class Cutter(object):
         -------
         indices of the boundary pixels of the camera
         '''
-
-        if camera.pix_type == "hexagonal":
-            expected_number_neigbours = 6
-        else:
-            expected_number_neigbours = 4
-
-        number_pixels = camera.pix_id[-1] + 1
-
-        # get the most most outer row
-        N_neig = sum(camera.neighbor_matrix)
-        neigh = np.arange(0, number_pixels) \
-            [N_neig < expected_number_neigbours]
-
-        for i in range(rows - 1):
-            # iteratively adding one line:
-            neigh = np.array(camera.neighbors)[neigh]
-            neigh = neigh.tolist()
-            neigh = np.unique(list(chain.from_iterable(neigh)))
-
-        return neigh
+        return self.geometry_cache.get(camera, rows).edge_pixels
 
     def leakage_cut(self, camera, hillas_parameters=None,
                     radius=0.8, max_dist="mean", image=None,
@@ -90,17 +173,10 @@ class Cutter(object):
         elif method == "radius":
             # get the maximum distance from camera
             if max_dist == "max":
-                max_dist_camera = max(np.sqrt(camera.pix_x ** 2 + camera.pix_y ** 2))
+                max_dist_camera = self.geometry_cache.get(camera).max_radius
 
             elif max_dist == "mean":
-                try:
-                    edge_pix = self.edge_pixels[camera.cam_id]
-                except KeyError:
-                    edge_pix = self.get_edge_pixels(camera)
-                    self.edge_pixels[camera.cam_id] = edge_pix
-
-                max_dist_camera = sum(np.sqrt(camera.pix_x ** 2 + \
-                                              camera.pix_y ** 2)[edge_pix]) / len(edge_pix)
+                max_dist_camera = self.geometry_cache.get(camera).mean_radius
             else:
                 raise KeyError("The method {} for calculating "
                                "max_dist_camera is not known.".format(method))
@@ -110,14 +186,10 @@ class Cutter(object):
             return (hillas_parameters.r < accepted_dist)
 
         elif method == "fraction":
-            try:
-                edge_pix = self.edge_pixels[camera.cam_id]
-            except KeyError:
-                edge_pix = self.get_edge_pixels(camera, rows)
-                self.edge_pixels[camera.cam_id] = edge_pix
+            edge_mask = self.geometry_cache.get(camera, rows).edge_mask
 
             # fraction of charge in edge
-            frac = sum(image[edge_pix]) / sum(image)
+            frac = image[edge_mask].sum() / image.sum()
 
             return frac <= fraction
 
@@ -0,0 +1,154 @@
+'''
+Hillas parametrization of many images of one camera type at once. The
+moments of all images are computed with one set of array operations
+instead of calling ctapipe's hillas_parameters for each telescope.
+'''
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import Angle
+from ctapipe.io.containers import HillasParametersContainer
+
+# fields of the structured array returned by hillas_parameters_batch,
+# lengths are in the unit of the pixel coordinates and angles in radians
+hillas_dtype = np.dtype([("intensity", np.float64),
+                         ("x", np.float64),
+                         ("y", np.float64),
+                         ("r", np.float64),
+                         ("phi", np.float64),
+                         ("length", np.float64),
+                         ("width", np.float64),
+                         ("psi", np.float64),
+                         ("skewness", np.float64),
+                         ("kurtosis", np.float64)])
+
+
+def hillas_parameters_batch(pix_x, pix_y, images):
+    '''
+    Compute the Hillas parameters of stacked images of one camera type.
+    The parameters are the same as those of ctapipe's hillas_parameters
+    (ctapipe 0.6): the centre of gravity, the width and length from the
+    eigenvalues of the weighted covariance, the angle psi of the major
+    axis and the skewness and kurtosis along the major axis.
+
+    Images without any signal can not be parametrized, all parameters
+    but the intensity are NaN for them instead of raising
+    HillasParameterizationError. The width of images with all pixels in
+    one line and the length of single pixel images are 0, while
+    ctapipe returns values of the order of the rounding error or NaN.
+
+    Parameters
+    ----------
+    pix_x, pix_y : numpy.array
+        coordinates of the pixels of the camera, without unit
+    images : numpy.array
+        cleaned images with shape (number of images, number of pixels),
+        pixels not surviving the cleaning have to be 0
+
+    Returns
+    -------
+    hillas : numpy.array
+        structured array of dtype hillas_dtype with one entry per image
+    '''
+    pix_x = np.asarray(pix_x, dtype=np.float64)
+    pix_y = np.asarray(pix_y, dtype=np.float64)
+    images = np.asarray(images, dtype=np.float64)
+
+    if (images.ndim != 2) or not (pix_x.shape == pix_y.shape == images.shape[1:]):
+        raise AttributeError("Shape of images {} and pixels {} does not match".format(
+            images.shape, pix_x.shape))
+
+    hillas = np.empty(len(images), dtype=hillas_dtype)
+
+    # only the pixels surviving the cleaning contribute, the sums over the
+    # pixels of each image are done with bincount on the image index
+    image_index, pixel = np.nonzero(images)
+    weight = images[image_index, pixel]
+    x = pix_x[pixel]
+    y = pix_y[pixel]
+
+    def image_sum(values):
+        return np.bincount(image_index, weights=values, minlength=len(images))
+
+    size = image_sum(weight)
+    hillas["intensity"] = size
+
+    valid = size != 0
+    size[~valid] = np.nan
+
+    # centre of gravity as mean of the coordinates weighted with the image
+    cog_x = image_sum(weight * x) / size
+    cog_y = image_sum(weight * y) / size
+
+    delta_x = x - cog_x[image_index]
+    delta_y = y - cog_y[image_index]
+
+    # weighted covariance of each image, as np.cov with ddof=0
+    cov = np.zeros((len(images), 2, 2))
+    cov[:, 0, 0] = image_sum(weight * delta_x ** 2) / size
+    cov[:, 1, 1] = image_sum(weight * delta_y ** 2) / size
+    cov[:, 0, 1] = cov[:, 1, 0] = image_sum(weight * delta_x * delta_y) / size
+    cov[~valid] = 0
+
+    eig_vals, eig_vecs = np.linalg.eigh(cov)
+
+    # images with all pixels in one line or a single pixel have eigenvalues
+    # of 0, which are slightly negative due to rounding
+    width, length = np.sqrt(np.clip(eig_vals, 0, None)).T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # angle of the eigenvector of the length to the x-axis
+        psi = np.arctan(eig_vecs[:, 1, 1] / eig_vecs[:, 0, 1])
+
+        # higher order moments along the shower axis
+        longitudinal = (delta_x * np.cos(psi)[image_index]
+                        + delta_y * np.sin(psi)[image_index])
+
+        skewness = image_sum(weight * longitudinal ** 3) / size / length ** 3
+        kurtosis = image_sum(weight * longitudinal ** 4) / size / length ** 4
+
+    hillas["x"] = cog_x
+    hillas["y"] = cog_y
+    hillas["r"] = np.hypot(cog_x, cog_y)
+    hillas["phi"] = np.arctan2(cog_y, cog_x)
+    hillas["length"] = length
+    hillas["width"] = width
+    hillas["psi"] = psi
+    hillas["skewness"] = skewness
+    hillas["kurtosis"] = kurtosis
+
+    for name in hillas_dtype.names[1:]:
+        hillas[name][~valid] = np.nan
+
+    return hillas
+
+
+def hillas_container(hillas, unit=u.m):
+    '''
+    Convert one entry of hillas_parameters_batch to the container
+    returned by ctapipe's hillas_parameters, e.g. to pass it to the
+    HillasReconstructor.
+
+    Parameters
+    ----------
+    hillas : numpy.void
+        entry of the structured array of hillas_parameters_batch
+    unit : astropy.units.Unit
+        unit of the pixel coordinates
+
+    Returns
+    -------
+    HillasParametersContainer
+    '''
+    return HillasParametersContainer(
+        x=u.Quantity(hillas["x"], unit),
+        y=u.Quantity(hillas["y"], unit),
+        r=u.Quantity(hillas["r"], unit),
+        phi=Angle(hillas["phi"], unit=u.rad),
+        intensity=hillas["intensity"],
+        length=u.Quantity(hillas["length"], unit),
+        width=u.Quantity(hillas["width"], unit),
+        psi=Angle(hillas["psi"], unit=u.rad),
+        skewness=hillas["skewness"],
+        kurtosis=hillas["kurtosis"],
+    )
@@ -1,5 +1,8 @@
 from .direction_LUT import LookupGenerator
 from .diffuse_LUT import DiffuseLUT
-from .lookup_base import LookupFailedError
+from .lookup_base import LookupFailedError, LUTAccumulator, LUTAxis, lut_registry
+from .lut_table import LUTTable, SparseLUTTable
+from .quantile_sketch import QuantileSketch
+from .shared_lut import SharedLUT
 
-__all__ = ['LookupFailedError', 'LookupGenerator', 'DiffuseLUT']
\ No newline at end of file
+__all__ = ['LookupFailedError', 'LUTAccumulator', 'LUTAxis', 'LUTTable', 'SparseLUTTable', 'QuantileSketch', 'SharedLUT', 'lut_registry', 'LookupGenerator', 'DiffuseLUT']
\ No newline at end of file
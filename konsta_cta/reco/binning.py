@@ -0,0 +1,116 @@
+"""
+Vectorized binned statistics used to build the LUTs.
+"""
+
+import numpy as np
+
+
+def bin_indices(sample, edges):
+    """
+    Get the bin of each entry of a N dimensional sample. The bins are
+    closed on the left, edges[i] <= x < edges[i + 1], except the last
+    bin of each dimension which also contains its right edge. This is
+    the same rule as used by numpy.histogramdd.
+
+    Parameters
+    ----------
+    sample : numpy.array
+        array of shape (N, D) with N entries in D dimensions
+    edges : list
+        one array with the bin edges for each of the D dimensions
+
+    Returns
+    -------
+    index : numpy.array
+        index of the bin in the flattened histogram for each entry
+        inside of the binning
+    valid : numpy.array
+        boolean mask, False for entries outside of the binning or
+        with NaNs
+    """
+    sample = np.asarray(sample, dtype=float)
+    if sample.ndim == 1:
+        sample = sample[:, np.newaxis]
+
+    shape = tuple(len(edge) - 1 for edge in edges)
+    valid = np.ones(len(sample), dtype=bool)
+
+    multi_index = []
+    for i, edge in enumerate(edges):
+        index = np.searchsorted(edge, sample[:, i], side="right") - 1
+        # entries on the rightmost edge belong to the last bin
+        index[sample[:, i] == edge[-1]] = len(edge) - 2
+        valid &= (index >= 0) & (index < len(edge) - 1)
+        multi_index.append(index)
+
+    multi_index = tuple(index[valid] for index in multi_index)
+    index = np.ravel_multi_index(multi_index, shape)
+
+    return index, valid
+
+
+def binned_statistic(values, sample, edges):
+    """
+    Number of entries, sum and sum of squares of values in the bins
+    of a N dimensional histogram, computed in a single pass over the
+    sample.
+
+    Parameters
+    ----------
+    values : numpy.array
+        array of length N with the values to sum up
+    sample : numpy.array
+        array of shape (N, D) with the positions of the entries
+    edges : list
+        one array with the bin edges for each of the D dimensions
+
+    Returns
+    -------
+    count : numpy.array
+        number of entries in each bin
+    total : numpy.array
+        sum of the values in each bin
+    total_sq : numpy.array
+        sum of the squared values in each bin
+    """
+    shape = tuple(len(edge) - 1 for edge in edges)
+    size = int(np.prod(shape))
+
+    index, valid = bin_indices(sample, edges)
+    values = np.asarray(values, dtype=float)[valid]
+
+    count = np.bincount(index, minlength=size).reshape(shape)
+    total = np.bincount(index, weights=values, minlength=size).reshape(shape)
+    total_sq = np.bincount(index, weights=values ** 2, minlength=size).reshape(shape)
+
+    return count, total, total_sq
+
+
+def binned_mean(values, sample, edges):
+    """
+    Number of entries, sum and mean of values in the bins of a N
+    dimensional histogram. Empty bins have a mean of NaN.
+
+    Parameters
+    ----------
+    values : numpy.array
+        array of length N with the values to average
+    sample : numpy.array
+        array of shape (N, D) with the positions of the entries
+    edges : list
+        one array with the bin edges for each of the D dimensions
+
+    Returns
+    -------
+    count : numpy.array
+        number of entries in each bin
+    total : numpy.array
+        sum of the values in each bin
+    mean : numpy.array
+        mean of the values in each bin
+    """
+    count, total, _ = binned_statistic(values, sample, edges)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+
+    return count, total, mean
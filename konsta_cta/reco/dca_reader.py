@@ -0,0 +1,61 @@
+"""
+Chunked reading of the DCA feature lists written in the mode
+write_list_dca of analyse_file_write_list.py.
+"""
+
+import numpy as np
+import tables
+
+
+def iter_dca_blocks(file, key="/dca_list", columns=("dca2", "intensity", "ratio"),
+                    chunksize=100000):
+    """
+    Read the DCA feature list of a HDF5 file in chunks of fixed size.
+    Only the required columns are read from the PyTables table, rows
+    with NaNs or infs in any of them are dropped and the entries are
+    yielded per camera as numeric blocks, so that the memory used is
+    bounded by the chunk size.
+
+    Parameters
+    ----------
+    file : string
+        HDF5 file with the DCA feature list
+    key : string
+        path to the table in the HDF5 file
+    columns : tuple or list
+        columns of the blocks. Besides the columns of the table, the
+        ratio of width to length can be requested as "ratio".
+    chunksize : integer
+        number of rows read at once
+
+    Yields
+    ------
+    cam_id : string
+        camera ID of the entries in the block
+    block : numpy.array
+        array of shape (N, len(columns)) with the entries of one
+        camera in the chunk
+    """
+    with tables.open_file(file, mode="r") as h5file:
+        table = h5file.get_node(key)
+
+        for start in range(0, table.nrows, chunksize):
+            stop = min(start + chunksize, table.nrows)
+
+            block = np.empty((stop - start, len(columns)))
+            for i, column in enumerate(columns):
+                if column == "ratio":
+                    # get ratio between width and length
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        block[:, i] = table.read(start, stop, field="width")
+                        block[:, i] /= table.read(start, stop, field="length")
+                else:
+                    block[:, i] = table.read(start, stop, field=column)
+
+            # delete NaNs and infs
+            finite = np.isfinite(block).all(axis=1)
+            block = block[finite]
+            cam_ids = table.read(start, stop, field="cam_id")[finite]
+
+            for cam_id in np.unique(cam_ids):
+                yield cam_id.decode(), block[cam_ids == cam_id]
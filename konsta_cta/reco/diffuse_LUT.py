@@ -1,20 +1,57 @@
-import pandas as pd
 import numpy as np
 import pickle
-from konsta_cta.reco.lookup_base import LookupFailedError
+from konsta_cta.reco.lookup_base import LUTAxis, lut_registry
+from konsta_cta.reco.lut_table import LUTTable
 from konsta_cta.reco.direction_LUT import LookupGenerator
-from tqdm import tqdm
 
 
 class DiffuseLUT(LookupGenerator):
+    """
+    LUT for diffuse gammas. Besides size and width to length ratio the
+    LUT is binned in the off angle of the true source position from
+    the pointing, so that self.lookup holds one 3 dimensional table for
+    each camera. The off angle edges are stored as sorted array with
+    the table, the bin is selected with `numpy.searchsorted`.
+
+    Off angles outside of the binning are treated according to the
+    overflow policy: with "clip" they are looked up in the first or last
+    off angle bin, with "invalid" the lookup fails.
+
+    The LUTs are saved and loaded with `save` and `load` in the
+    versioned json or `.npz` format. Pickles written by former versions
+    can be converted with scripts/write_feature_list/convert_LUT.py.
+    """
+
+    default_features = ("intensity", "ratio", "offangle")
+    default_overflow = ("offangle",)
+    overflow_policies = ("clip", "invalid")
+
+    @staticmethod
+    def get_offangle_edges(off_bins):
+        """
+        Get the bin edges in off angle.
 
-    def __init__(self):
-        super().__init__()
-        self.difflookup = {}
+        Parameters
+        ----------
+        off_bins : list
+            either a flat list of bin edges or a 2 dimensional list
+            containing the start and end points of each off angle bin
+            in each line
+
+        Returns
+        -------
+        edges : numpy.array
+            sorted unique bin edges
+        """
+        return np.unique(np.ravel(np.asarray(off_bins, dtype=float)))
 
     @classmethod
-    def look_up_offbins(cls, files, size_max, key="/dca_list", nbins=[10,10], off_bins=None):
+    def look_up_offbins(cls, files, size_max, key="/dca_list", nbins=[10,10],
+                        off_bins=None, n_workers=1, overflow="clip", state_dir=None,
+                        binning="fixed"):
         """
+        Create the LUTs binned in size, width to length ratio and
+        off angle. Each file is read and binned only once.
 
         Parameters
         ----------
@@ -27,102 +64,143 @@ class DiffuseLUT(LookupGenerator):
         nbins : list or tuple
             number of bins in size and width to length ratio
         off_bins : list
-            2 dimensional list containing the start and end points for each
-            off angle bins in each line. For each line, one entry in
-            self.lookup is created
+            bin edges in off angle, either as flat list or as 2
+            dimensional list containing the start and end points for
+            each off angle bin in each line
+        n_workers : integer
+            number of processes reading and binning the files
+        overflow : string
+            overflow policy for off angles outside of the binning,
+            "clip" or "invalid"
+        state_dir : string or None
+            if given, the LUT is built incrementally, see
+            `LookupGenerator.accumulate_files_incremental`
+        binning : string
+            "fixed" or "quantile" binning in intensity and ratio, the
+            off angle bins are always fixed
         """
-        statistic = {}
-        sum_lookups = {}
-        bins = {}
+        cls._check_overflow_policy(overflow)
         if off_bins is None:
             off_bins = [0, np.inf]
 
-        for nbin, off_bin in enumerate(off_bins):
-            statistic[nbin] = {}
-            sum_lookups[nbin] = {}
-            bins[nbin] = {}
-
-        for i, file in tqdm(enumerate(files), total=len(files), unit="files"):
-            dca_list = pd.read_hdf(file, key)
-            # get ratio between width and length
-            dca_list.loc[:, "ratio"] = dca_list.width / dca_list.length
-
-            dca_list = dca_list[np.isfinite(dca_list.loc[:,
-                                            dca_list.columns!="cam_id"]).all(axis=1)] # delete NaNs and infs
-
-
-            for nbin, off_bin in enumerate(off_bins):
-
-                dca_list_bin = dca_list.loc[(dca_list.offangle >= off_bin[0]) &
-                                            (dca_list.offangle <= off_bin[1])]
-
-                # reset the dicts at each iteration so that make_lookup
-                # does not take data from previous iterations if no new
-                # data for a specific camera was given in that bin.
-                self = cls()
+        off_axis = LUTAxis("offangle", cls.get_offangle_edges(off_bins),
+                           overflow=(overflow == "clip"))
+        axes = {cam_id: cls.make_axes(size_max[cam_id], nbins) + [off_axis]
+                for cam_id in size_max}
 
-                # loop through all camera types
-                for cam_id in np.unique(dca_list_bin.cam_id):
-                    dca_camera = dca_list_bin[dca_list_bin.cam_id == cam_id]
-                    entries = np.array(dca_camera.loc[:, ("dca2", "intensity", "ratio")])
+        return cls.load_data_from_files(files, size_max, key=key, nbins=nbins,
+                                        n_workers=n_workers, axes=axes, state_dir=state_dir,
+                                        binning=binning)
 
-                    try:
-                        self.data[cam_id] = np.append(self.data[cam_id], entries, axis=0)
-                    except KeyError:
-                        self.data[cam_id] = entries
-
-                self.make_lookup(size_max, bins=nbins)
-                LUT = self.lookup
-                for cam_id in LUT.keys():
-                    dimensions = np.shape(LUT[cam_id])[0] - 2
+    @classmethod
+    def _check_overflow_policy(cls, overflow):
+        """
+        Raise a KeyError if the overflow policy is not known.
+        """
+        if overflow not in cls.overflow_policies:
+            raise KeyError("Overflow policy {} not known. Possible policies "
+                           "are {}".format(overflow, cls.overflow_policies))
 
-                    # merge all LUTs
-                    try:
-                        statistic[nbin][cam_id] += LUT[cam_id][0]
-                        sum_lookups[nbin][cam_id] = self.sum_nan_arrays(sum_lookups[nbin][cam_id],
-                                                               LUT[cam_id][0] * LUT[cam_id][-1])
+    def set_overflow(self, overflow):
+        """
+        Set the overflow policy for off angles outside of the binning.
+        The tables are replaced by new tables sharing the arrays, so
+        that LUTs cached in `lut_registry` are not changed.
 
-                    except KeyError:
-                        statistic[nbin][cam_id] = LUT[cam_id][0]
-                        sum_lookups[nbin][cam_id] = LUT[cam_id][0] * LUT[cam_id][-1]
+        Parameters
+        ----------
+        overflow : string
+            "clip" to look up values in the first or last off angle
+            bin or "invalid" to let the lookup fail
+        """
+        self._check_overflow_policy(overflow)
 
-                        bins[nbin][cam_id] = []
-                        for ii in range(dimensions):
-                            bins[nbin][cam_id] += [LUT[cam_id][ii + 1]]
+        for cam_id, table in self.lookup.items():
+            axes = [LUTAxis(axis.feature, axis.edges, axis.scale,
+                            (overflow == "clip") if axis.feature == "offangle"
+                            else axis.overflow)
+                    for axis in self.get_axes(cam_id)]
+            self.lookup[cam_id] = table.with_axes(axes)
 
-        self = cls()
-        self.difflookup["bins"] = off_bins
-        for nbin, off_bin in enumerate(off_bins):
-            self.difflookup[nbin] = {}
-            for cam_id in statistic[nbin].keys():
-                sum_lookups[nbin][cam_id] = sum_lookups[nbin][cam_id] / statistic[nbin][cam_id]
+    @classmethod
+    def from_offangle_tables(cls, difflookup):
+        """
+        Convert LUTs stored in the former layout, with one 2 dimensional
+        LUT for each off angle bin, into 3 dimensional tables.
 
-                self.difflookup[nbin][cam_id] = np.array(
-                    [statistic[nbin][cam_id]] + bins[nbin][cam_id] + [sum_lookups[nbin][cam_id]])
+        Parameters
+        ----------
+        difflookup : dictionary
+            off angle bins under the key "bins" and the LUTs of
+            each bin under the keys 0, 1, ...
 
-        return self
+        Returns
+        -------
+        lookup : dictionary
+            3 dimensional LUTs with the camera IDs as keys
+        """
+        off_edges = cls.get_offangle_edges(difflookup["bins"])
+        tables = [difflookup[nbin] for nbin in range(len(difflookup) - 1)]
+        if len(off_edges) != len(tables) + 1:
+            raise ValueError("Off angle bins {} are not contiguous and can "
+                             "not be converted.".format(difflookup["bins"]))
+
+        lookup = {}
+        for cam_id in set().union(*tables):
+            table = next(t[cam_id] for t in tables if cam_id in t)
+            shape = np.shape(table[0])
+
+            statistic = np.stack([t[cam_id][0] if cam_id in t else np.zeros(shape)
+                                  for t in tables], axis=-1)
+            values = np.stack([t[cam_id][-1] if cam_id in t else np.full(shape, np.nan)
+                               for t in tables], axis=-1)
+            lookup[cam_id] = cls._make_table(statistic, list(table[1:-1]) + [off_edges],
+                                             values)
+
+        return lookup
 
-    def save_pickle(self, path):
+    @classmethod
+    def load(cls, path, mmap_mode=None, cache=True, dtype=None):
         """
-        Save LUT to pickle file.
+        Read LUT from a `.json` or `.npz` file, see `LookupBase.load`.
 
-        Parameters
-        ----------
-        path : string
-        	file to store the LUT self.lookup into
+        Raises
+        ------
+        IOError
+            if the file is neither a `.npz` nor a json file, e.g. a
+            pickle written by former versions, which has to be
+            converted with convert_LUT.py first
         """
-        with open(path, "wb") as file:
-            pickle.dump(self.difflookup, file)
+        with open(path, "rb") as f:
+            # npz files start with the zip magic, json files with "{"
+            head = f.read(4)
+            is_npz = head == b"PK\x03\x04"
+            while head and not head.lstrip():
+                head = f.read(4096)
+            is_json = head.lstrip()[:1] == b"{"
+
+        if not (is_npz or is_json):
+            raise IOError("{} is not a LUT in the .npz or json format, e.g. a pickled "
+                          "diffuse LUT of a former version. Convert it with "
+                          "scripts/write_feature_list/convert_LUT.py.".format(path))
+
+        return super().load(path, mmap_mode=mmap_mode, cache=cache, dtype=dtype)
 
     @classmethod
-    def load_pickle(cls, path):
+    def load_pickle(cls, path, cache=True):
         """
-        Read look up table which was stored in a pickle file
+        Read look up table which was stored in a pickle file by former
+        versions, only used to convert these files. Pickles with one
+        LUT for each off angle bin are converted into 3 dimensional
+        tables, tables in the former layout of object arrays into
+        `LUTTable`.
 
         Parameters
         ----------
         path : string
             path to the `json` file which stores the LUT
+        cache : bool
+            if True, the LUTs are taken from `lut_registry`
 
         Returns
         -------
@@ -130,10 +208,19 @@ class DiffuseLUT(LookupGenerator):
             in derived classes, it will return a instance of
             that class for further usage
         """
+        if cache:
+            return cls.from_registry(lut_registry.make_key(path, "pickle"),
+                                     lambda: cls.load_pickle(path, cache=False))
+
         self = cls()
 
         with open(path, "rb") as file:
-            self.difflookup = pickle.load(file)
+            lookup = pickle.load(file)
+
+        if "bins" in lookup:
+            lookup = cls.from_offangle_tables(lookup)
+        self.lookup = {cam_id: LUTTable.from_tuple(table)
+                       for cam_id, table in lookup.items()}
 
         return self
 
@@ -144,6 +231,8 @@ class DiffuseLUT(LookupGenerator):
         Parameters
         ----------
         params : `HillasParametersContainer`
+        offangle : float
+            off angle of the source position used to select the bin
         cam_id : string
             table to look value up
         min_stat : integer
@@ -164,28 +253,38 @@ class DiffuseLUT(LookupGenerator):
             `min_stat` or if the ratio of width to length is above
             the cut
         """
+        return self.get_weight_from_LUT(params, cam_id, min_stat=min_stat,
+                                        ratio_cut=ratio_cut, offangle=offangle)
 
-        ratio = params.width / params.length
-        if ratio > ratio_cut:
-            # apply cut on the width to length ratio
-            raise LookupFailedError("Ratio width to length above allowed"
-                             " value of {}".format(ratio_cut))
-
-        # select the LUT according to the offangle bin
-        offbin = int(np.sum(np.array(self.difflookup["bins"]) < offangle) / 2)
-        try:
-            self.lookup = self.difflookup[offbin]
-        except KeyError:
-            # value outside of LUT. Select from last table.
-            offbin = list(self.difflookup.keys())[-1]
-            self.lookup = self.difflookup[offbin]
-
-        statistic, mean_dca2 = self.look_up_value([params.intensity, ratio],
-                                                cam_id)
-
-        if statistic < min_stat:
-            raise LookupFailedError("Not enough statistics in bin.")
+    def get_weights_from_diffuse_LUT(self, intensity, ratio, offangle, cam_ids,
+                                     min_stat=5, ratio_cut=1.):
+        """
+        Vectorized version of `get_weight_from_diffuse_LUT`. Get the
+        weights for arrays of intensities, ratios and off angles in
+        one call.
 
-        weight = 1 / mean_dca2
+        Parameters
+        ----------
+        intensity : array-like
+            intensities of the images
+        ratio : array-like
+            ratios width to length of the images
+        offangle : array-like
+            off angles used to select the LUT
+        cam_ids : string or array-like
+            camera ID of each image or one camera ID for all images
+        min_stat : integer
+            minimum number of entries required in each bin
+        ratio_cut : float or array-like
+            maximum value of ratio width to length to considere
+            in analysis, either one value or one for each image
 
-        return weight
+        Returns
+        -------
+        weights : numpy.array
+            1 / mean squared dca, NaN where no weight was found
+        valid : numpy.array
+            boolean mask, False where the lookup failed
+        """
+        return self.get_weights_from_LUT(intensity, ratio, cam_ids, min_stat=min_stat,
+                                         ratio_cut=ratio_cut, offangle=offangle)
@@ -8,9 +8,15 @@ from astropy.coordinates import SkyCoord
 from astropy.coordinates.angle_utilities import angular_separation
 
 from konsta_cta.reco.lookup_base import *
+from konsta_cta.reco.dca_reader import iter_dca_blocks
+from konsta_cta.reco.manifest import IngestionManifest
+from konsta_cta.reco.quantile_sketch import QuantileSketch
+from konsta_cta.coordinates import horizon_to_camera
 from astropy import units as u
 import numpy as np
 
+from functools import partial
+from multiprocessing import Pool
 from tqdm import tqdm
 
 
@@ -24,12 +30,61 @@ class LookupGenerator(LookupBase):
     being called in the event loop the required information
     is collected. Afterwards `make_lookup` can be used, to
     generate the set of the look up tables.
+
+    By default the LUTs are binned in intensity and ratio width to
+    length, other axes can be given as `LUTAxis` to
+    `load_data_from_files`. The bins are either fixed (logarithmic in
+    intensity, linear in ratio) or of about equal population, derived
+    from quantile sketches of the data in an extra pass over the files.
     """
 
-    def __init__(self):
+    default_features = ("intensity", "ratio")
+    binnings = ("fixed", "quantile")
+
+    def __init__(self, size_max=None, bins=[10, 10], buffer_size=10000,
+                 reservoir_size=0, use_astropy=False):
+        """
+        Parameters
+        ----------
+        size_max : dictionary or None
+                Dict with the maximum size values for the LUT for each
+                telescope type. If given, `collect_data` accumulates the
+                entries directly into histograms with fixed binning, so
+                that the memory does not grow with the number of events.
+                Otherwise all entries are kept in self.data.
+        bins : tuple or list
+                Number of bins in size and width to length ratio
+        buffer_size : integer
+                number of entries per camera collected before they are
+                added to the histograms
+        reservoir_size : integer
+                number of raw entries per camera randomly sampled into
+                self.reservoir for debugging
+        use_astropy : bool
+                If True, the true source positions in the cameras are
+                calculated by transforming astropy coordinates with the
+                ctapipe frames for each telescope instead of using the
+                vectorized numpy implementation.
+        """
         self.data = {}
+        self.accumulator = None
         super().__init__()
 
+        self.size_max = size_max
+        self.bins = bins
+        self.buffer_size = buffer_size
+        self.reservoir_size = reservoir_size
+        self.use_astropy = use_astropy
+        self.reservoir = {}
+        self._reservoir = {}
+        self._buffer = {}
+        self._n_buffer = {}
+        self._n_seen = {}
+
+        if size_max is not None:
+            self.accumulator = LUTAccumulator({cam_id: self.get_bin_edges(size_max[cam_id], bins)
+                                               for cam_id in size_max})
+
     def collect_data(self, event, hillas_dict):
         """
         Collect the data from event required for building
@@ -49,105 +104,500 @@ class LookupGenerator(LookupBase):
         data : numpy.array
         """
 
-        for tel_id in hillas_dict.keys():
-            focal_length = event.inst.subarray.tel[tel_id].optics.equivalent_focal_length
-            cam_id = event.inst.subarray.tel[tel_id].camera.cam_id
-            direction_az = event.mc.az.to(u.deg)
-            direction_alt = event.mc.alt.to(u.deg)
+        tel_ids = list(hillas_dict.keys())
 
-            # true position in camera
-            cam_coord = self.get_position_in_cam(direction_alt,
-                                                 direction_az, event, tel_id)
-            dca = self.calculate_dca((cam_coord.x, cam_coord.y),
-                                     hillas_dict[tel_id])
+        # true position in cameras
+        source_x, source_y = self.get_positions_in_cam(event, tel_ids)
 
-            # convert dca to degrees
-            conversion_factor = (180 / (np.pi * focal_length))
-            dca = dca.value * conversion_factor * u.deg
+        focal_length = np.array([event.inst.subarray.tel[tel_id].optics.
+                                 equivalent_focal_length.to_value(u.m)
+                                 for tel_id in tel_ids], dtype=float)
+        cam_ids = np.array([event.inst.subarray.tel[tel_id].camera.cam_id
+                            for tel_id in tel_ids])
+
+        psi = np.array([hillas_dict[tel_id].psi.to_value(u.rad) for tel_id in tel_ids])
+        x = np.array([hillas_dict[tel_id].x.to_value(u.m) for tel_id in tel_ids])
+        y = np.array([hillas_dict[tel_id].y.to_value(u.m) for tel_id in tel_ids])
+        intensity = np.array([hillas_dict[tel_id].intensity for tel_id in tel_ids], dtype=float)
+        ratio = np.array([hillas_dict[tel_id].width.value / hillas_dict[tel_id].length.value
+                          for tel_id in tel_ids], dtype=float)
+
+        # dca in degrees
+        dca2 = self.calculate_dca2(psi, x, y, source_x, source_y, focal_length)
 
-            ratio = hillas_dict[tel_id].width.value / \
-                hillas_dict[tel_id].length.value
-            entry = [dca.value ** 2, hillas_dict[tel_id].intensity, ratio]  # one row
+        entries = np.column_stack([dca2, intensity, ratio])  # one row per telescope
+        for cam_id in np.unique(cam_ids):
+            cam_entries = entries[cam_ids == cam_id]
+
+            if self.size_max is not None:
+                self.add_entries(cam_id, cam_entries)
+                continue
 
             try:
-                self.data[cam_id] = np.append(self.data[cam_id], [entry], axis=0)
+                self.data[cam_id] = np.append(self.data[cam_id], cam_entries, axis=0)
             except KeyError:
-                self.data[cam_id] = np.array([entry])
+                self.data[cam_id] = cam_entries
+
+    def add_entries(self, cam_id, entries):
+        """
+        Add entries of one camera to the histograms with fixed binning.
+        The entries are collected in a buffer of fixed size which is
+        added to self.accumulator once it is full.
+
+        Parameters
+        ----------
+        cam_id : string
+            camera ID of the entries
+        entries : numpy.array
+            2 dimensional array with rows [dca2, intensity, ratio]
+        """
+        entries = np.asarray(entries, dtype=float)
+        if self.reservoir_size > 0:
+            self._sample_reservoir(cam_id, entries)
+
+        if cam_id not in self._buffer:
+            self._buffer[cam_id] = np.empty((self.buffer_size, entries.shape[1]))
+            self._n_buffer[cam_id] = 0
+
+        while len(entries) > 0:
+            n_buffer = self._n_buffer[cam_id]
+            n_take = min(self.buffer_size - n_buffer, len(entries))
+
+            self._buffer[cam_id][n_buffer:n_buffer + n_take] = entries[:n_take]
+            self._n_buffer[cam_id] += n_take
+            entries = entries[n_take:]
+
+            if self._n_buffer[cam_id] == self.buffer_size:
+                self.flush(cam_id)
+
+    def flush(self, cam_id=None):
+        """
+        Add the buffered entries to self.accumulator.
+
+        Parameters
+        ----------
+        cam_id : string or None
+            camera to flush the buffer of, all cameras if None
+        """
+        cam_ids = list(self._buffer.keys()) if cam_id is None else [cam_id]
+        for cam_id in cam_ids:
+            n_buffer = self._n_buffer[cam_id]
+            if n_buffer > 0:
+                self.accumulator.add({cam_id: self._buffer[cam_id][:n_buffer]})
+                self._n_buffer[cam_id] = 0
+
+    def _sample_reservoir(self, cam_id, entries):
+        """
+        Keep a uniform random sample of at most `reservoir_size`
+        entries per camera (reservoir sampling). self.reservoir holds a
+        view of the filled part of a preallocated array.
+        """
+        if cam_id not in self._reservoir:
+            self._reservoir[cam_id] = np.empty((self.reservoir_size, entries.shape[1]))
+            self._n_seen[cam_id] = 0
+
+        reservoir = self._reservoir[cam_id]
+        n_seen = self._n_seen[cam_id]
+
+        # fill the free slots
+        n_fill = max(min(self.reservoir_size - n_seen, len(entries)), 0)
+        reservoir[n_seen:n_seen + n_fill] = entries[:n_fill]
+
+        # each further entry replaces a random slot with probability
+        # reservoir_size / (number of entries seen including it)
+        replace = entries[n_fill:]
+        if len(replace):
+            index = np.random.randint(0, n_seen + n_fill + np.arange(1, len(replace) + 1))
+            keep = np.flatnonzero(index < self.reservoir_size)
+
+            # later entries overwrite earlier ones drawn for the same slot
+            slots, last = np.unique(index[keep][::-1], return_index=True)
+            reservoir[slots] = replace[keep[::-1][last]]
+
+        self._n_seen[cam_id] = n_seen + len(entries)
+        self.reservoir[cam_id] = reservoir[:min(self._n_seen[cam_id], self.reservoir_size)]
 
     @classmethod
-    def load_data_from_files(cls, files, size_max, key="/dca_list", nbins=[10,10]):
+    def load_data_from_files(cls, files, size_max, key="/dca_list", nbins=[10,10],
+                             n_workers=1, axes=None, state_dir=None, binning="fixed"):
         """
-        Load data from HDF5 files and convert merge the files to self.data.
-        The data will be loaded from the key and has to include the columns
-        dca2, intensity, width, length and cam_id.
-        self.data in the end will be a dictionary with the unique cam_ids in
-        the files as keys and the data stored in numpy.arrays.
+        Load data from HDF5 files and build the LUT. The data will be
+        loaded from the key and has to include the columns dca2,
+        intensity, width, length and cam_id.
+        Each file is binned into a partial `LUTAccumulator` and the
+        partial accumulators are merged in a binary tree. As the tree
+        only depends on the order of the files, the result is the same
+        bit for bit for any number of workers.
 
         Paramters
         ---------
         files : list
             list of HDF5 files with the data stored
+        size_max : dictionary
+            Dict with the maximum size values for the LUT for each
+            telescope type
         key : string
             key to the data in the HDF5 file
+        nbins : tuple or list
+            Number of bins in size and width to length ratio
+        n_workers : integer
+            number of processes reading and binning the files
+        axes : dictionary or None
+            camera IDs as keys and a list of `LUTAxis` as values. The
+            features of the axes are read from the columns of the
+            table, "ratio" is the ratio of width to length. The same
+            features have to be used for all cameras. If None, the
+            axes of `make_axes` are used.
+        state_dir : string or None
+            if given, the LUT is built incrementally with
+            `accumulate_files_incremental` and the state is kept in
+            this directory
+        binning : string
+            "fixed" to use the edges of the axes or "quantile" to
+            replace the edges in intensity and ratio by edges of about
+            equal population, see `quantile_axes`. As the quantile
+            edges change with the data, all files are read again when
+            building incrementally.
         """
+        cls._check_binning(binning)
+        if axes is None:
+            axes = {cam_id: cls.make_axes(size_max[cam_id], nbins)
+                    for cam_id in size_max}
+        if binning == "quantile":
+            axes = cls.quantile_axes(files, axes, key=key, n_workers=n_workers)
+
+        features = {tuple(axis.feature for axis in cam_axes) for cam_axes in axes.values()}
+        if len(features) != 1:
+            raise ValueError("Axes of all cameras need the same features, "
+                             "got {}.".format(sorted(features)))
+
+        edges = {cam_id: [axis.edges for axis in cam_axes]
+                 for cam_id, cam_axes in axes.items()}
+        columns = ("dca2",) + features.pop()
+        if state_dir is None:
+            accumulator = cls.accumulate_files(files, edges, key=key, n_workers=n_workers,
+                                               columns=columns)
+        else:
+            accumulator = cls.accumulate_files_incremental(files, edges, state_dir, key=key,
+                                                           columns=columns,
+                                                           n_workers=n_workers)
 
         self = cls()
+        self.accumulator = accumulator
+        self.lookup = accumulator.finalize()
+        self.set_axes(axes)
 
-        statistic = {}
-        sum_lookups = {}
-        bins = {}
+        return self
 
-        for i, file in tqdm(enumerate(files), total=len(files), unit="files"):
+    @classmethod
+    def accumulate_files(cls, files, edges, key="/dca_list",
+                         columns=("dca2", "intensity", "ratio"), n_workers=1):
+        """
+        Bin the entries of several HDF5 files into partial accumulators
+        with `accumulate_file` and merge them in a binary tree.
 
-            dca_list = pd.read_hdf(file, key)
-            # get ratio between width and length
-            dca_list.loc[:, "ratio"] = dca_list.width / dca_list.length
+        Parameters
+        ----------
+        files : list
+            list of HDF5 files with the data stored
+        edges : dictionary
+            camera IDs as keys and the bin edges in each binned
+            column as values
+        key : string
+            key to the data in the HDF5 file
+        columns : tuple or list
+            column of the values followed by the binned columns
+        n_workers : integer
+            number of processes reading and binning the files
 
-            dca_list = dca_list[np.isfinite(dca_list.loc[:,
-                                            dca_list.columns!="cam_id"]).all(axis=1)] # delete NaNs and infs
+        Returns
+        -------
+        accumulator : LUTAccumulator
+        """
+        accumulate = partial(cls.accumulate_file, edges=edges, key=key,
+                             columns=columns)
 
-            self.data = {}
-            # loop through all camera types
-            for cam_id in np.unique(dca_list.cam_id):
-                dca_camera = dca_list[dca_list.cam_id == cam_id]
+        if n_workers > 1:
+            with Pool(n_workers) as pool:
+                partials = tqdm(pool.imap(accumulate, files), total=len(files), unit="files")
+                accumulator = LUTAccumulator.tree_reduce(partials)
+        else:
+            partials = tqdm(map(accumulate, files), total=len(files), unit="files")
+            accumulator = LUTAccumulator.tree_reduce(partials)
 
-                entries = np.array(dca_camera.loc[:, ("dca2", "intensity", "ratio")])
+        return accumulator
 
-                try:
-                    self.data[cam_id] = np.append(self.data[cam_id], entries, axis=0)
-                except KeyError:
-                    self.data[cam_id] = entries
+    @classmethod
+    def accumulate_files_incremental(cls, files, edges, state_dir, key="/dca_list",
+                                     columns=("dca2", "intensity", "ratio"), n_workers=1):
+        """
+        Bin the entries of several HDF5 files incrementally. The files
+        ingested before are recorded in an `IngestionManifest` in
+        `state_dir` together with their partial accumulators, only files
+        which are new or changed since the last call are read. The
+        entries of changed or removed files are subtracted from the
+        total accumulator. If the binning changed, all files are read
+        again.
 
-            self.make_lookup(size_max, bins=nbins)
+        Parameters
+        ----------
+        files : list
+            list of HDF5 files with the data stored
+        edges : dictionary
+            camera IDs as keys and the bin edges in each binned
+            column as values
+        state_dir : string
+            directory with the manifest and the accumulators
+        key : string
+            key to the data in the HDF5 file
+        columns : tuple or list
+            column of the values followed by the binned columns
+        n_workers : integer
+            number of processes reading and binning the files
 
-            LUT = self.lookup
+        Returns
+        -------
+        accumulator : LUTAccumulator
+            the total accumulator of all files
+        """
+        manifest = IngestionManifest.open(
+            state_dir, IngestionManifest.make_signature(edges, key, columns))
+        changed, removed = manifest.plan(files)
+        print("{} of {} files new or changed, {} removed".format(
+            len(changed), len(files), len(removed)))
 
-            for cam in LUT.keys():
-                cam = str(cam)
-                dimensions = np.shape(LUT[cam])[0] - 2
+        for path in removed + [path for path in changed if path in manifest.files]:
+            manifest.remove(path)
 
-                # merge all LUTs
-                try:
-                    statistic[cam] += LUT[cam][0]
-                    sum_lookups[cam] = self.sum_nan_arrays(sum_lookups[cam],
-                                                           LUT[cam][0] * LUT[cam][-1])
+        accumulate = partial(cls.accumulate_file, edges=edges, key=key,
+                             columns=columns)
+        paths = sorted(changed)
 
-                except KeyError:
-                    statistic[cam] = LUT[cam][0]
-                    sum_lookups[cam] = LUT[cam][0] * LUT[cam][-1]
+        if n_workers > 1:
+            with Pool(n_workers) as pool:
+                partials = tqdm(pool.imap(accumulate, paths), total=len(paths), unit="files")
+                for path, accumulator in zip(paths, partials):
+                    manifest.add(path, changed[path], accumulator)
+        else:
+            partials = tqdm(map(accumulate, paths), total=len(paths), unit="files")
+            for path, accumulator in zip(paths, partials):
+                manifest.add(path, changed[path], accumulator)
 
-                    bins[cam] = []
-                    for i in range(dimensions):
-                        bins[cam] += [LUT[cam][i + 1]]
+        manifest.save()
 
-        self = cls()
-        for cam in statistic.keys():
-            sum_lookups[cam] = sum_lookups[cam] / statistic[cam]
+        return manifest.total
 
-            self.lookup[cam] = np.array(
-                [statistic[cam]] + bins[cam] + [sum_lookups[cam]])
+    @staticmethod
+    def accumulate_file(file, edges, key="/dca_list",
+                        columns=("dca2", "intensity", "ratio"), chunksize=100000):
+        """
+        Bin the entries of one HDF5 file into a `LUTAccumulator`. The
+        file is read in chunks, only the requested columns and cam_id
+        are read from the table stored under key.
 
-        return self
+        Parameters
+        ----------
+        file : string
+            HDF5 file with the DCA feature list
+        edges : dictionary
+            camera IDs as keys and the bin edges in size and
+            width to length ratio as values
+        key : string
+            key to the data in the HDF5 file
+        columns : tuple or list
+            column of the values followed by one column for each
+            dimension of the edges
+        chunksize : integer
+            number of rows read at once
+
+        Returns
+        -------
+        accumulator : LUTAccumulator
+        """
+        accumulator = LUTAccumulator(edges)
+        for cam_id, block in iter_dca_blocks(file, key, columns=columns,
+                                             chunksize=chunksize):
+            accumulator.add({cam_id: block})
+
+        return accumulator
+
+    @classmethod
+    def _check_binning(cls, binning):
+        """
+        Raise a KeyError if the binning is not known.
+        """
+        if binning not in cls.binnings:
+            raise KeyError("Binning {} not known. Possible binnings "
+                           "are {}".format(binning, cls.binnings))
+
+    @classmethod
+    def quantile_axes(cls, files, axes, features=("intensity", "ratio"), key="/dca_list",
+                      n_workers=1, k=200):
+        """
+        Replace the edges of axes by edges with about the same number
+        of entries in each bin. The files are read once and the
+        distribution of the features is estimated with a
+        `QuantileSketch` for each camera and feature, so the data is
+        not loaded into memory. The range, the number of bins and the
+        scale of the axes are kept.
+
+        Parameters
+        ----------
+        files : list
+            list of HDF5 files with the data stored
+        axes : dictionary
+            camera IDs as keys and a list of `LUTAxis` as values
+        features : tuple or list
+            features of the axes to replace
+        key : string
+            key to the data in the HDF5 file
+        n_workers : integer
+            number of processes reading the files
+        k : integer
+            accuracy parameter of the sketches
+
+        Returns
+        -------
+        axes : dictionary
+            camera IDs as keys and a list of `LUTAxis` as values
+        """
+        columns = ("dca2",) + tuple(axis.feature for axis in next(iter(axes.values())))
+        sketches = cls.sketch_files(files, columns, key=key, n_workers=n_workers, k=k)
+
+        quantile_axes = {}
+        for cam_id, cam_axes in axes.items():
+            quantile_axes[cam_id] = []
+            for i, axis in enumerate(cam_axes):
+                if (axis.feature in features) and (cam_id in sketches):
+                    axis = LUTAxis.from_sketch(axis.feature, sketches[cam_id][i + 1],
+                                               len(axis.edges) - 1, axis.edges[0],
+                                               axis.edges[-1], axis.scale, axis.overflow)
+                quantile_axes[cam_id].append(axis)
+
+        return quantile_axes
+
+    @classmethod
+    def sketch_files(cls, files, columns, key="/dca_list", n_workers=1, k=200):
+        """
+        Quantile sketches of columns of several HDF5 files. The sketches
+        of the files are merged in the order of the files, so the
+        result does not depend on the number of workers.
+
+        Parameters
+        ----------
+        files : list
+            list of HDF5 files with the data stored
+        columns : tuple or list
+            columns to sketch
+        key : string
+            key to the data in the HDF5 file
+        n_workers : integer
+            number of processes reading the files
+        k : integer
+            accuracy parameter of the sketches
+
+        Returns
+        -------
+        sketches : dictionary
+            camera IDs as keys and a list with one `QuantileSketch`
+            for each column as values
+        """
+        sketch = partial(cls.sketch_file, key=key, columns=columns, k=k)
+
+        if n_workers > 1:
+            with Pool(n_workers) as pool:
+                partials = list(tqdm(pool.imap(sketch, files), total=len(files),
+                                     unit="files"))
+        else:
+            partials = list(tqdm(map(sketch, files), total=len(files), unit="files"))
+
+        sketches = {}
+        for file_sketches in partials:
+            for cam_id, cam_sketches in file_sketches.items():
+                if cam_id not in sketches:
+                    sketches[cam_id] = cam_sketches
+                else:
+                    for merged, other in zip(sketches[cam_id], cam_sketches):
+                        merged.merge(other)
+
+        return sketches
+
+    @staticmethod
+    def sketch_file(file, key="/dca_list", columns=("dca2", "intensity", "ratio"), k=200,
+                    chunksize=100000):
+        """
+        Quantile sketches of columns of one HDF5 file. The file is read
+        in chunks, only rows which are finite in all columns are used.
+
+        Parameters
+        ----------
+        file : string
+            HDF5 file with the DCA feature list
+        key : string
+            key to the data in the HDF5 file
+        columns : tuple or list
+            columns to sketch
+        k : integer
+            accuracy parameter of the sketches
+        chunksize : integer
+            number of rows read at once
+
+        Returns
+        -------
+        sketches : dictionary
+            camera IDs as keys and a list with one `QuantileSketch`
+            for each column as values
+        """
+        sketches = {}
+        for cam_id, block in iter_dca_blocks(file, key, columns=columns,
+                                             chunksize=chunksize):
+            if cam_id not in sketches:
+                sketches[cam_id] = [QuantileSketch(k) for _ in columns]
+            for sketch, values in zip(sketches[cam_id], block.T):
+                sketch.add(values)
+
+        return sketches
+
+    @staticmethod
+    def make_axes(size_max, bins):
+        """
+        Default axes of the LUT in size and width to length ratio.
+
+        Parameters
+        ----------
+        size_max : integer or float
+                maximum size value of the LUT
+        bins : tuple or list
+                Number of bins in size and width to length ratio
+
+        Returns
+        -------
+        axes : list
+                `LUTAxis` with logarithmic bins in intensity from 10
+                to `size_max` and linear bins in ratio from 0 to 1
+        """
+        return [LUTAxis.log("intensity", 10, size_max, bins[0]),
+                LUTAxis.linear("ratio", 0, 1, bins[1])]
+
+    @classmethod
+    def get_bin_edges(cls, size_max, bins):
+        """
+        Bin edges of the LUT in size and width to length ratio.
+
+        Parameters
+        ----------
+        size_max : integer or float
+                maximum size value of the LUT
+        bins : tuple or list
+                Number of bins in size and width to length ratio
+
+        Returns
+        -------
+        edges : list
+                logarithmic bin edges in size from 10 to `size_max`
+                and linear bin edges in ratio from 0 to 1
+        """
+        return [axis.edges for axis in cls.make_axes(size_max, bins)]
 
     @staticmethod
     def get_position_in_cam(dir_alt, dir_az, event, tel_id):
@@ -189,6 +639,52 @@ class LookupGenerator(LookupBase):
 
         return cam_coord
 
+    def get_positions_in_cam(self, event, tel_ids):
+        """
+        Get the true source position in the cameras of several
+        telescopes at once. Unless self.use_astropy is set, the
+        positions are calculated with numpy for all telescopes
+        together instead of transforming astropy coordinates for
+        each telescope with `get_position_in_cam`.
+
+        Parameters
+        ----------
+        event : event data container
+        tel_ids : list
+            telescope IDs
+
+        Returns
+        -------
+        x, y : numpy.array
+            positions in the cameras in m
+        """
+        tel_ids = list(tel_ids)
+
+        if self.use_astropy:
+            direction_az = event.mc.az.to(u.deg)
+            direction_alt = event.mc.alt.to(u.deg)
+
+            x, y = [], []
+            for tel_id in tel_ids:
+                cam_coord = self.get_position_in_cam(direction_alt,
+                                                     direction_az, event, tel_id)
+                x.append(cam_coord.x.to_value(u.m))
+                y.append(cam_coord.y.to_value(u.m))
+
+            return np.array(x, dtype=float), np.array(y, dtype=float)
+
+        pointing_alt = np.array([event.mc.tel[tel_id].altitude_raw
+                                 for tel_id in tel_ids], dtype=float)
+        pointing_az = np.array([event.mc.tel[tel_id].azimuth_raw
+                                for tel_id in tel_ids], dtype=float)
+        focal_length = np.array([event.inst.subarray.tel[tel_id].optics.
+                                 equivalent_focal_length.to_value(u.m)
+                                 for tel_id in tel_ids], dtype=float)
+
+        return horizon_to_camera(event.mc.alt.to_value(u.rad),
+                                 event.mc.az.to_value(u.rad),
+                                 pointing_alt, pointing_az, focal_length)
+
     def calculate_dca(self, point, params):
         """
         calculate distance of closest approach between
@@ -199,16 +695,55 @@ class LookupGenerator(LookupBase):
         point : tuple or list
                 position x and y in camera
         params : `HillasParametersContainer`
+
+        Returns
+        -------
+        dca : astropy.units.Quantity
+                distance of closest approach in m
+        """
+        dca2 = self.calculate_dca2(params.psi.to_value(u.rad),
+                                   params.x.to_value(u.m),
+                                   params.y.to_value(u.m),
+                                   u.Quantity(point[0], u.m).value,
+                                   u.Quantity(point[1], u.m).value)
+
+        return np.sqrt(dca2) * u.m
+
+    @staticmethod
+    def calculate_dca2(psi, x, y, source_x, source_y, focal_length=None):
         """
-        m = np.tan(params.psi.to(u.deg)) # slope of line
+        calculate the squared distance of closest approach between
+        the Hillas major semi-axes and points in the cameras for
+        arrays of images at once.
 
-        B = 1 # might be fixed to arbitrary value
-        A = - m * B
-        C = (m * params.x - params.y) * B
+        Parameters
+        ----------
+        psi : numpy.array
+                orientation angles of the major axes in radians
+        x, y : numpy.array
+                centers of gravity of the images
+        source_x, source_y : numpy.array
+                positions of the points in the cameras, in the same
+                unit as x and y
+        focal_length : numpy.array or None
+                focal lengths of the telescopes in the same unit as x
+                and y. If given, the dca is converted to degrees.
 
-        dca = np.abs(A * point[0] + B * point[1] + C) / np.sqrt(A**2 + B**2)
+        Returns
+        -------
+        dca2 : numpy.array
+                squared distances of closest approach, in deg^2 if
+                `focal_length` is given
+        """
+        psi, x, y, source_x, source_y = [np.asarray(a, dtype=float) for a in
+                                         (psi, x, y, source_x, source_y)]
+        dca = np.abs((source_y - y) * np.cos(psi) - (source_x - x) * np.sin(psi))
+
+        if focal_length is not None:
+            # convert dca to degrees
+            dca = dca * 180 / (np.pi * np.asarray(focal_length, dtype=float))
 
-        return dca
+        return dca ** 2
 
     def make_lookup(self, size_max, bins=[10, 10]):
         """
@@ -228,56 +763,54 @@ class LookupGenerator(LookupBase):
                 For each camera ID one tuple containing a numpy
                 array with the histogram and the look up table.
         """
-        lookup = {}
-        for cam in self.data.keys():
-            # make sure that entries are valid
-            self.data[cam] = self.data[cam][
-                np.isfinite(self.data[cam]).all(axis=1)]
+        if self.size_max is not None:
+            # entries were accumulated in collect_data already
+            self.flush()
+            axes = {cam: self.make_axes(size_max[cam], bins)
+                    for cam in self.accumulator.count.keys()}
+            for cam, cam_axes in axes.items():
+                self.accumulator.check_edges(cam, [axis.edges for axis in cam_axes])
+
+            self.lookup.update(self.accumulator.finalize())
+            self.set_axes(axes)
+            return
+
+        axes = {cam: self.make_axes(size_max[cam], bins)
+                for cam in self.data.keys()}
+
+        self.accumulator = LUTAccumulator({cam: [axis.edges for axis in cam_axes]
+                                           for cam, cam_axes in axes.items()})
+        self.accumulator.add(self.data)
+        self.lookup.update(self.accumulator.finalize())
+        self.set_axes(axes)
 
-            xbins = np.logspace(1, np.log10(size_max[cam]), bins[0] + 1)
-            ybins = np.linspace(0, 1, bins[1] + 1)
-
-            hist = np.histogram2d(self.data[cam][:, 1], self.data[
-                                  cam][:, 2], [xbins, ybins])
-
-            # code snippet from numpy.histogramdd to calculate the bin number
-            # each sample falls into. This is used in histogram2d above as well
-            # but as those required numbers are not written out it is
-            # reacalculated right here.
-            sample = np.array([self.data[cam][:, 1], self.data[cam][:, 2]]).T
-            D = sample.shape[1]
-
-            edges = np.array([xbins, ybins])
-            dedges = D * [None]
-
-            Ncount = {}
-            for i in np.arange(D):
-                Ncount[i] = np.digitize(sample[:, i], edges[i])
-
-            for i in np.arange(D):
-                dedges[i] = np.diff(edges[i])
-                # Rounding precision
-                mindiff = dedges[i].min()
-
-                if not np.isinf(mindiff):
-                    decimal = int(-np.log10(mindiff)) + 6
-                    # Find which points are on the rightmost edge.
-                    not_smaller_than_edge = (sample[:, i] >= edges[i][-1])
-                    on_edge = (np.around(sample[:, i], decimal) ==
-                               np.around(edges[i][-1], decimal))
+    @staticmethod
+    def get_hillas_feature(params, feature):
+        """
+        Get a feature of the LUT axes from the hillas parameters.
 
-                    # Shift these points one bin to the left.
-                    Ncount[i][np.nonzero(on_edge & not_smaller_than_edge)[0]] -= 1
+        Parameters
+        ----------
+        params : `HillasParametersContainer`
+        feature : string
+            name of the feature, "ratio" is the ratio width to
+            length, other features are taken from the attributes
+            of the parameters
 
-            sum_dca2 = np.zeros([len(xbins), len(ybins)])
-            for i, dca2 in enumerate(self.data[cam][:, 0]):
-                sum_dca2[Ncount[0][i] - 1, Ncount[1][i] - 1] += dca2
-            dca2_means = sum_dca2[:-1,:-1] / hist[0]
+        Returns
+        -------
+        value : float
+            value of the feature without units
+        """
+        if feature == "ratio":
+            value = params.width / params.length
+        else:
+            value = getattr(params, feature)
 
-            # add to the histogram
-            self.lookup[cam] = np.array(hist + (np.reshape(dca2_means, bins),))
+        return getattr(value, "value", value)
 
-    def get_weight_from_LUT(self, params, cam_id, min_stat=5, ratio_cut=1.):
+    def get_weight_from_LUT(self, params, cam_id, min_stat=5, ratio_cut=1.,
+                            **features):
         """
         Get the weight from a LUT.
 
@@ -291,6 +824,9 @@ class LookupGenerator(LookupBase):
         ratio_cut : integer or float
             maximum value of ratio width to length to considere
             in analysis
+        features : float
+            features of the LUT axes which are not part of the hillas
+            parameters, e.g. offangle
 
         Returns
         -------
@@ -310,8 +846,11 @@ class LookupGenerator(LookupBase):
             raise LookupFailedError("Ratio width to length above allowed"
                              " value of {}".format(ratio_cut))
 
-        statistic, mean_dca2 = self.look_up_value([params.intensity, ratio],
-                                                cam_id)
+        for axis in self.get_axes(cam_id):
+            if axis.feature not in features:
+                features[axis.feature] = self.get_hillas_feature(params, axis.feature)
+
+        statistic, mean_dca2 = self.look_up_feature(features, cam_id)
         if statistic < min_stat:
             raise LookupFailedError("Not enough statistics in bin.")
 
@@ -319,3 +858,81 @@ class LookupGenerator(LookupBase):
 
         return weight
 
+    def get_weights_from_LUT(self, intensity, ratio, cam_ids, min_stat=5, ratio_cut=1.,
+                             **features):
+        """
+        Vectorized version of `get_weight_from_LUT`. Get the weights
+        for arrays of intensities and ratios in one call.
+
+        Parameters
+        ----------
+        intensity : array-like
+            intensities of the images
+        ratio : array-like
+            ratios width to length of the images
+        cam_ids : string or array-like
+            camera ID of each image or one camera ID for all images
+        min_stat : integer
+            minimum number of entries required in each bin
+        ratio_cut : float or array-like
+            maximum value of ratio width to length to considere
+            in analysis, either one value or one for each image
+        features : array-like
+            arrays of further features of the LUT axes, e.g. offangle
+
+        Returns
+        -------
+        weights : numpy.array
+            1 / mean squared dca, NaN where no weight was found
+        valid : numpy.array
+            boolean mask, False where the lookup failed, i.e. the
+            values are outside of the LUT, the statistic in the
+            bin is below `min_stat` or the ratio is above the cut
+        """
+        ratio = np.asarray(ratio, dtype=float)
+        features.update(intensity=intensity, ratio=ratio)
+        statistic, mean_dca2, valid = self.look_up_features(features, cam_ids)
+        valid &= ~(ratio > ratio_cut) & (statistic >= min_stat)
+
+        weights = np.full(valid.shape, np.nan)
+        weights[valid] = 1 / mean_dca2[valid]
+
+        return weights, valid
+
+    def get_resolved_weights(self, intensity, ratio, cam_ids, ratio_cut=1., **features):
+        """
+        Get the weights from the tables precomputed with `resolve`.
+        Unlike `get_weight_from_LUT` no exceptions are raised, failed
+        lookups are marked in the returned mask instead.
+
+        Parameters
+        ----------
+        intensity : array-like
+            intensities of the images
+        ratio : array-like
+            ratios width to length of the images
+        cam_ids : string or array-like
+            camera ID of each image or one camera ID for all images
+        ratio_cut : float or array-like
+            maximum value of ratio width to length to considere
+            in analysis, either one value or one for each image
+        features : array-like
+            arrays of further features of the LUT axes, e.g. offangle
+
+        Returns
+        -------
+        weights : numpy.array
+            1 / mean squared dca, NaN where no weight was found
+        valid : numpy.array
+            boolean mask, False where the values are outside of the
+            LUT, in an invalid bin or the ratio is above the cut
+        """
+        ratio = np.asarray(ratio, dtype=float)
+        features.update(intensity=intensity, ratio=ratio)
+        mean_dca2, valid = self.look_up_resolved(features, cam_ids)
+        valid &= ~(ratio > ratio_cut)
+
+        weights = np.full(valid.shape, np.nan)
+        weights[valid] = 1 / mean_dca2[valid]
+
+        return weights, valid
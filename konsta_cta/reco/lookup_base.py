@@ -2,51 +2,525 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 import numpy as np
 import json
+import os
+import struct
+import threading
+import warnings
+import zipfile
+from collections import OrderedDict
 import pandas as pd
+from scipy.ndimage import distance_transform_edt
+from konsta_cta.reco.binning import binned_statistic
+from konsta_cta.reco.lut_table import LUTTable, SparseLUTTable, make_table
+
+# version of the LUT format written by `LookupBase.save`
+# 1: statistic, edges and values of each camera
+# 2: additionally the axis specifications, values keep their dtype
+# 3: sparse tables with the flat indices of the stored bins
+LUT_FORMAT_VERSION = 3
+
+# number of bins of a sparse table above which `resolve` warns about
+# the memory of the dense resolved table
+RESOLVE_WARN_SIZE = 2 ** 24
+
+
+def _save_npz(path, arrays):
+    """
+    Store a dictionary of arrays in an uncompressed `.npz` file. The
+    archive is not compressed so that the arrays can be memory mapped
+    when loading them with `_load_npz`.
+
+    Parameters
+    ----------
+    path : string
+        file to write the arrays into
+    arrays : dictionary
+        arrays with the names to store them under as keys
+    """
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _load_npz(path, mmap_mode=None):
+    """
+    Read all arrays from a `.npz` file. If `mmap_mode` is given, arrays
+    which are stored uncompressed are memory mapped instead of being
+    read into memory.
+
+    Parameters
+    ----------
+    path : string
+        `.npz` file to read
+    mmap_mode : None or string
+        mode passed to `numpy.memmap`, e.g. "r" for read only
+
+    Returns
+    -------
+    arrays : dictionary
+        arrays with their names in the archive as keys
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+
+            if (mmap_mode is None) or (info.compress_type != zipfile.ZIP_STORED):
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # skip the local file header of the member to reach the npy data
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject or (0 in shape) or (shape == ()):
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode,
+                                         offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+
+    return arrays
+
+
+class LUTRegistry:
+    """
+    Process wide cache of loaded LUTs. The entries are keyed by the
+    absolute path, size and modification time of the file, so that a
+    changed file is read again. If more than `maxsize` files are
+    cached, the least recently used entry is removed.
+
+    The cached tables are shared between all loaded instances and
+    their arrays are therefore set to read only.
+    """
+
+    def __init__(self, maxsize=16):
+        """
+        Parameters
+        ----------
+        maxsize : integer
+            maximum number of cached files
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, *options):
+        """
+        Key of a file in the registry.
+
+        Parameters
+        ----------
+        path : string
+            path to the file
+        options : hashable
+            further options changing the result of loading the file,
+            e.g. the mmap mode
+
+        Returns
+        -------
+        key : tuple
+            absolute path, size and modification time in ns of the
+            file followed by the options
+        """
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns) + options
+
+    def get(self, key):
+        """
+        Get the cached LUTs for a key, None if not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+
+        return entry
+
+    def put(self, key, lookup):
+        """
+        Cache the LUTs of a loaded file.
+
+        Parameters
+        ----------
+        key : tuple
+            key of the file, see `make_key`
+        lookup : dictionary
+            `LUTTable` or `SparseLUTTable` with camera IDs as keys
+
+        Returns
+        -------
+        lookup : dictionary
+            the cached LUTs
+        """
+        for table in lookup.values():
+            for array in table.arrays():
+                array.flags.writeable = False
+
+        with self._lock:
+            self._entries[key] = lookup
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return lookup
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Number of hits and misses and the size of the registry.
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+
+# LUTs loaded by `LookupBase.load` and `DiffuseLUT.load_pickle`
+lut_registry = LUTRegistry()
 
 
 class LookupFailedError(Exception):
     pass
 
 
+class LUTAxis:
+    """
+    Specification of one axis of a LUT. It contains the name of the
+    feature binned along the axis, the scale of the bins ("linear" or
+    "log"), the bin edges and whether values outside of the edges are
+    looked up in the first or last bin (overflow) or are invalid.
+    """
+
+    scales = ("linear", "log")
+
+    def __init__(self, feature, edges, scale="linear", overflow=False):
+        """
+        Parameters
+        ----------
+        feature : string
+            name of the feature, e.g. "intensity" or "ratio"
+        edges : array-like
+            bin edges along the axis
+        scale : string
+            scale of the bins, either "linear" or "log"
+        overflow : bool
+            if True, values outside of the edges are looked up in
+            the first or last bin
+        """
+        if scale not in self.scales:
+            raise KeyError("Scale {} not known. Possible scales are "
+                           "{}".format(scale, self.scales))
+
+        self.feature = feature
+        self.edges = np.asarray(edges, dtype=float)
+        self.scale = scale
+        self.overflow = bool(overflow)
+
+    def __repr__(self):
+        return "LUTAxis({!r}, {} bins from {} to {}, scale={!r}, overflow={})".format(
+            self.feature, len(self.edges) - 1, self.edges[0], self.edges[-1],
+            self.scale, self.overflow)
+
+    @classmethod
+    def linear(cls, feature, low, high, nbins, overflow=False):
+        """
+        Axis with nbins linear bins from low to high.
+        """
+        return cls(feature, np.linspace(low, high, nbins + 1), "linear", overflow)
+
+    @classmethod
+    def log(cls, feature, low, high, nbins, overflow=False):
+        """
+        Axis with nbins logarithmic bins from low to high.
+        """
+        return cls(feature, np.logspace(np.log10(low), np.log10(high), nbins + 1),
+                   "log", overflow)
+
+    @classmethod
+    def from_edges(cls, feature, edges, overflow=False):
+        """
+        Axis with given edges. The scale is "log" if the edges are
+        positive and equally spaced in logarithm, "linear" otherwise.
+        """
+        edges = np.asarray(edges, dtype=float)
+        scale = "linear"
+        if (len(edges) > 2) and np.all(edges > 0) and np.all(np.isfinite(edges)):
+            log_width = np.diff(np.log10(edges))
+            width = np.diff(edges)
+            if np.allclose(log_width, log_width[0]) and not np.allclose(width, width[0]):
+                scale = "log"
+
+        return cls(feature, edges, scale, overflow)
+
+    @classmethod
+    def from_sketch(cls, feature, sketch, nbins, low=None, high=None, scale="linear",
+                    overflow=False):
+        """
+        Axis with nbins bins of about equal population between low and
+        high, derived from a `QuantileSketch` of the feature. The scale
+        is only used for plotting.
+        """
+        return cls(feature, sketch.edges(nbins, low, high), scale, overflow)
+
+    def to_dict(self):
+        """
+        Specification of the axis without the edges, which are stored
+        with the table.
+        """
+        return {"feature": self.feature, "scale": self.scale,
+                "overflow": self.overflow}
+
+    @classmethod
+    def from_dict(cls, spec, edges):
+        """
+        Create an axis from a specification written with `to_dict`
+        and the edges of the table.
+        """
+        return cls(spec["feature"], edges, spec["scale"], spec["overflow"])
+
+
 class LookupBase:
     """
     Base class for handeling look up tables. The lookup tables
-    are expected to be a tuple with arrays for statistics which
-    contains the number of entries for each bin, one array for
-    each dimension containing the edges of the bins and one
-    array with the look up values.
+    are stored as `LUTTable` in self.lookup, with the camera IDs
+    as keys. Each table contains the number of entries for each
+    bin, one array for each dimension containing the edges of the
+    bins, one array with the look up values and a list of `LUTAxis`.
+    Sparsely filled tables are stored as `SparseLUTTable` instead,
+    which is looked up in the same way.
+
+    For LUTs without axis specifications the axes are named after
+    `default_features`, with overflow for the `default_overflow`
+    features.
+
+    With `resolve` dense tables are precomputed in self.resolved, in
+    which bins with low statistics are already replaced or marked as
+    invalid. They are looked up with `look_up_resolved` without raising
+    exceptions.
     """
 
+    # features along the axes of LUTs without axis specifications
+    default_features = ()
+    default_overflow = ()
+
     def __init__(self):
         self.lookup = {}
+        self.resolved = {}
+        self._default_axes = {}
+
+    @staticmethod
+    def _make_table(statistic, edges, values, axes=None):
+        """
+        Combine the statistic, the bin edges of each dimension and the
+        values to one LUT. The table is stored sparse if only few of
+        many bins are filled, see `make_table`.
+
+        Parameters
+        ----------
+        statistic : numpy.array
+            number of entries in each bin
+        edges : list
+            one array with the bin edges for each dimension
+        values : numpy.array
+            look up values
+        axes : list or None
+            one `LUTAxis` for each dimension
+
+        Returns
+        -------
+        table : LUTTable or SparseLUTTable
+        """
+        return make_table(statistic, edges, values, axes)
+
+    def astype(self, dtype):
+        """
+        Store the values of all LUTs with another dtype, e.g.
+        numpy.float32 to half the memory.
+
+        Parameters
+        ----------
+        dtype : numpy.dtype
+        """
+        self.lookup = {cam_id: table.astype(dtype)
+                       for cam_id, table in self.lookup.items()}
+        self.resolved = {}
+
+    def get_axes(self, cam_id):
+        """
+        Get the axes of the LUT of one camera. If no axes are
+        specified, they are created from `default_features` and
+        the edges of the table.
+
+        Parameters
+        ----------
+        cam_id : string
+            camera ID of the LUT
+
+        Returns
+        -------
+        axes : list
+            one `LUTAxis` for each dimension of the LUT
+        """
+        table = self.lookup[cam_id]
+        if table.axes is not None:
+            return table.axes
+
+        if cam_id not in self._default_axes:
+            features = list(self.default_features)
+            if len(features) != table.ndim:
+                features = ["attr_{}".format(i + 1) for i in range(table.ndim)]
+
+            self._default_axes[cam_id] = [
+                LUTAxis.from_edges(feature, edges, feature in self.default_overflow)
+                for feature, edges in zip(features, table.edges)]
+
+        return self._default_axes[cam_id]
+
+    def set_axes(self, axes):
+        """
+        Set the axes of the LUTs. The tables are replaced by tables
+        sharing the arrays, so instances holding the same cached tables
+        are not changed.
+
+        Parameters
+        ----------
+        axes : dictionary
+            camera IDs as keys and lists of `LUTAxis` as values
+        """
+        for cam_id, cam_axes in axes.items():
+            if cam_id in self.lookup:
+                self.lookup[cam_id] = self.lookup[cam_id].with_axes(list(cam_axes))
 
     def save(self, path):
         """
-        Save a lookuptable to a file using json
+        Save a lookuptable to a file. If the file name ends with `.npz`
+        the LUT is stored in a binary format with one group of typed
+        arrays for each camera, otherwise json is used. The axis
+        specifications and the format version are stored in json
+        under the keys "__axes__" and "__format_version__".
 
         Parameters
         ----------
         path : string
         	file to store the LUT self.lookup into
         """
+        if str(path).endswith(".npz"):
+            self.save_npz(path)
+            return
+
         dict_to_save = {}
         for key in self.lookup.keys():
             dict_to_save[key] = [l.tolist() for l in self.lookup[key]]
+        dict_to_save["__axes__"] = {key: [axis.to_dict() for axis in self.get_axes(key)]
+                                    for key in self.lookup.keys()}
+        dict_to_save["__format_version__"] = LUT_FORMAT_VERSION
 
         dump = json.dumps(dict_to_save)
         with open(path, "w") as f:
             f.write(dump)
 
+    def save_npz(self, path):
+        """
+        Save a lookuptable to a binary `.npz` file. For each camera
+        the statistic, the bin edges of each dimension and the values
+        are stored as contiguous arrays under `<cam_id>/statistic`,
+        `<cam_id>/edges_<i>` and `<cam_id>/values`. For sparse tables
+        only the stored bins are written, with their flat indices under
+        `<cam_id>/index`. The specifications
+        of the axes are stored under `<cam_id>/features`,
+        `<cam_id>/scales` and `<cam_id>/overflow`.
+
+        Parameters
+        ----------
+        path : string
+        	file to store the LUT self.lookup into
+        """
+        arrays = {"format_version": np.array(LUT_FORMAT_VERSION)}
+        for cam_id, table in self.lookup.items():
+            if isinstance(table, SparseLUTTable):
+                arrays["{}/index".format(cam_id)] = table.index
+                arrays["{}/statistic".format(cam_id)] = table.sparse_counts
+                arrays["{}/values".format(cam_id)] = table.sparse_values
+            else:
+                arrays["{}/statistic".format(cam_id)] = table.counts
+                arrays["{}/values".format(cam_id)] = table.values
+            for i, edges in enumerate(table.edges):
+                arrays["{}/edges_{}".format(cam_id, i)] = edges
+
+            axes = self.get_axes(cam_id)
+            arrays["{}/features".format(cam_id)] = np.array([a.feature for a in axes])
+            arrays["{}/scales".format(cam_id)] = np.array([a.scale for a in axes])
+            arrays["{}/overflow".format(cam_id)] = np.array([a.overflow for a in axes])
+
+        _save_npz(path, arrays)
+
     @classmethod
-    def load(cls, path):
+    def from_registry(cls, key, read):
         """
-        Read look up table and converte arrays to numpy.arrays
+        Create an instance from the LUTs cached in `lut_registry`. On
+        a miss the LUTs are read with `read` and cached.
+
+        Parameters
+        ----------
+        key : tuple
+            key of the file in the registry
+        read : callable
+            function without arguments returning a loaded instance
+
+        Returns
+        -------
+        self : LookupBase
+        """
+        lookup = lut_registry.get(key)
+        if lookup is None:
+            lookup = lut_registry.put(key, read().lookup)
+
+        self = cls()
+        self.lookup = dict(lookup)
+
+        return self
+
+    @classmethod
+    def load(cls, path, mmap_mode=None, cache=True, dtype=None):
+        """
+        Read look up table and converte arrays to numpy.arrays. Both,
+        binary `.npz` files and json files are supported.
 
         Parameters
         ----------
         path : string
-            path to the `json` file which stores the LUT
+            path to the `.npz` or `json` file which stores the LUT
+        mmap_mode : None or string
+            if given, the arrays of binary files are memory mapped
+            with this mode (e.g. "r") instead of read into memory
+        cache : bool
+            if True, the LUTs are taken from `lut_registry`, so that
+            a file is read only once as long as it is not changed.
+            The arrays are read only in this case.
+        dtype : None or numpy.dtype
+            dtype to store the values with, e.g. numpy.float32
 
         Returns
         -------
@@ -54,46 +528,94 @@ class LookupBase:
             in derived classes, it will return a instance of
             that class for further usage
         """
+        if cache:
+            return cls.from_registry(
+                lut_registry.make_key(path, "load", mmap_mode, str(dtype)),
+                lambda: cls.load(path, mmap_mode=mmap_mode, cache=False, dtype=dtype))
+
+        if zipfile.is_zipfile(path):
+            self = cls.load_npz(path, mmap_mode=mmap_mode)
+            if dtype is not None:
+                self.astype(dtype)
+            return self
+
         self = cls()
 
         with open(path) as f:
             lookup = json.load(f)
 
+        cls._check_format_version(lookup.pop("__format_version__", 1), path)
+        axes = lookup.pop("__axes__", {})
         for key in lookup.keys():
-            self.lookup[key] = np.array([np.array(l) for l in lookup[key]])
+            arrays = [np.array(l) for l in lookup[key]]
+            self.lookup[key] = self._make_table(arrays[0], arrays[1:-1],
+                                                arrays[-1])
+            if key in axes:
+                self.lookup[key].axes = [LUTAxis.from_dict(spec, edges)
+                                         for spec, edges in zip(axes[key], arrays[1:-1])]
+
+        if dtype is not None:
+            self.astype(dtype)
 
         return self
 
     @staticmethod
-    def sum_nan_arrays(arr_a, arr_b):
+    def _check_format_version(version, path):
         """
-        Sum two numpy arrays and threat np.nans as zero
-        if the the other array's entry is none nan at the
-        same position. If both values are nans leave it as
-        it was.
+        Raise an IOError if the format version of a file is newer
+        than `LUT_FORMAT_VERSION`.
+        """
+        if int(version) > LUT_FORMAT_VERSION:
+            raise IOError("LUT format version {} of file {} is not "
+                          "supported.".format(int(version), path))
+
+    @classmethod
+    def load_npz(cls, path, mmap_mode=None):
+        """
+        Read look up table from a binary `.npz` file written with
+        `save_npz`. The tables are kept dense or sparse as stored.
 
         Parameters
         ----------
-        arr_a : nunmpy.array
-        arr_b : nunmpy.array
+        path : string
+            path to the `.npz` file which stores the LUT
+        mmap_mode : None or string
+            if given, the arrays are memory mapped with this
+            mode (e.g. "r") instead of read into memory
 
         Returns
         -------
-        summed_array : sum of the input arrays
+        self : LookupBase
+            in derived classes, it will return a instance of
+            that class for further usage
         """
+        self = cls()
 
-        mask_a = np.isnan(arr_a)
-        mask_b = np.isnan(arr_b)
+        arrays = _load_npz(path, mmap_mode=mmap_mode)
+        cls._check_format_version(arrays.pop("format_version", 1), path)
 
-        # mask with positions where to keep the values
-        m_keep_a = ~mask_a & mask_b
-        m_keep_b = mask_a & ~mask_b
+        cam_ids = sorted(set(name.split("/")[0] for name in arrays))
+        for cam_id in cam_ids:
+            dims = len([name for name in arrays
+                        if name.startswith("{}/edges_".format(cam_id))])
+            edges = [arrays["{}/edges_{}".format(cam_id, i)] for i in range(dims)]
+            if "{}/index".format(cam_id) in arrays:
+                self.lookup[cam_id] = SparseLUTTable(
+                    arrays["{}/index".format(cam_id)], arrays["{}/statistic".format(cam_id)],
+                    arrays["{}/values".format(cam_id)], edges)
+            else:
+                self.lookup[cam_id] = LUTTable(arrays["{}/statistic".format(cam_id)], edges,
+                                               arrays["{}/values".format(cam_id)])
 
-        sumed_array = arr_a + arr_b
-        sumed_array[m_keep_a] = arr_a[m_keep_a]
-        sumed_array[m_keep_b] = arr_b[m_keep_b]
+            if "{}/features".format(cam_id) in arrays:
+                self.lookup[cam_id].axes = [
+                    LUTAxis(str(feature), edge, str(scale), bool(overflow))
+                    for feature, scale, overflow, edge in zip(
+                        arrays["{}/features".format(cam_id)],
+                        arrays["{}/scales".format(cam_id)],
+                        arrays["{}/overflow".format(cam_id)], edges)]
 
-        return sumed_array
+        return self
 
     @classmethod
     def combine_LUTs(cls, files):
@@ -115,52 +637,132 @@ class LookupBase:
             Dictionary with camera IDs as keys and numpy
             array of combined look up table.
         """
+        accumulator = LUTAccumulator()
+        axes = {}
+        for file in files:
+            loaded = cls.load(file)
+            axes.update({cam_id: loaded.get_axes(cam_id) for cam_id in loaded.lookup})
 
-        statistic = {}
-        sum_lookups = {}
-        bins = {}
+            try:
+                accumulator.merge(LUTAccumulator.from_lookup(loaded.lookup))
+            except AttributeError:
+                raise AttributeError("Binning does not match"
+                                     " in file {}".format(file))
 
         self = cls()
-        for file in files:
-            loaded = self.load(file)
+        self.lookup = accumulator.finalize()
+        self.set_axes(axes)
+
+        return self
+
+    @staticmethod
+    def _look_up_table(table, params, clip=None):
+        """
+        Look up arrays of parameters in a single LUT. A parameter
+        falls into bin i if edges[i] < param <= edges[i + 1].
+
+        Parameters
+        ----------
+        table : LUTTable or SparseLUTTable
+            LUT containing statistic, bin edges and values
+        params : tuple or list
+            one array of parameters for each dimension of the LUT
+        clip : tuple or list
+            one boolean for each dimension of the LUT. Parameters
+            outside of the binning of dimensions with True are looked
+            up in the first or last bin instead of being invalid.
 
-            for cam in loaded.lookup.keys():
-                dimensions = np.shape(loaded.lookup[cam])[0] - 2
+        Returns
+        -------
+        statistic : numpy.array
+            number of entries in the bins
+        value : numpy.array
+            looked up values, NaN for entries outside of the LUT
+        valid : numpy.array
+            boolean mask, False for entries outside of the LUT
+        """
+        dims = table.ndim
+        if dims != len(params):
+            raise AttributeError("Lookup table with {dim} dimentsions "
+                                 "takes exactly {dim} params for lookup, not "
+                                 "{pars}.".format(dim=dims, pars=len(params)))
 
-                # merge all LUTs
-                try:
-                    statistic[cam] += loaded.lookup[cam][0]
-                    sum_lookups[cam] = self.sum_nan_arrays(sum_lookups[cam],
-                                                           loaded.lookup[cam][0] * loaded.lookup[cam][-1])
+        _bin, valid = LookupBase._find_bins(table, params, clip)
+        statistic, value = table.take(_bin)
+        statistic = np.where(valid, statistic, 0).astype(int)
+        value = np.where(valid, value, np.nan)
 
-                except KeyError:
-                    statistic[cam] = loaded.lookup[cam][0]
-                    sum_lookups[cam] = loaded.lookup[
-                        cam][0] * loaded.lookup[cam][-1]
+        return statistic, value, valid
 
-                    bins[cam] = []
-                    for i in range(dimensions):
-                        bins[cam] += [loaded.lookup[cam][i + 1]]
+    @staticmethod
+    def _find_bins(table, params, clip=None):
+        """
+        Get the bins of arrays of parameters in a LUT, see
+        `_look_up_table`.
 
-                # control if binning is equal
-                bins_match = True
-                for i in range(dimensions):
-                    bins_match = (bins_match and (
-                        bins[cam][i] == loaded.lookup[cam][i + 1]).all())
+        Returns
+        -------
+        _bin : tuple
+            one array of bin indices for each dimension, 0 for
+            entries outside of the LUT
+        valid : numpy.array
+            boolean mask, False for entries outside of the LUT
+        """
+        params = np.broadcast_arrays(*[np.asarray(p, dtype=float)
+                                       for p in params])
+        if clip is None:
+            clip = [False] * table.ndim
+        valid = np.ones(params[0].shape, dtype=bool)
+        _bin = []
+        for i, edges in enumerate(table.edges):
+            index = np.searchsorted(edges, params[i], side="left") - 1
+            if clip[i]:
+                index = np.clip(index, 0, len(edges) - 2)
+            valid &= (index >= 0) & (index < len(edges) - 1)
+            _bin.append(index)
 
-                if not bins_match:
-                    raise AttributeError("Binning does not match"
-                                         " in file {}".format(file))
+        _bin = tuple(np.where(valid, index, 0) for index in _bin)
 
-        for cam in statistic.keys():
-            sum_lookups[cam] = sum_lookups[cam] / statistic[cam]
+        return _bin, valid
 
-            self.lookup[cam] = np.array(
-                [statistic[cam]] + bins[cam] + [sum_lookups[cam]])
+    @classmethod
+    def _look_up_cameras(cls, lookup, params, cam_ids, clip=None):
+        """
+        Look up arrays of parameters in the LUTs of a dictionary
+        with camera IDs as keys.
 
-        return self
+        Parameters
+        ----------
+        lookup : dictionary
+            LUTs with the camera IDs as keys
+        params : tuple or list
+            one array of parameters for each dimension of the LUTs
+        cam_ids : string or array-like
+            camera ID of each entry or one camera ID for all entries
+        clip : tuple or list
+            dimensions in which to clip the bins, see `_look_up_table`
 
-    def look_up_value(self, params, cam_id):
+        Returns
+        -------
+        statistic, value, valid : numpy.array
+            see `_look_up_table`
+        """
+        params = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=float))
+                                       for p in params])
+        cam_ids = np.broadcast_to(np.asarray(cam_ids), params[0].shape)
+
+        statistic = np.zeros(params[0].shape, dtype=int)
+        value = np.full(params[0].shape, np.nan)
+        valid = np.zeros(params[0].shape, dtype=bool)
+
+        for cam_id in np.unique(cam_ids):
+            sel = (cam_ids == cam_id)
+            statistic[sel], value[sel], valid[sel] = cls._look_up_table(
+                lookup[str(cam_id)], [p[sel] for p in params], clip=clip)
+
+        return statistic, value, valid
+
+    def look_up_value(self, params, cam_id, clip=None):
         """
         Get the value and number of entries to a given set of
         parameters. The number of parameters passed must be
@@ -173,6 +775,8 @@ class LookupBase:
             a list or tuple with parameters to look for
         cam_id : string
             cam_id for the key of the lookup dictionary
+        clip : tuple or list
+            dimensions in which to clip the bins, see `_look_up_table`
 
         Returns
         -------
@@ -184,75 +788,619 @@ class LookupBase:
         LookupFailedError
             if the parameters are not in range of LUT
         """
+        statistic, value, valid = self._look_up_table(self.lookup[cam_id],
+                                                      params, clip=clip)
+        if not valid:
+            raise LookupFailedError("Values outside of LUT.")
 
-        dims = np.shape(self.lookup[cam_id])[0] - 2
-        if dims != len(params):
-            raise AttributeError("Lookup table with {dim} dimentsions "
-                                 "takes exactly {dim} params for lookup, not "
-                                 "{pars}.".format(dim=dims, pars=len(params)))
-        try:
-            _bin = []
-            for i in range(dims):
-                _bin.append(np.arange(len(self.lookup[cam_id][i + 1]))[
-                    params[i] > self.lookup[cam_id][i + 1]][-1])
+        return int(statistic), float(value)
 
-            statistic = int(self.lookup[cam_id][0][tuple(_bin)])
-            value = self.lookup[cam_id][-1][tuple(_bin)]
+    def look_up_values(self, params, cam_ids, clip=None):
+        """
+        Vectorized version of `look_up_value`. Get the values and
+        number of entries for arrays of parameters, possibly
+        belonging to different cameras, in one call.
 
-        except IndexError:
+        Parameters
+        ----------
+        params : tuple or list
+            one array of parameters for each dimension of the LUT
+        cam_ids : string or array-like
+            camera ID of each entry or one camera ID for all entries
+        clip : tuple or list
+            dimensions in which to clip the bins, see `_look_up_table`
+
+        Returns
+        -------
+        statistic : numpy.array
+            number of entries in the bins
+        value : numpy.array
+            looked up values, NaN for entries outside of the LUT
+        valid : numpy.array
+            boolean mask, False for entries outside of the LUT
+        """
+        return self._look_up_cameras(self.lookup, params, cam_ids, clip=clip)
+
+    def look_up_features(self, features, cam_ids):
+        """
+        Look up arrays of features in the LUTs. The parameters of each
+        dimension are taken from `features` by the feature names of the
+        axes of the LUTs, bins of axes with overflow are clipped. This
+        way LUTs with different axes are looked up with the same call.
+
+        Parameters
+        ----------
+        features : dictionary
+            feature names as keys and the arrays of the features as
+            values. Features not used by the LUTs are ignored.
+        cam_ids : string or array-like
+            camera ID of each entry or one camera ID for all entries
+
+        Returns
+        -------
+        statistic : numpy.array
+            number of entries in the bins
+        value : numpy.array
+            looked up values, NaN for entries outside of the LUT
+        valid : numpy.array
+            boolean mask, False for entries outside of the LUT
+
+        Raises
+        ------
+        KeyError
+            if a feature required by the LUT of a camera is not given
+        """
+        names = list(features.keys())
+        arrays = np.broadcast_arrays(
+            np.asarray(cam_ids),
+            *[np.atleast_1d(np.asarray(features[name], dtype=float)) for name in names])
+        cam_ids, arrays = arrays[0], dict(zip(names, arrays[1:]))
+
+        statistic = np.zeros(cam_ids.shape, dtype=int)
+        value = np.full(cam_ids.shape, np.nan)
+        valid = np.zeros(cam_ids.shape, dtype=bool)
+
+        for cam_id in np.unique(cam_ids):
+            sel = (cam_ids == cam_id)
+            axes = self.get_axes(str(cam_id))
+
+            missing = [axis.feature for axis in axes if axis.feature not in arrays]
+            if missing:
+                raise KeyError("Features {} required by the LUT of camera {} "
+                               "not given.".format(missing, cam_id))
+
+            statistic[sel], value[sel], valid[sel] = self._look_up_table(
+                self.lookup[str(cam_id)], [arrays[axis.feature][sel] for axis in axes],
+                clip=[axis.overflow for axis in axes])
+
+        return statistic, value, valid
+
+    def look_up_feature(self, features, cam_id):
+        """
+        Get the value and number of entries for a set of features
+        of one image, see `look_up_features`.
+
+        Parameters
+        ----------
+        features : dictionary
+            feature names as keys and the features as values
+        cam_id : string
+            cam_id for the key of the lookup dictionary
+
+        Returns
+        -------
+        statistic : integer
+            number of entries in the bin
+        value : float
+            looked up value
+
+        Raises
+        ------
+        LookupFailedError
+            if the features are not in range of LUT
+        """
+        statistic, value, valid = self.look_up_features(features, cam_id)
+        if not valid[0]:
             raise LookupFailedError("Values outside of LUT.")
 
-        return statistic, value
+        return int(statistic[0]), float(value[0])
 
-    def display_lookup(self, xlabel="attr_1", ylabel="attr_2",
-                figsize=None, xscale="log", yscale="linear",
-                cmap="inferno", vmin=None, vmax=None):
+    def resolve(self, min_stat=5, fill="nearest"):
+        """
+        Precompute dense tables in self.resolved, in which the bins
+        with less than `min_stat` entries are either filled with the
+        value of the nearest bin with enough entries ("nearest") or
+        marked as invalid ("invalid"). The distance between bins is
+        measured in numbers of bins.
+
+        The resolved tables are dense for sparse LUTs as well: they
+        take 9 bytes per bin (float64 values and a boolean mask) and
+        "nearest" needs additional 4 bytes per bin and axis while
+        resolving. A warning is issued for sparse LUTs with more than
+        RESOLVE_WARN_SIZE bins, such LUTs are better looked up without
+        resolving them.
+
+        Parameters
+        ----------
+        min_stat : integer
+            minimum number of entries required in each bin
+        fill : string
+            how to treat bins with too few entries, "nearest" or
+            "invalid"
+        """
+        fill_methods = ["nearest", "invalid"]
+        if fill not in fill_methods:
+            raise KeyError("Method {} to fill bins not known. Possible "
+                           "methods are {}".format(fill, fill_methods))
+
+        self.resolved = {}
+        for cam_id, table in self.lookup.items():
+            if isinstance(table, SparseLUTTable):
+                if table.size > RESOLVE_WARN_SIZE:
+                    warnings.warn("Resolving the sparse LUT of camera {} with {} bins "
+                                  "needs about {:.0f} MB of memory.".format(
+                                      cam_id, table.size,
+                                      table.size * (9 + 4 * table.ndim * (fill == "nearest"))
+                                      / 2 ** 20))
+
+                # the stored bins are enough to find the filled ones
+                values = table.values
+                filled = np.zeros(table.shape, dtype=bool)
+                filled.flat[table.index[(table.sparse_counts >= min_stat)
+                                        & np.isfinite(table.sparse_values)]] = True
+            else:
+                values = table.values
+                filled = (table.counts >= min_stat) & np.isfinite(values)
+
+            if (fill == "nearest") and filled.any():
+                index = distance_transform_edt(~filled, return_distances=False,
+                                               return_indices=True)
+                values = values[tuple(index)]
+                valid = np.ones(values.shape, dtype=bool)
+            else:
+                values = np.where(filled, values, np.nan)
+                valid = filled
+
+            self.resolved[cam_id] = (values, valid)
+
+    def look_up_resolved(self, features, cam_ids):
+        """
+        Look up arrays of features in the tables precomputed with
+        `resolve`. Entries outside of the LUTs, in invalid bins or of
+        cameras without LUT are marked as invalid instead of raising
+        an exception.
+
+        Parameters
+        ----------
+        features : dictionary
+            feature names as keys and the arrays of the features as
+            values, see `look_up_features`
+        cam_ids : string or array-like
+            camera ID of each entry or one camera ID for all entries
+
+        Returns
+        -------
+        value : numpy.array
+            looked up values, NaN for invalid entries
+        valid : numpy.array
+            boolean mask, False for invalid entries
+        """
+        names = list(features.keys())
+        arrays = np.broadcast_arrays(
+            np.asarray(cam_ids),
+            *[np.atleast_1d(np.asarray(features[name], dtype=float)) for name in names])
+        cam_ids, arrays = arrays[0], dict(zip(names, arrays[1:]))
+
+        value = np.full(cam_ids.shape, np.nan)
+        valid = np.zeros(cam_ids.shape, dtype=bool)
+
+        for cam_id in np.unique(cam_ids):
+            if str(cam_id) not in self.resolved:
+                continue
+
+            sel = (cam_ids == cam_id)
+            axes = self.get_axes(str(cam_id))
+            _bin, in_lut = self._find_bins(
+                self.lookup[str(cam_id)], [arrays[axis.feature][sel] for axis in axes],
+                clip=[axis.overflow for axis in axes])
+
+            values, filled = self.resolved[str(cam_id)]
+            valid[sel] = in_lut & filled[_bin]
+            value[sel] = np.where(valid[sel], values[_bin], np.nan)
+
+        return value, valid
+
+    def display_lookup(self, xlabel=None, ylabel=None,
+                figsize=None, xscale=None, yscale=None,
+                cmap="inferno", vmin=None, vmax=None, dims=(0, 1)):
         """
         plot the look up tables stored in dict self.lookup. For each
         key a new line is printed with the histogram and the lookup
         values.
 
-        This method is only able to display a 2 dimensional LUT and
-        currently won't work with lookup tables of higher dimensions.
+        LUTs with more than 2 dimensions are projected onto the two
+        axes `dims`. The statistic is summed and the values are
+        averaged weighted by the statistic over the other axes.
 
         Parameters
         ----------
         xlabel : string
+            by default the feature of the first axis
         ylabel : string
+            by default the feature of the second axis
         figsize : tuple, list
         xscale : string
-            scale to use for x-axis
+            scale to use for x-axis, by default the scale of the axis
         yscale : string
-            scale to use for y-axis
+            scale to use for y-axis, by default the scale of the axis
         cmap : string
             python colormap
+        dims : tuple
+            the two axes of the LUTs to display
         """
         number_entries = len(self.lookup.keys())
         if figsize == None:
             figsize = [8, 3 * number_entries]
 
-        f, axarr = plt.subplots(number_entries, 2, figsize=figsize)
+        f, axarr = plt.subplots(number_entries, 2, figsize=figsize, squeeze=False)
 
         for i, (cam, lookup) in enumerate(self.lookup.items()):
-            stat = lookup[0].T
-            value = lookup[-1].T
+            axes = self.get_axes(cam)
+            other = tuple(d for d in range(len(axes)) if d not in dims)
+
+            stat = lookup.counts.astype(float)
+            value = lookup.values.astype(float)
+            if other:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    value = np.nansum(stat * value, axis=other) / np.sum(stat, axis=other)
+                stat = np.sum(stat, axis=other)
+            if dims[0] < dims[1]:
+                # pcolormesh expects the y axis first
+                stat, value = stat.T, value.T
 
-            xbins, ybins = (lookup[1], lookup[2])
-            stats = axarr[i, 0].pcolormesh(xbins, ybins, stat, alpha=1.,
+            x_axis, y_axis = axes[dims[0]], axes[dims[1]]
+            stats = axarr[i, 0].pcolormesh(x_axis.edges, y_axis.edges, stat, alpha=1.,
                                            cmap=cmap, norm=LogNorm())
-            dcavals = axarr[i, 1].pcolormesh(xbins, ybins, value, alpha=1.,
-                                             cmap=cmap, norm=LogNorm(),
-                                             vmin=vmin, vmax=vmax)
+            dcavals = axarr[i, 1].pcolormesh(x_axis.edges, y_axis.edges, value, alpha=1.,
+                                             cmap=cmap, norm=LogNorm(vmin=vmin, vmax=vmax))
 
             for ax, im, label in zip([axarr[i, 0], axarr[i, 1]],
                                      [stats, dcavals],
                                      ["N$_{stat}$", "value"]):
-                ax.set_xlabel(xlabel)
-                ax.set_ylabel(ylabel)
-                ax.set_xscale(xscale)
-                ax.set_yscale(yscale)
-                clb = plt.colorbar(im, ax=ax, norm=LogNorm())
+                ax.set_xlabel(x_axis.feature if xlabel is None else xlabel)
+                ax.set_ylabel(y_axis.feature if ylabel is None else ylabel)
+                ax.set_xscale(x_axis.scale if xscale is None else xscale)
+                ax.set_yscale(y_axis.scale if yscale is None else yscale)
+                clb = plt.colorbar(im, ax=ax)
                 clb.ax.set_title(label)
                 ax.set_title(cam)
 
-        plt.tight_layout()
\ No newline at end of file
+        plt.tight_layout()
+
+
+class LUTAccumulator:
+    """
+    Accumulate the number of entries, the sum and the sum of squares
+    of a value in the bins of the LUTs of each camera. In contrast to
+    merging finalized LUTs, no precision is lost by recovering the
+    sums from the mean values and the variance in each bin is kept.
+
+    Accumulators, e.g. of different files or jobs, can be merged in
+    any order, stored to disk with `save` and turned into LUTs with
+    the mean values using `finalize`.
+    """
+
+    def __init__(self, edges=None):
+        """
+        Parameters
+        ----------
+        edges : dictionary or None
+            camera IDs as keys and a list with the bin edges of each
+            dimension of the LUT as values
+        """
+        self.edges = {}
+        self.count = {}
+        self.sum = {}
+        self.sumsq = {}
+
+        if edges is not None:
+            for cam_id, cam_edges in edges.items():
+                self.edges[cam_id] = [np.asarray(e, dtype=float) for e in cam_edges]
+
+    def _add_arrays(self, cam_id, count, total, total_sq):
+        """
+        Add binned number of entries, sums and sums of squares
+        to the accumulated arrays of a camera.
+        """
+        try:
+            self.count[cam_id] = self.count[cam_id] + count
+            self.sum[cam_id] = self.sum[cam_id] + total
+            self.sumsq[cam_id] = self.sumsq[cam_id] + total_sq
+        except KeyError:
+            self.count[cam_id] = np.array(count, dtype=np.int64)
+            self.sum[cam_id] = np.array(total, dtype=float)
+            self.sumsq[cam_id] = np.array(total_sq, dtype=float)
+
+    def check_edges(self, cam_id, edges):
+        """
+        Set the binning of a camera or check that it is equal to the
+        binning already stored.
+
+        Raises
+        ------
+        AttributeError
+            if the binning does not match
+        """
+        try:
+            cam_edges = self.edges[cam_id]
+        except KeyError:
+            self.edges[cam_id] = [np.asarray(e, dtype=float) for e in edges]
+            return
+
+        bins_match = (len(cam_edges) == len(edges))
+        for edge, other in zip(cam_edges, edges):
+            bins_match = bins_match and np.array_equal(edge, other)
+
+        if not bins_match:
+            raise AttributeError("Binning does not match"
+                                 " for camera {}".format(cam_id))
+
+    def add(self, batch):
+        """
+        Add entries to the accumulator. Entries with NaNs or infs are
+        ignored, just like entries outside of the binning.
+
+        Parameters
+        ----------
+        batch : dictionary
+            camera IDs as keys and 2 dimensional arrays as values. Each
+            row contains the value as first entry followed by one
+            parameter for each dimension of the LUT, e.g.
+            [dca2, intensity, ratio].
+        """
+        for cam_id, entries in batch.items():
+            entries = np.asarray(entries, dtype=float)
+            entries = entries[np.isfinite(entries).all(axis=1)]
+
+            count, total, total_sq = binned_statistic(entries[:, 0], entries[:, 1:],
+                                                      self.edges[cam_id])
+            self._add_arrays(cam_id, count, total, total_sq)
+
+    def merge(self, other):
+        """
+        Merge another accumulator into this one. The result does not
+        depend on the order in which accumulators are merged.
+
+        Parameters
+        ----------
+        other : LUTAccumulator
+
+        Returns
+        -------
+        self : LUTAccumulator
+            the merged accumulator
+
+        Raises
+        ------
+        AttributeError
+            if the binning of a camera does not match
+        """
+        for cam_id in other.count.keys():
+            self.check_edges(cam_id, other.edges[cam_id])
+            self._add_arrays(cam_id, other.count[cam_id], other.sum[cam_id],
+                             other.sumsq[cam_id])
+
+        return self
+
+    def subtract(self, other):
+        """
+        Remove the entries of another accumulator which were merged
+        into this one before, e.g. of a file which changed. Bins which
+        become empty are reset to zero, so that no rounding residuals
+        of the sums are left.
+
+        Parameters
+        ----------
+        other : LUTAccumulator
+
+        Returns
+        -------
+        self : LUTAccumulator
+            the accumulator without the entries of `other`
+
+        Raises
+        ------
+        AttributeError
+            if the binning of a camera does not match
+        ValueError
+            if `other` contains entries which are not in this accumulator
+        """
+        for cam_id in other.count.keys():
+            if cam_id not in self.count:
+                raise ValueError("No entries of camera {} to subtract.".format(cam_id))
+            self.check_edges(cam_id, other.edges[cam_id])
+
+            count = self.count[cam_id] - other.count[cam_id]
+            if np.any(count < 0):
+                raise ValueError("More entries to subtract than accumulated "
+                                 "for camera {}.".format(cam_id))
+
+            empty = (count == 0)
+            self.count[cam_id] = count
+            self.sum[cam_id] = np.where(empty, 0., self.sum[cam_id] - other.sum[cam_id])
+            self.sumsq[cam_id] = np.where(empty, 0.,
+                                          self.sumsq[cam_id] - other.sumsq[cam_id])
+
+        return self
+
+    @classmethod
+    def tree_reduce(cls, accumulators):
+        """
+        Merge accumulators pairwise in a binary tree. The shape of the
+        tree only depends on the number and order of the accumulators,
+        so the result is reproducible bit for bit no matter in which
+        process the accumulators were created. Only about log2(n)
+        accumulators are kept in memory at the same time, so `accumulators`
+        can be a generator.
+
+        Parameters
+        ----------
+        accumulators : iterable
+            LUTAccumulators to merge, they are modified in place
+
+        Returns
+        -------
+        accumulator : LUTAccumulator
+            the merged accumulator
+        """
+        stack = []  # pairs of (tree level, accumulator)
+        for accumulator in accumulators:
+            level = 0
+            while stack and stack[-1][0] == level:
+                accumulator = stack.pop()[1].merge(accumulator)
+                level += 1
+            stack.append((level, accumulator))
+
+        if not stack:
+            return cls()
+
+        accumulator = stack.pop()[1]
+        while stack:
+            accumulator = stack.pop()[1].merge(accumulator)
+
+        return accumulator
+
+    def mean(self):
+        """
+        Mean value in each bin, NaN for empty bins.
+
+        Returns
+        -------
+        mean : dictionary
+            camera IDs as keys and arrays of the mean values
+        """
+        mean = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for cam_id in self.count.keys():
+                mean[cam_id] = self.sum[cam_id] / self.count[cam_id]
+
+        return mean
+
+    def variance(self):
+        """
+        Variance of the values in each bin, NaN for empty bins or
+        if the sums of squares are not known.
+
+        Returns
+        -------
+        variance : dictionary
+            camera IDs as keys and arrays of the variances
+        """
+        variance = {}
+        mean = self.mean()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for cam_id in self.count.keys():
+                variance[cam_id] = (self.sumsq[cam_id] / self.count[cam_id]
+                                    - mean[cam_id] ** 2)
+
+        return variance
+
+    def finalize(self):
+        """
+        Create the LUTs with the mean values in each bin. Sparsely
+        filled LUTs are stored as `SparseLUTTable`, see `make_table`.
+
+        Returns
+        -------
+        lookup : dictionary
+            camera IDs as keys and the LUTs containing the statistic,
+            the bin edges and the mean values as values
+        """
+        mean = self.mean()
+        lookup = {}
+        for cam_id in self.count.keys():
+            lookup[cam_id] = make_table(self.count[cam_id], self.edges[cam_id],
+                                        mean[cam_id])
+
+        return lookup
+
+    @classmethod
+    def from_lookup(cls, lookup):
+        """
+        Create an accumulator from finalized LUTs. The sums are
+        recovered from the statistic and the mean values, the sums
+        of squares are not known and set to NaN.
+
+        Parameters
+        ----------
+        lookup : dictionary
+            camera IDs as keys and LUTs as values
+
+        Returns
+        -------
+        self : LUTAccumulator
+        """
+        self = cls()
+        for cam_id, table in lookup.items():
+            table = LUTTable.from_tuple(table)
+            count = np.rint(table.counts).astype(np.int64)
+            total = np.where(count > 0, table.counts * table.values.astype(float), 0)
+
+            self.edges[cam_id] = list(table.edges)
+            self._add_arrays(cam_id, count, total, np.full(count.shape, np.nan))
+
+        return self
+
+    def save(self, path):
+        """
+        Store the accumulator to a binary `.npz` file.
+
+        Parameters
+        ----------
+        path : string
+            file to store the accumulator into
+        """
+        arrays = {"format_version": np.array(LUT_FORMAT_VERSION)}
+        for cam_id, edges in self.edges.items():
+            for i, edge in enumerate(edges):
+                arrays["{}/edges_{}".format(cam_id, i)] = edge
+
+            if cam_id in self.count:
+                arrays["{}/count".format(cam_id)] = self.count[cam_id]
+                arrays["{}/sum".format(cam_id)] = self.sum[cam_id]
+                arrays["{}/sumsq".format(cam_id)] = self.sumsq[cam_id]
+
+        _save_npz(path, arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an accumulator stored with `save`.
+
+        Parameters
+        ----------
+        path : string
+            `.npz` file with the accumulator
+
+        Returns
+        -------
+        self : LUTAccumulator
+        """
+        self = cls()
+
+        arrays = _load_npz(path)
+        arrays.pop("format_version", None)
+
+        cam_ids = sorted(set(name.split("/")[0] for name in arrays))
+        for cam_id in cam_ids:
+            dims = len([name for name in arrays
+                        if name.startswith("{}/edges_".format(cam_id))])
+            self.edges[cam_id] = [arrays["{}/edges_{}".format(cam_id, i)]
+                                  for i in range(dims)]
+
+            if "{}/count".format(cam_id) in arrays:
+                self._add_arrays(cam_id, arrays["{}/count".format(cam_id)],
+                                 arrays["{}/sum".format(cam_id)],
+                                 arrays["{}/sumsq".format(cam_id)])
+
+        return self
@@ -0,0 +1,328 @@
+"""
+Containers for a single look up table, stored either dense or sparse.
+"""
+
+import numpy as np
+
+# tables with at least SPARSE_MIN_SIZE bins of which less than a
+# fraction of SPARSE_MAX_FILL is filled are stored sparse by `make_table`
+SPARSE_MAX_FILL = 0.1
+SPARSE_MIN_SIZE = 4096
+
+
+def make_table(counts, edges, values, axes=None, sparse=None):
+    """
+    Create a dense `LUTTable` or a `SparseLUTTable`. Both provide the
+    same interface, so the lookup does not depend on the choice.
+
+    Parameters
+    ----------
+    counts : array-like
+        number of entries in each bin
+    edges : list or tuple
+        one array with the bin edges for each dimension
+    values : array-like
+        look up values
+    axes : list or None
+        one `LUTAxis` for each dimension
+    sparse : bool or None
+        if None, the table is stored sparse if it has at least
+        `SPARSE_MIN_SIZE` bins and less than a fraction of
+        `SPARSE_MAX_FILL` of the bins is filled
+
+    Returns
+    -------
+    table : LUTTable or SparseLUTTable
+    """
+    table = LUTTable(counts, edges, values, axes)
+    if sparse is None:
+        sparse = (table.values.size >= SPARSE_MIN_SIZE) and \
+                 (table.fill_fraction < SPARSE_MAX_FILL)
+
+    if sparse:
+        return SparseLUTTable.from_dense(table)
+
+    return table
+
+
+class LUTTable:
+    """
+    Look up table of one camera with contiguous arrays for the number
+    of entries in each bin (counts), the bin edges of each dimension
+    (edges) and the look up values (values). Optionally the axes of
+    the table are described by a list of `LUTAxis`.
+
+    Sparsely filled tables can be stored as `SparseLUTTable` with the
+    same interface instead, see `make_table`.
+
+    For compatibility with the former layout of the LUTs, an object
+    array [statistic, edges_0, ..., edges_n, values], the table can be
+    indexed and iterated in the same way, e.g. table[0] are the counts
+    and table[-1] the values.
+    """
+
+    __slots__ = ("counts", "edges", "values", "axes")
+
+    def __init__(self, counts, edges, values, axes=None, dtype=None):
+        """
+        Parameters
+        ----------
+        counts : array-like
+            number of entries in each bin
+        edges : list or tuple
+            one array with the bin edges for each dimension
+        values : array-like
+            look up values
+        axes : list or None
+            one `LUTAxis` for each dimension
+        dtype : None or numpy.dtype
+            dtype of the values, e.g. numpy.float32 to half the
+            memory, by default the values are stored as given
+        """
+        self.counts = np.ascontiguousarray(counts)
+        self.edges = tuple(np.ascontiguousarray(edge, dtype=float) for edge in edges)
+        self.values = np.ascontiguousarray(values, dtype=dtype)
+        self.axes = axes
+
+        shape = tuple(len(edge) - 1 for edge in self.edges)
+        if (self.counts.shape != shape) or (self.values.shape != shape):
+            raise AttributeError("Shape of counts {} and values {} does not match "
+                                 "the binning {}.".format(self.counts.shape,
+                                                          self.values.shape, shape))
+
+    @classmethod
+    def from_tuple(cls, table):
+        """
+        Create a table from the former layout
+        [statistic, edges_0, ..., edges_n, values].
+        """
+        if isinstance(table, cls):
+            return table
+
+        return cls(table[0], list(table[1:-1]), table[-1])
+
+    def as_tuple(self):
+        """
+        Table in the former layout (statistic, edges_0, ..., edges_n, values).
+        """
+        return (self.counts,) + self.edges + (self.values,)
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __len__(self):
+        return len(self.edges) + 2
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __repr__(self):
+        return "LUTTable(shape={}, dtype={})".format(self.values.shape, self.values.dtype)
+
+    @property
+    def ndim(self):
+        return len(self.edges)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def fill_fraction(self):
+        """
+        Fraction of the bins with entries or a finite value.
+        """
+        filled = (self.counts != 0) | ~np.isnan(self.values)
+        return np.count_nonzero(filled) / max(filled.size, 1)
+
+    def arrays(self):
+        """
+        Arrays holding the data of the table.
+        """
+        return (self.counts,) + self.edges + (self.values,)
+
+    def astype(self, dtype):
+        """
+        Copy of the table with the values stored with another dtype.
+        """
+        return LUTTable(self.counts, self.edges, self.values, self.axes, dtype=dtype)
+
+    def with_axes(self, axes):
+        """
+        Table sharing the arrays with this one, but with other axes.
+        """
+        return LUTTable(self.counts, self.edges, self.values, axes)
+
+    def to_dense(self):
+        return self
+
+    def take(self, index):
+        """
+        Number of entries and values in the bins.
+
+        Parameters
+        ----------
+        index : tuple
+            one array of bin indices for each dimension
+
+        Returns
+        -------
+        counts : numpy.array
+            number of entries in the bins
+        values : numpy.array
+            values in the bins
+        """
+        return self.counts[index], self.values[index]
+
+
+class SparseLUTTable:
+    """
+    Look up table of one camera in which only the filled bins are
+    stored. The flat indices of these bins (index) are sorted, so a bin
+    is found by binary search, and the number of entries (sparse_counts)
+    and the values (sparse_values) are stored for these bins only. Bins
+    which are not stored have no entries and a value of NaN.
+
+    The table provides the same interface as `LUTTable`. The dense
+    arrays `counts` and `values` are created on access, the lookup with
+    `take` works on the sparse arrays.
+    """
+
+    __slots__ = ("index", "sparse_counts", "sparse_values", "edges", "axes")
+
+    def __init__(self, index, counts, values, edges, axes=None, dtype=None):
+        """
+        Parameters
+        ----------
+        index : array-like
+            sorted flat indices of the stored bins
+        counts : array-like
+            number of entries in the stored bins
+        values : array-like
+            look up values of the stored bins
+        edges : list or tuple
+            one array with the bin edges for each dimension
+        axes : list or None
+            one `LUTAxis` for each dimension
+        dtype : None or numpy.dtype
+            dtype of the values, by default the values are stored as
+            given
+        """
+        self.index = np.ascontiguousarray(index, dtype=np.int64)
+        self.sparse_counts = np.ascontiguousarray(counts)
+        self.sparse_values = np.ascontiguousarray(values, dtype=dtype)
+        self.edges = tuple(np.ascontiguousarray(edge, dtype=float) for edge in edges)
+        self.axes = axes
+
+        if (self.index.ndim != 1) or (self.sparse_counts.shape != self.index.shape) or \
+                (self.sparse_values.shape != self.index.shape):
+            raise AttributeError("Shape of index {}, counts {} and values {} does not "
+                                 "match.".format(self.index.shape, self.sparse_counts.shape,
+                                                 self.sparse_values.shape))
+        if np.any(np.diff(self.index) <= 0) or \
+                (len(self.index) and ((self.index[0] < 0) or (self.index[-1] >= self.size))):
+            raise AttributeError("Index of the bins has to be sorted, unique and "
+                                 "within the binning {}.".format(self.shape))
+
+    @classmethod
+    def from_dense(cls, table):
+        """
+        Create a sparse table from a `LUTTable`, storing the bins
+        with entries or a finite value.
+        """
+        counts = table.counts.ravel()
+        values = table.values.ravel()
+        index = np.flatnonzero((counts != 0) | ~np.isnan(values))
+
+        return cls(index, counts[index], values[index], table.edges, table.axes)
+
+    def to_dense(self):
+        """
+        Dense `LUTTable` with the same content.
+        """
+        return LUTTable(self.counts, self.edges, self.values, self.axes)
+
+    def as_tuple(self):
+        """
+        Table in the former layout (statistic, edges_0, ..., edges_n, values).
+        """
+        return (self.counts,) + self.edges + (self.values,)
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __len__(self):
+        return len(self.edges) + 2
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __repr__(self):
+        return "SparseLUTTable(shape={}, filled={}, dtype={})".format(
+            self.shape, len(self.index), self.sparse_values.dtype)
+
+    @property
+    def ndim(self):
+        return len(self.edges)
+
+    @property
+    def shape(self):
+        return tuple(len(edge) - 1 for edge in self.edges)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def fill_fraction(self):
+        """
+        Fraction of the bins with entries or a finite value.
+        """
+        return len(self.index) / max(self.size, 1)
+
+    @property
+    def counts(self):
+        counts = np.zeros(self.size, dtype=self.sparse_counts.dtype)
+        counts[self.index] = self.sparse_counts
+        return counts.reshape(self.shape)
+
+    @property
+    def values(self):
+        values = np.full(self.size, np.nan, dtype=self.sparse_values.dtype)
+        values[self.index] = self.sparse_values
+        return values.reshape(self.shape)
+
+    def arrays(self):
+        """
+        Arrays holding the data of the table.
+        """
+        return (self.index, self.sparse_counts) + self.edges + (self.sparse_values,)
+
+    def astype(self, dtype):
+        """
+        Copy of the table with the values stored with another dtype.
+        """
+        return SparseLUTTable(self.index, self.sparse_counts, self.sparse_values,
+                              self.edges, self.axes, dtype=dtype)
+
+    def with_axes(self, axes):
+        """
+        Table sharing the arrays with this one, but with other axes.
+        """
+        return SparseLUTTable(self.index, self.sparse_counts, self.sparse_values,
+                              self.edges, axes)
+
+    def take(self, index):
+        """
+        Number of entries and values in the bins, see `LUTTable.take`.
+        """
+        flat = np.ravel_multi_index(index, self.shape)
+        if len(self.index) == 0:
+            return (np.zeros(flat.shape, dtype=self.sparse_counts.dtype),
+                    np.full(flat.shape, np.nan, dtype=self.sparse_values.dtype))
+
+        position = np.minimum(np.searchsorted(self.index, flat), len(self.index) - 1)
+        found = (self.index[position] == flat)
+
+        return (np.where(found, self.sparse_counts[position], 0),
+                np.where(found, self.sparse_values[position], np.nan))
@@ -0,0 +1,249 @@
+"""
+Manifest of the files ingested into a LUT, used to build LUTs
+incrementally.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from konsta_cta.reco.lookup_base import LUTAccumulator
+
+# version of the manifest written by `IngestionManifest.save`
+MANIFEST_VERSION = 1
+
+
+def file_hash(path, blocksize=2**20):
+    """
+    SHA-256 hash of the content of a file.
+
+    Parameters
+    ----------
+    path : string
+        file to hash
+    blocksize : integer
+        number of bytes read at once
+
+    Returns
+    -------
+    hash : string
+        hexadecimal digest
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Record of the files ingested into a LUT. For each file the path,
+    size, modification time and content hash are stored together with
+    the partial accumulator of the file. Files which are new or changed
+    since the last run are ingested, the partial accumulators of changed
+    or removed files are subtracted from the total accumulator.
+
+    The state is kept in the directory `state_dir`:
+    manifest.json with the records of the files, partials/ with the
+    partial accumulator of each file and the total accumulator.
+    Superseded files are only deleted after the new manifest is written,
+    so that an interrupted run leaves a consistent state behind.
+    """
+
+    def __init__(self, state_dir, signature):
+        """
+        Parameters
+        ----------
+        state_dir : string
+            directory to keep the manifest and accumulators in
+        signature : string
+            signature of the binning, see `make_signature`
+        """
+        self.state_dir = state_dir
+        self.signature = signature
+        self.files = {}
+        self.total = LUTAccumulator()
+        self.generation = 0
+        self._obsolete = []
+
+    @staticmethod
+    def make_signature(edges, key, columns):
+        """
+        Signature of the binning and the columns read from the files.
+        Accumulators are only reused if the signature did not change.
+
+        Parameters
+        ----------
+        edges : dictionary
+            camera IDs as keys and the bin edges as values
+        key : string
+            key to the data in the HDF5 files
+        columns : tuple or list
+            columns read from the files
+
+        Returns
+        -------
+        signature : string
+        """
+        spec = {"key": key, "columns": list(columns),
+                "edges": {str(cam_id): [np.asarray(edge, dtype=float).tolist()
+                                        for edge in edges[cam_id]]
+                          for cam_id in sorted(edges)}}
+
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def manifest_file(self):
+        return os.path.join(self.state_dir, "manifest.json")
+
+    def _state_file(self, name):
+        return os.path.join(self.state_dir, name)
+
+    @classmethod
+    def open(cls, state_dir, signature):
+        """
+        Read the manifest from `state_dir`. A new manifest is started if
+        there is none or if the binning changed.
+
+        Parameters
+        ----------
+        state_dir : string
+            directory with the manifest and accumulators
+        signature : string
+            signature of the binning, see `make_signature`
+
+        Returns
+        -------
+        self : IngestionManifest
+        """
+        self = cls(state_dir, signature)
+        if not os.path.exists(self.manifest_file):
+            return self
+
+        with open(self.manifest_file) as f:
+            manifest = json.load(f)
+
+        if manifest["format_version"] > MANIFEST_VERSION:
+            raise IOError("Manifest version {} of {} is not supported.".format(
+                manifest["format_version"], self.manifest_file))
+
+        if manifest["signature"] != signature:
+            print("Binning changed since the last run, all files are ingested again.")
+            self._obsolete = [record["partial"] for record in manifest["files"].values()]
+            self._obsolete.append(manifest["total"])
+            return self
+
+        self.files = manifest["files"]
+        self.generation = manifest["generation"]
+        self.total = LUTAccumulator.load(self._state_file(manifest["total"]))
+
+        return self
+
+    def plan(self, files):
+        """
+        Compare the files with the manifest. The content hash is only
+        calculated for files which are new or whose size or modification
+        time changed.
+
+        Parameters
+        ----------
+        files : list
+            files which should be ingested
+
+        Returns
+        -------
+        changed : dictionary
+            absolute paths of new or changed files as keys and their
+            records (size, mtime_ns and hash) as values
+        removed : list
+            absolute paths of ingested files which are not in `files`
+        """
+        changed = {}
+        paths = set()
+        for file in files:
+            path = os.path.abspath(file)
+            paths.add(path)
+
+            stat = os.stat(path)
+            record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            old = self.files.get(path)
+            if (old is not None) and (old["size"] == record["size"]) and \
+                    (old["mtime_ns"] == record["mtime_ns"]):
+                continue
+
+            record["hash"] = file_hash(path)
+            if (old is not None) and (old["hash"] == record["hash"]):
+                # only touched, the content is the same
+                old.update(record)
+                continue
+
+            changed[path] = record
+
+        removed = [path for path in self.files if path not in paths]
+
+        return changed, removed
+
+    def remove(self, path):
+        """
+        Subtract the partial accumulator of an ingested file from the
+        total accumulator and remove the file from the manifest.
+
+        Parameters
+        ----------
+        path : string
+            absolute path of the file
+        """
+        record = self.files.pop(path)
+        self.total.subtract(LUTAccumulator.load(self._state_file(record["partial"])))
+        self._obsolete.append(record["partial"])
+
+    def add(self, path, record, accumulator):
+        """
+        Add the partial accumulator of a file to the total accumulator
+        and record the file in the manifest.
+
+        Parameters
+        ----------
+        path : string
+            absolute path of the file
+        record : dictionary
+            size, mtime_ns and hash of the file, see `plan`
+        accumulator : LUTAccumulator
+            entries of the file
+        """
+        name = hashlib.sha256(path.encode()).hexdigest()[:16]
+        record = dict(record, partial=os.path.join(
+            "partials", "{}_{}.npz".format(name, record["hash"][:16])))
+
+        os.makedirs(self._state_file("partials"), exist_ok=True)
+        accumulator.save(self._state_file(record["partial"]))
+
+        self.total.merge(accumulator)
+        self.files[path] = record
+
+    def save(self):
+        """
+        Write the total accumulator and the manifest. Files which are
+        not used anymore are deleted afterwards.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        previous = "total_{}.npz".format(self.generation)
+        self.generation += 1
+        total = "total_{}.npz".format(self.generation)
+        self.total.save(self._state_file(total))
+
+        manifest = {"format_version": MANIFEST_VERSION, "signature": self.signature,
+                    "generation": self.generation, "total": total, "files": self.files}
+        with open(self.manifest_file + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+        used = {record["partial"] for record in self.files.values()}
+        used.add(total)
+        for name in self._obsolete + [previous]:
+            if (name not in used) and os.path.exists(self._state_file(name)):
+                os.remove(self._state_file(name))
+        self._obsolete = []
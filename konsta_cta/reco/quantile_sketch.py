@@ -0,0 +1,201 @@
+"""
+Mergeable streaming quantile sketch used to derive equal population
+bin edges for the LUTs.
+"""
+
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch of a stream of values. The values are kept in
+    compactors of increasing level, an item in level h stands for 2**h
+    values. If a compactor exceeds its capacity, it is sorted and every
+    second item is promoted to the next level, starting at a random
+    offset. The memory used is of order k * log(n / k) items, the error
+    of a rank is of order 1 / k.
+
+    Sketches, e.g. of different files or processes, can be merged with
+    `merge`. The random offsets are drawn from a generator seeded with
+    `seed`, so a sketch built from the same values in the same order
+    is reproducible.
+    """
+
+    # shrinking factor of the capacities towards the lower levels
+    c = 2. / 3.
+
+    def __init__(self, k=200, seed=0):
+        """
+        Parameters
+        ----------
+        k : integer
+            capacity of the top level compactor, controlling the accuracy
+        seed : integer
+            seed of the random offsets of the compactions
+        """
+        self.k = int(k)
+        self.compactors = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def __repr__(self):
+        return "QuantileSketch(k={}, n={}, items={})".format(
+            self.k, self.n, sum(len(c) for c in self.compactors))
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * self.c ** depth)))
+
+    def _compress(self):
+        """
+        Compact the levels exceeding their capacity.
+        """
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+
+                items = np.sort(items)
+                # an odd item stays in the level
+                keep = items[:len(items) % 2]
+                items = items[len(keep):]
+                promoted = items[self._rng.integers(2)::2]
+
+                self.compactors[level] = keep
+                self.compactors[level + 1] = np.concatenate(
+                    (self.compactors[level + 1], promoted))
+            level += 1
+
+    def add(self, values):
+        """
+        Add values to the sketch, NaNs are ignored.
+
+        Parameters
+        ----------
+        values : array-like
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.compactors[0] = np.concatenate((self.compactors[0], values))
+        self._compress()
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Parameters
+        ----------
+        other : QuantileSketch
+
+        Returns
+        -------
+        self : QuantileSketch
+            the merged sketch
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate((self.compactors[level], items))
+
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+        return self
+
+    def _cdf(self):
+        """
+        Sorted items of all levels and their cumulative weights.
+        """
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(c), 2. ** level)
+                                  for level, c in enumerate(self.compactors)])
+        order = np.argsort(items, kind="stable")
+
+        return items[order], np.cumsum(weights[order])
+
+    def rank(self, x):
+        """
+        Estimated fraction of the values which are smaller or equal x.
+
+        Parameters
+        ----------
+        x : float or array-like
+
+        Returns
+        -------
+        rank : float or numpy.array
+        """
+        if self.n == 0:
+            return np.full(np.shape(x), np.nan)[()]
+
+        items, cumulative = self._cdf()
+        index = np.searchsorted(items, x, side="right")
+        cumulative = np.concatenate(([0.], cumulative))
+
+        return cumulative[index] / cumulative[-1]
+
+    def quantiles(self, q):
+        """
+        Estimated quantiles of the values. The quantiles 0 and 1 are
+        the exact minimum and maximum.
+
+        Parameters
+        ----------
+        q : float or array-like
+            quantiles between 0 and 1
+
+        Returns
+        -------
+        quantiles : float or numpy.array
+        """
+        q = np.asarray(q, dtype=float)
+        if self.n == 0:
+            return np.full(q.shape, np.nan)[()]
+
+        items, cumulative = self._cdf()
+        index = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        quantiles = items[np.clip(index, 0, len(items) - 1)]
+        quantiles = np.where(q <= 0, self.min, quantiles)
+        quantiles = np.where(q >= 1, self.max, quantiles)
+
+        return quantiles[()]
+
+    def edges(self, nbins, low=None, high=None):
+        """
+        Bin edges with about the same number of values in each bin.
+
+        Parameters
+        ----------
+        nbins : integer
+            number of bins
+        low, high : float or None
+            range of the bins, by default the minimum and maximum
+            value. Only the values within the range are split into
+            bins of equal population.
+
+        Returns
+        -------
+        edges : numpy.array
+            sorted unique edges. If many values are equal, less than
+            nbins bins are returned.
+        """
+        low = self.min if low is None else low
+        high = self.max if high is None else high
+
+        q = np.linspace(self.rank(low), self.rank(high), nbins + 1)[1:-1]
+        inner = np.asarray(self.quantiles(q)).ravel()
+        inner = inner[(inner > low) & (inner < high)]
+
+        return np.unique(np.concatenate(([low], inner, [high])))
@@ -0,0 +1,164 @@
+"""
+Publish loaded LUTs in shared memory, so that several worker processes
+on one node look up values in the same copy of the tables.
+"""
+
+import numpy as np
+from multiprocessing import shared_memory
+from konsta_cta.reco.lookup_base import LUTAxis
+from konsta_cta.reco.lut_table import LUTTable, SparseLUTTable
+
+# alignment of the arrays in the shared memory block in bytes
+_ALIGNMENT = 64
+
+
+def _attach_block(name):
+    """
+    Attach to an existing shared memory block without tracking it, the
+    block is removed by the publishing process. Before python 3.13 the
+    block can not be attached untracked, but workers started by the
+    publishing process share its resource tracker, so the block is not
+    removed when they exit either.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedLUT:
+    """
+    LUTs of a `LookupGenerator` or `DiffuseLUT` copied into one block of
+    `multiprocessing.shared_memory`. The publishing process creates the
+    block with `publish` and passes the picklable `handle` to the
+    workers, e.g. as argument of the initializer of a Pool. The workers
+    create instances of the LUT class with `attach`, whose tables are
+    read only views into the block, so the memory used does not grow
+    with the number of workers. The resolved tables of `resolve` are
+    shared as well.
+
+    The publishing process owns the block and removes it with `unlink`
+    once the workers are done, e.g. by using the instance as context
+    manager.
+    """
+
+    def __init__(self, block, handle):
+        self.block = block
+        self.handle = handle
+
+    @classmethod
+    def publish(cls, lut, name=None):
+        """
+        Copy the LUTs of an instance into a new shared memory block.
+
+        Parameters
+        ----------
+        lut : LookupBase
+            instance with the loaded LUTs, e.g. a `LookupGenerator`
+        name : string or None
+            name of the block, by default a unique name is chosen
+
+        Returns
+        -------
+        self : SharedLUT
+        """
+        arrays = []
+        size = 0
+
+        def add(array):
+            nonlocal size
+            array = np.ascontiguousarray(array)
+            spec = (size, array.shape, array.dtype.str)
+            arrays.append((array, spec))
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+            return spec
+
+        tables = {}
+        for cam_id, table in lut.lookup.items():
+            axes = None
+            if table.axes is not None:
+                axes = [axis.to_dict() for axis in table.axes]
+            tables[cam_id] = {"sparse": isinstance(table, SparseLUTTable),
+                              "arrays": [add(array) for array in table.arrays()],
+                              "axes": axes}
+
+        resolved = {cam_id: [add(values), add(valid)]
+                    for cam_id, (values, valid) in lut.resolved.items()}
+
+        block = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        for array, spec in arrays:
+            _view(block, spec, readonly=False)[...] = array
+
+        handle = {"name": block.name, "cls": type(lut), "tables": tables,
+                  "resolved": resolved}
+
+        return cls(block, handle)
+
+    @staticmethod
+    def attach(handle):
+        """
+        Create an instance of the LUT class from a published block. The
+        block stays attached as long as the instance exists.
+
+        Parameters
+        ----------
+        handle : dictionary
+            `handle` of the published `SharedLUT`
+
+        Returns
+        -------
+        lut : LookupBase
+            instance of the class of the published LUT
+        """
+        block = _attach_block(handle["name"])
+
+        lut = handle["cls"]()
+        lut._shared_block = block
+        for cam_id, spec in handle["tables"].items():
+            arrays = [_view(block, array) for array in spec["arrays"]]
+            if spec["sparse"]:
+                edges = arrays[2:-1]
+                table = SparseLUTTable(arrays[0], arrays[1], arrays[-1], edges)
+            else:
+                edges = arrays[1:-1]
+                table = LUTTable(arrays[0], edges, arrays[-1])
+
+            if spec["axes"] is not None:
+                table.axes = [LUTAxis.from_dict(axis, edge)
+                              for axis, edge in zip(spec["axes"], table.edges)]
+            lut.lookup[cam_id] = table
+
+        for cam_id, (values, valid) in handle["resolved"].items():
+            lut.resolved[cam_id] = (_view(block, values), _view(block, valid))
+
+        return lut
+
+    def close(self):
+        """
+        Detach the publishing process from the block.
+        """
+        self.block.close()
+
+    def unlink(self):
+        """
+        Remove the block. Instances attached to it keep working until
+        they are deleted.
+        """
+        self.block.close()
+        self.block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+
+def _view(block, spec, readonly=True):
+    """
+    Array in a shared memory block given by (offset, shape, dtype).
+    """
+    offset, shape, dtype = spec
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+    array.flags.writeable = not readonly
+    return array
@@ -0,0 +1,83 @@
+"""
+Benchmark of the batched tailcut cleaning against ctapipe's
+tailcuts_clean. Noisy images with elliptical showers are cleaned per
+image with ctapipe and per stack with tailcuts_clean_batch using the
+cached sparse neighbour matrix. The masks are checked in
+tests/test_cleaning.py.
+"""
+
+from konsta_cta.cleaning import tailcuts_clean_batch
+from konsta_cta.cutter import camera_geometry_cache
+from ctapipe.instrument import CameraGeometry
+from ctapipe.image.cleaning import tailcuts_clean
+from timeit import default_timer as timer
+import numpy as np
+import argparse
+import json
+import os
+
+
+def make_images(rng, camera, n):
+    """
+    Images of elliptical showers with random position, orientation and
+    size on top of noise.
+    """
+    pix_x = camera.pix_x.value
+    pix_y = camera.pix_y.value
+    extent = np.abs(pix_x).max()
+
+    cog_x, cog_y = rng.uniform(-0.7 * extent, 0.7 * extent, (2, n, 1))
+    length = rng.uniform(0.02, 0.2, (n, 1)) * extent
+    width = length * rng.uniform(0.1, 0.8, (n, 1))
+    psi = rng.uniform(0, np.pi, (n, 1))
+
+    delta_x = pix_x - cog_x
+    delta_y = pix_y - cog_y
+    longitudinal = delta_x * np.cos(psi) + delta_y * np.sin(psi)
+    transversal = -delta_x * np.sin(psi) + delta_y * np.cos(psi)
+
+    images = rng.exponential(200, (n, 1)) * np.exp(-0.5 * (longitudinal / length) ** 2
+                                                   - 0.5 * (transversal / width) ** 2)
+
+    return images + rng.normal(0, 2, images.shape)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                             "write_feature_list", "configfiles",
+                                             "config_point_default.json"),
+                        help="configuration file with the thresholds of the cameras")
+    parser.add_argument("--images", type=int, default=1000,
+                        help="number of images per camera")
+    args = parser.parse_args()
+
+    with open(args.config) as json_file:
+        preparer = json.load(json_file)["Preparer"]
+
+    rng = np.random.RandomState(0)
+
+    print("{:>10} {:>8} {:>12} {:>12} {:>8}".format(
+        "camera", "images", "ctapipe [s]", "batch [s]", "speedup"))
+
+    for cam_id, (boundary, picture) in preparer["tail_thresholds"].items():
+        camera = CameraGeometry.from_name(cam_id)
+        images = make_images(rng, camera, args.images)
+        neighbor_matrix = camera_geometry_cache.get(camera).neighbor_matrix_sparse
+
+        start = timer()
+        for image in images:
+            tailcuts_clean(camera, image, picture_thresh=picture, boundary_thresh=boundary,
+                           min_number_picture_neighbors=preparer["min_neighbors"])
+        time_ctapipe = timer() - start
+
+        start = timer()
+        tailcuts_clean_batch(neighbor_matrix, images, picture_thresh=picture,
+                             boundary_thresh=boundary,
+                             min_number_picture_neighbors=preparer["min_neighbors"])
+        time_batch = timer() - start
+
+        print("{:>10} {:>8} {:>12.4f} {:>12.4f} {:>8.1f}".format(
+            cam_id, len(images), time_ctapipe, time_batch, time_ctapipe / time_batch))
@@ -0,0 +1,184 @@
+"""
+Check that the memory used by the per event state of PrepareList does
+not grow with the number of events. Formerly the pointing and the
+maximum signal of the telescopes were stored in dictionaries shared by
+all instances, which kept the entries of all former events alive. Now
+each event is filled into its own PrepareList and EventResult.
+
+Synthetic events with images of a random set of telescopes are
+processed with `EventPipeline.process`, i.e. the images are cleaned,
+parametrized and cut and the result is collected as in
+analyse_file_write_list.py. The images are given at the dl1 level, so
+the calibrator of the pipeline is replaced by one doing nothing, and
+the HillasReconstructor by a stand-in returning the true direction, as
+both need the full simulated event. The resident memory is printed at
+ten checkpoints and its growth after the first checkpoint has to stay
+below --max_growth.
+
+The check therefore covers the preparation of the events (cleaning,
+parametrization, cuts and the collected results) but not the memory of
+ctapipe's CameraCalibrator and HillasReconstructor. It is a script to be
+run by hand and not part of any test suite.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "write_feature_list"))
+
+from prepare_featurelist import EventPipeline, EventResult
+from ctapipe.reco.HillasReconstructor import TooFewTelescopesException
+from ctapipe.instrument import CameraGeometry
+from astropy import units as u
+from types import SimpleNamespace
+import numpy as np
+import argparse
+import json
+import resource
+
+# cameras with a single gain channel, no gain selection is needed
+CAMERAS = ["FlashCam", "CHEC", "DigiCam", "SCTCam"]
+
+
+def resident_memory():
+    """
+    Resident memory of the process in MB.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except IOError:
+        # maximum resident memory, in kB on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+class NoCalibration(object):
+    """
+    Calibrator for events which already contain the dl1 images.
+    """
+
+    def calibrate(self, event):
+        pass
+
+
+class TrueDirection(object):
+    """
+    Stand-in for the HillasReconstructor returning the true direction
+    and core position of the event.
+    """
+
+    def __init__(self):
+        self.event = None
+
+    def predict(self, hillas_dict, inst, pointing_alt, pointing_az, ext_weight=None):
+        return SimpleNamespace(alt=self.event.mc.alt, az=self.event.mc.az,
+                               core_x=self.event.mc.core_x, core_y=self.event.mc.core_y)
+
+
+def make_image(rng, camera):
+    """
+    Image of an elliptical shower close to the camera centre on top of
+    noise.
+    """
+    pix_x = camera.pix_x.to_value(u.m)
+    pix_y = camera.pix_y.to_value(u.m)
+    extent = np.abs(pix_x).max()
+
+    cog_x, cog_y = rng.uniform(-0.3 * extent, 0.3 * extent, 2)
+    length = rng.uniform(0.05, 0.15) * extent
+    width = length * rng.uniform(0.2, 0.8)
+    psi = rng.uniform(0, np.pi)
+
+    delta_x = pix_x - cog_x
+    delta_y = pix_y - cog_y
+    longitudinal = delta_x * np.cos(psi) + delta_y * np.sin(psi)
+    transversal = -delta_x * np.sin(psi) + delta_y * np.cos(psi)
+
+    image = (100 + rng.exponential(500)) * np.exp(-0.5 * (longitudinal / length) ** 2
+                                                  - 0.5 * (transversal / width) ** 2)
+
+    return (image + rng.normal(0, 1, len(image)))[np.newaxis]
+
+
+def make_event(rng, cameras, n_tels, tel_coords):
+    """
+    Synthetic event with the images of a random set of telescopes, all
+    pointing in the same direction.
+    """
+    tel_ids = rng.choice(np.arange(1, n_tels + 1), rng.randint(2, 30), replace=False)
+    pointing_az = rng.uniform(0, 2 * np.pi)
+    pointing_alt = rng.uniform(1.0, 1.4)
+
+    tel, dl1, subarray_tel = {}, {}, {}
+    for tel_id in map(int, tel_ids):
+        camera = cameras[CAMERAS[tel_id % len(CAMERAS)]]
+        tel[tel_id] = SimpleNamespace(azimuth_raw=pointing_az, altitude_raw=pointing_alt)
+        dl1[tel_id] = SimpleNamespace(image=make_image(rng, camera))
+        subarray_tel[tel_id] = SimpleNamespace(camera=camera)
+
+    mc = SimpleNamespace(tel=tel, alt=(pointing_alt + 0.01) * u.rad, az=pointing_az * u.rad,
+                         core_x=rng.uniform(-500, 500) * u.m, core_y=rng.uniform(-500, 500) * u.m)
+    inst = SimpleNamespace(subarray=SimpleNamespace(tel=subarray_tel, tel_coords=tel_coords))
+
+    return SimpleNamespace(r0=SimpleNamespace(tels_with_data=list(tel)),
+                           dl1=SimpleNamespace(tel=dl1), mc=mc, inst=inst)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                             "write_feature_list", "configfiles",
+                                             "config_point_default.json"),
+                        help="configuration file")
+    parser.add_argument("--events", type=int, default=100000,
+                        help="number of events to process")
+    parser.add_argument("--n_tels", type=int, default=500,
+                        help="number of telescopes in the array")
+    parser.add_argument("--max_growth", type=float, default=5,
+                        help="allowed growth of the memory after the first checkpoint in MB")
+    args = parser.parse_args()
+
+    with open(args.config) as json_file:
+        config = json.load(json_file)
+
+    pipeline = EventPipeline.from_config(config, list(range(1, args.n_tels + 1)), CAMERAS)
+    pipeline.calibrator = NoCalibration()
+    pipeline.reconstructor = TrueDirection()
+
+    rng = np.random.RandomState(0)
+    cameras = {cam_id: CameraGeometry.from_name(cam_id) for cam_id in CAMERAS}
+    positions = rng.uniform(-1000, 1000, (args.n_tels, 2))
+    tel_coords = [SimpleNamespace(x=x * u.m, y=y * u.m) for x, y in positions]
+
+    print("{:>10} {:>10} {:>14}".format("events", "prepared", "memory [MB]"))
+    checkpoint = max(1, args.events // 10)
+    memory = []
+    n_prepared = 0
+    for i in range(1, args.events + 1):
+        event = make_event(rng, cameras, args.n_tels, tel_coords)
+        pipeline.reconstructor.event = event
+
+        try:
+            result = pipeline.process(event)
+        except TooFewTelescopesException:
+            pass
+        else:
+            assert isinstance(result, EventResult)
+            # no entries of former events are kept
+            assert set(result.max_signal) <= set(event.r0.tels_with_data)
+            assert set(result.hillas_dict) == set(result.max_signal)
+            n_prepared += 1
+
+        if i % checkpoint == 0:
+            memory.append(resident_memory())
+            print("{:>10} {:>10} {:>14.1f}".format(i, n_prepared, memory[-1]))
+
+    assert len(memory) >= 2, "At least two checkpoints are needed, increase --events"
+    growth = memory[-1] - memory[0]
+    print("growth after the first checkpoint: {:.1f} MB".format(growth))
+
+    assert n_prepared > 0, "No event passed the cuts"
+    assert growth < args.max_growth, \
+        "Memory grew by {:.1f} MB, more than {} MB".format(growth, args.max_growth)
@@ -0,0 +1,58 @@
+"""
+Benchmark of the setup needed for each event in analyse_file_write_list.py.
+Formerly a PrepareList was created for each event together with a new
+traitlets Config, CameraCalibrator and HillasReconstructor. With the
+EventPipeline they are created once per run together with one
+PrepareList, which is reset for each event.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "write_feature_list"))
+
+from prepare_featurelist import PrepareList, EventPipeline
+from timeit import default_timer as timer
+import argparse
+import json
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                             "write_feature_list", "configfiles",
+                                             "config_point_default.json"),
+                        help="configuration file")
+    parser.add_argument("--events", type=int, default=1000,
+                        help="number of events to set up")
+    args = parser.parse_args()
+
+    with open(args.config) as json_file:
+        config = json.load(json_file)
+
+    telescope_list = "all"
+    camera_types = list(config["Preparer"]["tail_thresholds"].keys())
+
+    # former setup, everything is created for each event
+    start = timer()
+    for _ in range(args.events):
+        PrepareList(None, telescope_list, camera_types, **config["Preparer"])
+    time_per_event = (timer() - start) / args.events
+
+    # setup with the pipeline created once per run
+    start = timer()
+    pipeline = EventPipeline.from_config(config, telescope_list, camera_types)
+    time_pipeline = timer() - start
+
+    start = timer()
+    for _ in range(args.events):
+        pipeline.preparer.reset(None)
+    time_shared = (timer() - start) / args.events
+
+    print("{:>30} {:>14}".format("", "time [ms]"))
+    print("{:>30} {:>14.4f}".format("setup per event (former)", 1e3 * time_per_event))
+    print("{:>30} {:>14.4f}".format("pipeline once per run", 1e3 * time_pipeline))
+    print("{:>30} {:>14.4f}".format("setup per event (pipeline)", 1e3 * time_shared))
+    print("{:>30} {:>14.1f}".format("speedup", time_per_event / time_shared))
@@ -0,0 +1,78 @@
+"""
+Benchmark of the batched Hillas parametrization against ctapipe's
+hillas_parameters. Synthetic elliptical showers are cleaned with
+tailcuts_clean and parametrized per image with ctapipe and per stack
+with hillas_parameters_batch. The parameters are checked in
+tests/test_hillas.py.
+"""
+
+from konsta_cta.hillas import hillas_parameters_batch
+from ctapipe.instrument import CameraGeometry
+from ctapipe.image import hillas_parameters
+from ctapipe.image.cleaning import tailcuts_clean
+from timeit import default_timer as timer
+import numpy as np
+import argparse
+
+
+def make_images(rng, camera, n):
+    """
+    Cleaned images of elliptical showers with random position,
+    orientation, size and noise.
+    """
+    pix_x = camera.pix_x.value
+    pix_y = camera.pix_y.value
+    extent = np.abs(pix_x).max()
+
+    images = np.zeros((n, len(pix_x)))
+    for i in range(n):
+        cog_x, cog_y = rng.uniform(-0.7 * extent, 0.7 * extent, 2)
+        length = rng.uniform(0.02, 0.2) * extent
+        width = length * rng.uniform(0.1, 0.8)
+        psi = rng.uniform(0, np.pi)
+
+        delta_x = pix_x - cog_x
+        delta_y = pix_y - cog_y
+        longitudinal = delta_x * np.cos(psi) + delta_y * np.sin(psi)
+        transversal = -delta_x * np.sin(psi) + delta_y * np.cos(psi)
+
+        image = rng.exponential(500) * np.exp(-0.5 * (longitudinal / length) ** 2
+                                              - 0.5 * (transversal / width) ** 2)
+        image += rng.normal(0, 2, len(image))
+
+        mask = tailcuts_clean(camera, image, picture_thresh=10, boundary_thresh=5)
+        images[i, mask] = image[mask]
+
+    return images[images.sum(axis=1) > 0]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cameras", type=str, nargs="+",
+                        default=["LSTCam", "NectarCam", "FlashCam", "ASTRICam", "CHEC"],
+                        help="cameras to parametrize images of")
+    parser.add_argument("--images", type=int, default=1000,
+                        help="number of images per camera")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+
+    print("{:>10} {:>8} {:>12} {:>12} {:>8}".format(
+        "camera", "images", "ctapipe [s]", "batch [s]", "speedup"))
+
+    for cam_id in args.cameras:
+        camera = CameraGeometry.from_name(cam_id)
+        images = make_images(rng, camera, args.images)
+
+        start = timer()
+        for image in images:
+            hillas_parameters(camera, image)
+        time_ctapipe = timer() - start
+
+        start = timer()
+        hillas_parameters_batch(camera.pix_x.value, camera.pix_y.value, images)
+        time_batch = timer() - start
+
+        print("{:>10} {:>8} {:>12.4f} {:>12.4f} {:>8.1f}".format(
+            cam_id, len(images), time_ctapipe, time_batch, time_ctapipe / time_batch))
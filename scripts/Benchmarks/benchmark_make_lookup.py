@@ -0,0 +1,96 @@
+"""
+Benchmark of the binned statistic used in LookupGenerator.make_lookup
+against the former implementation, which recalculated the bin numbers
+following numpy.histogramdd and filled the sums of the squared dca in
+a python loop over all entries. The results are checked in
+tests/test_binning.py.
+"""
+
+from konsta_cta.reco.binning import binned_statistic
+from timeit import default_timer as timer
+import numpy as np
+import argparse
+
+
+def make_lookup_loop(data, xbins, ybins):
+    """
+    Former implementation of LookupGenerator.make_lookup for the
+    entries [dca2, intensity, ratio] of one camera.
+    """
+    hist = np.histogram2d(data[:, 1], data[:, 2], [xbins, ybins])
+
+    sample = np.array([data[:, 1], data[:, 2]]).T
+    D = sample.shape[1]
+
+    edges = [xbins, ybins]
+    dedges = D * [None]
+
+    Ncount = {}
+    for i in np.arange(D):
+        Ncount[i] = np.digitize(sample[:, i], edges[i])
+
+    for i in np.arange(D):
+        dedges[i] = np.diff(edges[i])
+        mindiff = dedges[i].min()
+
+        if not np.isinf(mindiff):
+            decimal = int(-np.log10(mindiff)) + 6
+            not_smaller_than_edge = (sample[:, i] >= edges[i][-1])
+            on_edge = (np.around(sample[:, i], decimal) ==
+                       np.around(edges[i][-1], decimal))
+            Ncount[i][np.nonzero(on_edge & not_smaller_than_edge)[0]] -= 1
+
+    sum_dca2 = np.zeros([len(xbins), len(ybins)])
+    for i, dca2 in enumerate(data[:, 0]):
+        sum_dca2[Ncount[0][i] - 1, Ncount[1][i] - 1] += dca2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dca2_means = sum_dca2[:-1, :-1] / hist[0]
+
+    return hist[0], dca2_means
+
+
+def make_lookup_vectorized(data, xbins, ybins):
+    """
+    Binned statistic as used now by LookupGenerator.make_lookup.
+    """
+    count, total, _ = binned_statistic(data[:, 0], data[:, 1:], [xbins, ybins])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dca2_means = total / count
+
+    return count, dca2_means
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, nargs="+",
+                        default=[10000, 100000, 1000000],
+                        help="number of entries to bin")
+    parser.add_argument("--bins", type=int, nargs=2, default=[20, 20],
+                        help="number of bins in size and ratio")
+    parser.add_argument("--size_max", type=float, default=1e6,
+                        help="maximum size of the LUT")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    xbins = np.logspace(1, np.log10(args.size_max), args.bins[0] + 1)
+    ybins = np.linspace(0, 1, args.bins[1] + 1)
+
+    print("{:>10} {:>12} {:>12} {:>8}".format("entries", "loop [s]", "vector [s]", "speedup"))
+
+    for n in args.entries:
+        data = np.column_stack([rng.exponential(0.01, n),
+                                10 ** rng.uniform(1, np.log10(args.size_max), n),
+                                rng.uniform(0, 1, n)])
+
+        start = timer()
+        make_lookup_loop(data, xbins, ybins)
+        time_loop = timer() - start
+
+        start = timer()
+        make_lookup_vectorized(data, xbins, ybins)
+        time_vec = timer() - start
+
+        print("{:>10} {:>12.4f} {:>12.4f} {:>8.1f}".format(
+            n, time_loop, time_vec, time_loop / time_vec))
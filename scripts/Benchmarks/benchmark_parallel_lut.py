@@ -0,0 +1,76 @@
+"""
+Benchmark of building the direction LUT from several DCA feature lists
+with several worker processes. Synthetic lists are written to a
+temporary directory and `LookupGenerator.load_data_from_files` is timed
+with n_workers=1 and with more workers. That the builds are identical is
+checked in tests/test_parallel_lut.py.
+"""
+
+from konsta_cta.reco.direction_LUT import LookupGenerator
+from timeit import default_timer as timer
+import tables as tb
+import numpy as np
+import argparse
+import os
+import tempfile
+
+
+# same columns as DCAFeatures of analyse_file_write_list.py
+class DCAFeatures(tb.IsDescription):
+    intensity = tb.Float32Col(dflt=1, pos=1)
+    width = tb.Float32Col(dflt=1, pos=2)
+    length = tb.Float32Col(dflt=1, pos=3)
+    skewness = tb.Float32Col(dflt=1, pos=4)
+    kurtosis = tb.Float32Col(dflt=1, pos=5)
+    r = tb.Float32Col(dflt=1, pos=6)
+    offangle = tb.Float32Col(dflt=1, pos=7)
+    cam_id = tb.StringCol(dflt=1, pos=8, itemsize=16)
+    dca2 = tb.Float32Col(dflt=1, pos=9)
+
+
+SIZE_MAX = {"LSTCam": 10000000, "FlashCam": 2000000, "CHEC": 50000}
+
+
+def write_dca_list(path, rng, n):
+    """
+    Write a synthetic DCA feature list with n entries.
+    """
+    with tb.open_file(path, "w") as h5file:
+        table = h5file.create_table("/", "dca_list", DCAFeatures)
+        entries = np.zeros(n, dtype=table.dtype)
+        entries["intensity"] = 10 ** rng.uniform(1, 6.5, n)
+        entries["length"] = rng.uniform(0.01, 0.3, n)
+        entries["width"] = entries["length"] * rng.uniform(0, 1, n)
+        entries["cam_id"] = rng.choice(list(SIZE_MAX), n)
+        entries["dca2"] = rng.exponential(0.01, n)
+        table.append(entries)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=7,
+                        help="number of DCA feature lists")
+    parser.add_argument("--entries", type=int, default=100000,
+                        help="number of entries per list")
+    parser.add_argument("--n_workers", type=int, nargs="+", default=[2, 3, 4],
+                        help="numbers of workers compared with the serial build")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = [os.path.join(tmpdir, "output{}.h5".format(i)) for i in range(args.files)]
+        for path in files:
+            write_dca_list(path, rng, args.entries)
+
+        print("{:>10} {:>10} {:>8}".format("n_workers", "time [s]", "speedup"))
+
+        times = {}
+        for n_workers in [1] + args.n_workers:
+            start = timer()
+            LookupGenerator.load_data_from_files(files, SIZE_MAX, n_workers=n_workers)
+            times[n_workers] = timer() - start
+
+            print("{:>10} {:>10.3f} {:>8.1f}".format(n_workers, times[n_workers],
+                                                    times[1] / times[n_workers]))
@@ -0,0 +1,116 @@
+"""
+Benchmark of the numpy projection of the true source position into the
+cameras (konsta_cta.coordinates.horizon_to_camera) against the
+transformation of HorizonFrame into CameraFrame of ctapipe. Random
+pointings and source offsets are projected per telescope with the
+ctapipe frames and for all telescopes at once with numpy. The positions
+are checked in tests/test_coordinates.py.
+"""
+
+from konsta_cta.reco.direction_LUT import LookupGenerator
+from ctapipe.coordinates import CameraFrame, HorizonFrame
+from astropy.coordinates import SkyCoord
+from astropy import units as u
+from timeit import default_timer as timer
+from types import SimpleNamespace
+import numpy as np
+import argparse
+
+# equivalent focal lengths of the cameras in m
+FOCAL_LENGTHS = {"LSTCam": 28.0,
+                 "NectarCam": 16.0,
+                 "FlashCam": 16.0,
+                 "ASTRICam": 2.15,
+                 "CHEC": 2.283,
+                 "DigiCam": 5.6,
+                 "SCTCam": 5.586}
+
+
+def make_event(rng, focal_length, n_tels, max_offset):
+    """
+    Synthetic event with a random source direction and telescopes
+    pointing up to max_offset (in degrees) away from it.
+    """
+    alt = rng.uniform(np.radians(30), np.radians(85))
+    az = rng.uniform(0, 2 * np.pi)
+
+    offset = np.radians(max_offset) * np.sqrt(rng.uniform(0, 1, n_tels))
+    position_angle = rng.uniform(0, 2 * np.pi, n_tels)
+    pointing_alt = np.arcsin(np.sin(alt) * np.cos(offset)
+                             + np.cos(alt) * np.sin(offset) * np.cos(position_angle))
+    pointing_az = az + np.arctan2(np.sin(position_angle) * np.sin(offset) * np.cos(alt),
+                                  np.cos(offset) - np.sin(alt) * np.sin(pointing_alt))
+
+    tel = {tel_id: SimpleNamespace(altitude_raw=pointing_alt[i], azimuth_raw=pointing_az[i])
+           for i, tel_id in enumerate(range(1, n_tels + 1))}
+    optics = SimpleNamespace(equivalent_focal_length=focal_length * u.m)
+    subarray = SimpleNamespace(tel={tel_id: SimpleNamespace(optics=optics) for tel_id in tel})
+
+    return SimpleNamespace(mc=SimpleNamespace(alt=alt * u.rad, az=az * u.rad, tel=tel),
+                           inst=SimpleNamespace(subarray=subarray))
+
+
+def ctapipe_positions(event, tel_ids):
+    """
+    Positions in the cameras transformed with the ctapipe frames.
+    """
+    direction = SkyCoord(alt=event.mc.alt, az=event.mc.az, frame=HorizonFrame())
+
+    x, y = [], []
+    for tel_id in tel_ids:
+        pointing = SkyCoord(alt=event.mc.tel[tel_id].altitude_raw * u.rad,
+                            az=event.mc.tel[tel_id].azimuth_raw * u.rad,
+                            frame=HorizonFrame())
+        focal_length = event.inst.subarray.tel[tel_id].optics.equivalent_focal_length
+
+        if telescope_frames:
+            frame = CameraFrame(focal_length=focal_length, telescope_pointing=pointing)
+        else:
+            frame = CameraFrame(focal_length=focal_length, array_direction=pointing,
+                                pointing_direction=pointing)
+
+        cam_coord = direction.transform_to(frame)
+        x.append(cam_coord.x.to_value(u.m))
+        y.append(cam_coord.y.to_value(u.m))
+
+    return np.array(x), np.array(y)
+
+
+# the TelescopeFrame of ctapipe >= 0.6.2 is defined by the pointing only
+telescope_frames = hasattr(CameraFrame, "telescope_pointing")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100,
+                        help="number of events per camera")
+    parser.add_argument("--n_tels", type=int, default=10,
+                        help="number of telescopes per event")
+    parser.add_argument("--max_offset", type=float, default=5,
+                        help="maximum offset of the source to the pointing in degrees")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    generator = LookupGenerator(use_astropy=False)
+
+    print("{:>10} {:>8} {:>12} {:>12} {:>8}".format(
+        "camera", "f [m]", "ctapipe [s]", "numpy [s]", "speedup"))
+
+    for cam_id, focal_length in FOCAL_LENGTHS.items():
+        time_ctapipe, time_numpy = 0, 0
+
+        for _ in range(args.events):
+            event = make_event(rng, focal_length, args.n_tels, args.max_offset)
+            tel_ids = list(event.mc.tel)
+
+            start = timer()
+            generator.get_positions_in_cam(event, tel_ids)
+            time_numpy += timer() - start
+
+            start = timer()
+            ctapipe_positions(event, tel_ids)
+            time_ctapipe += timer() - start
+
+        print("{:>10} {:>8.3f} {:>12.4f} {:>12.4f} {:>8.1f}".format(
+            cam_id, focal_length, time_ctapipe, time_numpy, time_ctapipe / time_numpy))
@@ -0,0 +1,88 @@
+"""
+Benchmark of the sparse LUT storage against the dense tables. LUTs with
+several axes are filled with correlated entries, so that most of the
+bins stay empty, and the memory, the size of the `.npz` file and the
+lookup latency of both storages are compared. That both give the same
+results is checked in tests/test_lut_table.py.
+"""
+
+from konsta_cta.reco.lookup_base import LookupBase, LUTAccumulator
+from konsta_cta.reco.lut_table import LUTTable, SparseLUTTable
+from timeit import default_timer as timer
+import numpy as np
+import argparse
+import os
+import tempfile
+
+
+def make_entries(rng, n, ndim):
+    """
+    Entries [dca2, x_1, ..., x_ndim] with features between 0 and 1
+    which are correlated with the first one, as e.g. intensity,
+    off angle and impact distance are.
+    """
+    base = rng.uniform(0, 1, n)
+    features = [np.clip(base + rng.normal(0, 0.05, n), 0, 1) for _ in range(ndim - 1)]
+
+    return np.column_stack([rng.exponential(0.01, n), base] + features)
+
+
+def nbytes(table):
+    return sum(array.nbytes for array in table.arrays())
+
+
+def file_size(table):
+    lut = LookupBase()
+    lut.lookup = {"cam": table}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "lut.npz")
+        lut.save(path)
+        return os.path.getsize(path)
+
+
+def time_lookup(table, params, repeat=5):
+    best = np.inf
+    for _ in range(repeat):
+        start = timer()
+        LookupBase._look_up_table(table, params)
+        best = min(best, timer() - start)
+
+    return best
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ndims", type=int, nargs="+", default=[2, 3, 4, 5],
+                        help="number of axes of the LUT")
+    parser.add_argument("--bins", type=int, default=20,
+                        help="number of bins of each axis")
+    parser.add_argument("--entries", type=int, default=1000000,
+                        help="number of entries to fill")
+    parser.add_argument("--queries", type=int, default=100000,
+                        help="number of values to look up")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+
+    print("{:>5} {:>10} {:>7} {:>12} {:>12} {:>12} {:>12} {:>10} {:>10}".format(
+        "ndim", "bins", "filled", "dense [MB]", "sparse [MB]", "dense file",
+        "sparse file", "dense [s]", "sparse [s]"))
+
+    for ndim in args.ndims:
+        edges = [np.linspace(0, 1, args.bins + 1)] * ndim
+        accumulator = LUTAccumulator({"cam": edges})
+        accumulator.add({"cam": make_entries(rng, args.entries, ndim)})
+
+        dense = LUTTable(accumulator.count["cam"], edges, accumulator.mean()["cam"])
+        sparse = SparseLUTTable.from_dense(dense)
+
+        params = make_entries(rng, args.queries, ndim)[:, 1:].T
+        time_dense = time_lookup(dense, params)
+        time_sparse = time_lookup(sparse, params)
+
+        print("{:>5} {:>10} {:>7.4f} {:>12.3f} {:>12.3f} {:>12} {:>12} {:>10.4f} "
+              "{:>10.4f}".format(ndim, dense.values.size, sparse.fill_fraction,
+                                 nbytes(dense) / 1e6, nbytes(sparse) / 1e6,
+                                 file_size(dense), file_size(sparse),
+                                 time_dense, time_sparse))
@@ -1,7 +1,7 @@
 from ctapipe.io import event_source  # file reader
 
 # perpare a event
-from prepare_featurelist import PrepareList, MultiplicityException
+from prepare_featurelist import EventPipeline, MultiplicityException
 from konsta_cta.reco import *
 from ctapipe.reco.HillasReconstructor import TooFewTelescopesException
 
@@ -12,7 +12,6 @@ import argparse
 
 # saving of output
 import tables as tb
-import pickle
 
 # general data processing
 import numpy as np
@@ -88,6 +87,9 @@ if __name__ == '__main__':
                         help="configuration file")
     parser.add_argument("--ctapipe_aux_dir", type=str, default="",
                         help="directory with additional files (LUT)")
+    parser.add_argument("--use_astropy", action="store_true",
+                        help="transform the true source positions into the "
+                             "cameras with the astropy frames of ctapipe")
     args = parser.parse_args()
 
     file = args.filepath
@@ -152,7 +154,7 @@ if __name__ == '__main__':
 
         elif config["Preparer"]["DirReco"]["weights"] == "doublepass":
             LUTfile = "{}/{}".format(ctapipe_aux_dir, config["Preparer"]["DirReco"]["LUT"])
-            LUTgenerator = DiffuseLUT.load_pickle(LUTfile)
+            LUTgenerator = DiffuseLUT.load(LUTfile)
 
         elif config["Preparer"]["DirReco"]["weights"] == "default":
             pass
@@ -161,8 +163,13 @@ if __name__ == '__main__':
                            " not known. Possible methods are {}".format(
                 config["Preparer"]["DirReco"]["weights"], weight_methods))
 
+        if (LUTgenerator is not None) and ("fill" in config["Preparer"]["DirReco"]):
+            # precompute dense LUTs to get the weights without exceptions
+            LUTgenerator.resolve(min_stat=config["Preparer"]["DirReco"]["min_stat"],
+                                 fill=config["Preparer"]["DirReco"]["fill"])
+
     elif config["mode"] == "write_list_dca":
-        LUTgenerator = LookupGenerator()  # for using the methods
+        LUTgenerator = LookupGenerator(use_astropy=args.use_astropy)  # for using the methods
 
         outfile = tb.open_file("{}.h5".format(outputfile), mode="w")
 
@@ -179,20 +186,24 @@ if __name__ == '__main__':
 
 
     elif config["mode"] == "make_direction_LUT":
-        # make direction LUT
-        LUTgenerator = LookupGenerator()
+        # make direction LUT, entries are accumulated in histograms
+        # with the binning given in the config
+        LUTgenerator = LookupGenerator(size_max=config["make_direction_LUT"]["size_max"],
+                                       bins=config["make_direction_LUT"]["bins"],
+                                       use_astropy=args.use_astropy)
+
+    # calibrator, reconstructor and caches used for all events
+    pipeline = EventPipeline.from_config(config, telescope_list, camera_types,
+                                         LUT=LUTgenerator)
 
     # start main loop
     #################
     for event in source:
         # raw image to direction reconstructed
-        eventpreparer = PrepareList(event, telescope_list, camera_types,
-                                    **config["Preparer"], LUT=LUTgenerator)
-
         # get the parameters of the parametrization and reconstruction
         try:
             impact, max_signal, tot_signal, n_tels_types, hillas_moments, \
-            mc_offset, reconstructed = eventpreparer.get_reconstructed_parameters()
+            mc_offset, reconstructed = pipeline.process(event)
         except (TooFewTelescopesException, MultiplicityException):
             continue
 
@@ -261,22 +272,22 @@ if __name__ == '__main__':
             # write parameters relevant for training energy regressors and
             # classifier of primary particles.
             try:
-                for tel_id in hillas_moments.keys():
-                    focal_length = event.inst.subarray.tel[tel_id].optics.equivalent_focal_length
+                tel_ids = list(hillas_moments.keys())
+                source_x, source_y = LUTgenerator.get_positions_in_cam(event, tel_ids)
+
+                # get dca values of all telescopes in degrees
+                focal_length = np.array([event.inst.subarray.tel[tel_id].optics.
+                                         equivalent_focal_length.to_value(u.m)
+                                         for tel_id in tel_ids])
+                dca2 = LUTgenerator.calculate_dca2(
+                    [hillas_moments[tel_id].psi.to_value(u.rad) for tel_id in tel_ids],
+                    [hillas_moments[tel_id].x.to_value(u.m) for tel_id in tel_ids],
+                    [hillas_moments[tel_id].y.to_value(u.m) for tel_id in tel_ids],
+                    source_x, source_y, focal_length)
+
+                for i, tel_id in enumerate(tel_ids):
                     cam_id = event.inst.subarray.tel[tel_id].camera.cam_id
 
-                    # get dca value
-                    direction_az = event.mc.az.to(u.deg)
-                    direction_alt = event.mc.alt.to(u.deg)
-                    cam_coord = LUTgenerator.get_position_in_cam(direction_alt,
-                                                                 direction_az, event, tel_id)
-                    dca = LUTgenerator.calculate_dca((cam_coord.x, cam_coord.y),
-                                                     hillas_moments[tel_id])
-
-                    # convert dca to degrees
-                    conversion_factor = (180 / (np.pi * focal_length))
-                    dca = dca.value * conversion_factor * u.deg
-
                     offangle = angular_separation(event.mc.az, event.mc.alt,
                                                    event.mc.tel[tel_id].azimuth_raw * u.rad,
                                                    event.mc.tel[tel_id].altitude_raw * u.rad)
@@ -290,7 +301,7 @@ if __name__ == '__main__':
                     dca_events["r"] = hillas_moments[tel_id].r.value
                     dca_events["offangle"] = offangle.to(u.deg).value
                     dca_events["cam_id"] = cam_id
-                    dca_events["dca2"] = dca.value**2
+                    dca_events["dca2"] = dca2[i]
                     dca_events.append()
 
                     outfile.flush()
@@ -0,0 +1,62 @@
+"""
+Script to convert LUTs stored in json files to the binary `.npz` format
+of konsta_cta.reco.LookupBase. The binary files can be loaded without
+parsing and memory mapped using LookupGenerator.load(path, mmap_mode="r").
+Either single files or directories (e.g. ctapipe_aux_dir) can be passed.
+For directories all `*.json` files in it are converted.
+
+Diffuse LUTs pickled by former versions (although often named `*.json`)
+are converted as well. They can not be read by DiffuseLUT.load anymore.
+"""
+
+from konsta_cta.reco import LookupGenerator, DiffuseLUT
+import glob
+import os
+import pickle
+import argparse
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", type=str, nargs="+",
+                        help="LUT files or directories with LUT files")
+    parser.add_argument("--outdir", type=str, default=None,
+                        help="directory to write the converted files into, "
+                             "by default next to the input files")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="overwrite existing .npz files")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob("{}/*.json".format(path)))
+        else:
+            files.append(path)
+
+    for file in files:
+        outdir = os.path.dirname(file) if args.outdir is None else args.outdir
+        outfile = os.path.join(outdir, os.path.splitext(os.path.basename(file))[0] + ".npz")
+
+        if os.path.exists(outfile) and not args.overwrite:
+            print("Skipping {}: {} already exists".format(file, outfile))
+            continue
+
+        with open(file, "rb") as f:
+            is_pickle = (f.read(1) == pickle.PROTO)
+
+        try:
+            if is_pickle:
+                LUTgenerator = DiffuseLUT.load_pickle(file, cache=False)
+            else:
+                LUTgenerator = LookupGenerator.load(file, cache=False)
+        except (UnicodeDecodeError, ValueError, pickle.UnpicklingError):
+            print("Skipping {}: not a LUT".format(file))
+            continue
+
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+        LUTgenerator.save(outfile)
+        print("Converted {} -> {} ({:.1f} kB -> {:.1f} kB)".format(
+            file, outfile, os.path.getsize(file) / 1e3, os.path.getsize(outfile) / 1e3))
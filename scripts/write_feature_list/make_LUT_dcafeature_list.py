@@ -7,9 +7,16 @@ with --config. Additional parameters like the number of bins are also given
 in this file.
 For diffuse simulations, it might be necessary to produce the
 LUTs in different offangle bins. Using the option "diffuse" for --offangles
-allows to set bins in offangles. The on json based load method in defined in
-konsta_cta.reco.LookupGenerator currently is only able to load basic LUTs
-but not the "diffuse" LUTs with multiple off angle bins. Therefor
+allows to set bins in offangles. The resulting DiffuseLUT is saved and
+loaded in the same formats as the basic LUTs.
+The files are read and binned by --n_workers processes (default 1).
+With --incremental the files ingested into the LUT are recorded in a
+manifest together with the partial accumulator of each file. On a rerun
+only new or changed files are read and the entries of changed or removed
+files are subtracted. An existing LUT is overwritten without asking.
+The manifest is kept in the directory given with --state_dir, by default
+next to the LUT in a directory with the name of the LUT file and the
+suffix .state.
 """
 
 from konsta_cta.reco import LookupGenerator, DiffuseLUT
@@ -27,6 +34,13 @@ if __name__ == '__main__':
     parser.add_argument("--config", type=str, default="config.json",
                         help="configuration file")
     parser.add_argument("--offangles", type=str, default="point")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="number of processes reading the files")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only ingest files which are new or changed since the last run")
+    parser.add_argument("--state_dir", type=str, default=None,
+                        help="directory with the manifest for --incremental, "
+                             "by default the name of the LUT file with suffix .state")
     args = parser.parse_args()
 
     datadir = args.datadir
@@ -43,11 +57,17 @@ if __name__ == '__main__':
 
     size_max = config["make_direction_LUT"]["size_max"]
     nbins = config["make_direction_LUT"]["bins"]
+    # "fixed" or "quantile" for bins of about equal population
+    binning = config["make_direction_LUT"].get("binning", "fixed")
 
     ctapipe_aux_dir = os.path.abspath(config["ctapipe_aux_dir"])
     LUTfile = "{}/{}".format(ctapipe_aux_dir, config["Preparer"]["DirReco"]["LUT"])
 
-    if os.path.exists(LUTfile):
+    state_dir = None
+    if args.incremental:
+        state_dir = args.state_dir or "{}.state".format(LUTfile)
+
+    if os.path.exists(LUTfile) and not args.incremental:
         print("The file {} already exists".format(LUTfile))
 
         merge = input("Overwrite file? [y/n] ")
@@ -62,7 +82,10 @@ if __name__ == '__main__':
         os.makedirs(ctapipe_aux_dir)
 
     if args.offangles == "point":
-        LUTgenerator = LookupGenerator.load_data_from_files(files, size_max, nbins=nbins)
+        LUTgenerator = LookupGenerator.load_data_from_files(files, size_max, nbins=nbins,
+                                                            n_workers=args.n_workers,
+                                                            state_dir=state_dir,
+                                                            binning=binning)
         LUTgenerator.save(LUTfile)
 
     elif args.offangles == "diffuse":
@@ -70,5 +93,7 @@ if __name__ == '__main__':
                     [2, 4],
                     [4, 6],
                     [6,10]]
-        DiffLUT = DiffuseLUT.look_up_offbins(files, size_max, nbins=nbins, off_bins=off_bins)
-        DiffLUT.save_pickle(LUTfile)
\ No newline at end of file
+        DiffLUT = DiffuseLUT.look_up_offbins(files, size_max, nbins=nbins, off_bins=off_bins,
+                                             n_workers=args.n_workers, state_dir=state_dir,
+                                             binning=binning)
+        DiffLUT.save(LUTfile)
\ No newline at end of file
@@ -2,12 +2,38 @@ from ctapipe.calib.camera import CameraCalibrator  # calibration
 from ctapipe.reco.HillasReconstructor import \
     HillasReconstructor, TooFewTelescopesException  # direction reconstruction
 from ctapipe.calib.camera.gainselection import pick_gain_channel
-from ctapipe.image.cleaning import tailcuts_clean  # image cleaning
-from ctapipe.image import hillas_parameters  # hillas parametrization
+from konsta_cta.cleaning import tailcuts_clean_batch  # image cleaning
+from konsta_cta.hillas import hillas_parameters_batch, hillas_container  # hillas parametrization
 from ctapipe.utils import linalg
 from traitlets.config import Config  # configuration handeling
 from konsta_cta.cutter import *  # apply quality cuts
 from konsta_cta.reco.direction_LUT import *
+from konsta_cta.coordinates import angular_distance
+
+
+class EventResult(object):
+    '''
+    Parameters of one prepared event, see
+    `PrepareList.get_reconstructed_parameters`. The result can be
+    unpacked in the same order as the tuple returned there.
+    '''
+
+    __slots__ = ("impact", "max_signal", "tot_signal", "n_tels_per_type",
+                 "hillas_dict", "mc_offset", "reco_result")
+
+    def __init__(self, impact, max_signal, tot_signal, n_tels_per_type,
+                 hillas_dict, mc_offset, reco_result):
+        self.impact = impact
+        self.max_signal = max_signal
+        self.tot_signal = tot_signal
+        self.n_tels_per_type = n_tels_per_type
+        self.hillas_dict = hillas_dict
+        self.mc_offset = mc_offset
+        self.reco_result = reco_result
+
+    def __iter__(self):
+        return iter((self.impact, self.max_signal, self.tot_signal, self.n_tels_per_type,
+                     self.hillas_dict, self.mc_offset, self.reco_result))
 
 
 class PrepareList(Cutter):
@@ -21,29 +47,24 @@ class PrepareList(Cutter):
     test
     '''
 
-    true_az = {}
-    true_alt = {}
-
-    max_signal = {}
-    tot_signal = 0
-    impact = {}
-
     def __init__(self, event, telescope_list, camera_types, ChargeExtration,
-                 pe_thresh, min_neighbors, tail_thresholds, DirReco, quality_cuts, LUT=None):
+                 pe_thresh, min_neighbors, tail_thresholds, DirReco, quality_cuts, LUT=None,
+                 calibrator=None, reconstructor=None):
         super().__init__()
         '''
         Parmeters
         ---------
         event : ctapipe event container
-        calibrator : ctapipe camera calibrator
-        reconstructor : ctapipe hillas reconstructor
         telescope_list : list with telescope configuration or "all"
         pe_thresh : dict with thresholds for gain selection
         tail_thresholds : dict with thresholds for image cleaning
         quality_cuts : dict containing quality cuts
         canera_types : list with camera types to analyze
+        calibrator : ctapipe camera calibrator or None
+            if None, a calibrator is created from ChargeExtration
+        reconstructor : ctapipe hillas reconstructor or None
+            if None, a new reconstructor is created
         '''
-        self.event = event
         self.telescope_list = telescope_list
         self.pe_thresh = pe_thresh
         self.min_neighbors = min_neighbors
@@ -53,6 +74,29 @@ class PrepareList(Cutter):
         self.dirreco = DirReco
         self.LUTgenerator = LUT
 
+        self.reset(event)
+
+        if calibrator is None:
+            calibrator = self.make_calibrator(ChargeExtration)
+        self.calibrator = calibrator  # calibration
+
+        if reconstructor is None:
+            reconstructor = HillasReconstructor()
+        self.reconstructor = reconstructor  # direction
+
+    def reset(self, event):
+        '''
+        Set the event to prepare and clear the information of the former
+        event, so one PrepareList can be used for all events of a run.
+        The containers are replaced, not cleared, as they are part of
+        the results of the former event.
+
+        Parameters
+        ----------
+        event : ctapipe event container
+        '''
+        self.event = event
+
         if (self.dirreco["weights"] == "LUT") | (self.dirreco["weights"] == "doublepass"):
             self.weights = {}
         else:
@@ -60,8 +104,32 @@ class PrepareList(Cutter):
 
         self.hillas_dict = {}
         self.camera_dict = {}
-        self.edge_pixels = {}
 
+        # per event information
+        self.true_az = {}
+        self.true_alt = {}
+        self.max_signal = {}
+        self.tot_signal = 0
+        self.impact = {}
+
+        # set during the preparation
+        for name in ("reco_result", "mc_offset", "n_tels_per_type"):
+            self.__dict__.pop(name, None)
+
+    @staticmethod
+    def make_calibrator(ChargeExtration):
+        '''
+        Create the camera calibrator.
+
+        Parameters
+        ----------
+        ChargeExtration : dict with the products of the charge extractor
+            and the waveform cleaner
+
+        Returns
+        -------
+        calibrator : ctapipe camera calibrator
+        '''
         # configurations for calibrator
         cfg = Config()
         cfg["ChargeExtractorFactory"]["product"] = \
@@ -69,10 +137,7 @@ class PrepareList(Cutter):
         cfg['WaveformCleanerFactory']['product'] = \
             ChargeExtration["WaveformCleanerProduct"]
 
-        self.calibrator = CameraCalibrator(
-            r1_product="HESSIOR1Calibrator", config=cfg)  # calibration
-
-        self.reconstructor = HillasReconstructor()  # direction
+        return CameraCalibrator(r1_product="HESSIOR1Calibrator", config=cfg)
 
     def get_impact(self, hillas_dict):
         '''
@@ -139,6 +204,66 @@ class PrepareList(Cutter):
 
         return off_angle
 
+    def get_offangles(self, tel_ids):
+        '''
+        Vectorized version of `get_offangle` with direction "reco". Get
+        the angular offsets between the reconstructed direction and the
+        pointing directions of several telescopes in one call.
+
+        Parameters
+        ----------
+        tel_ids : list or numpy.array
+            Telescope IDs
+
+        Returns
+        -------
+        off_angles : numpy.array
+            off angles in degrees
+        '''
+        pointing_az = np.array([self.event.mc.tel[tel_id].azimuth_raw for tel_id in tel_ids])
+        pointing_alt = np.array([self.event.mc.tel[tel_id].altitude_raw for tel_id in tel_ids])
+
+        off_angles = angular_distance(pointing_az, pointing_alt,
+                                      self.reco_result.az.to(u.rad).value,
+                                      self.reco_result.alt.to(u.rad).value)
+
+        return np.rad2deg(off_angles)
+
+    def get_second_pass_weights(self):
+        '''
+        Get the weights of the second pass of the doublepass method for
+        all telescopes in self.hillas_dict at once. The off angles are
+        estimated from the reconstructed direction of the first pass
+        and the weights are looked up in the diffuse LUT in one batch.
+
+        Returns
+        -------
+        tel_ids : numpy.array
+            Telescope IDs
+        weights : numpy.array
+            weights of the telescopes, NaN for dropped telescopes
+        drop : numpy.array
+            boolean mask, True for telescopes without weight
+        '''
+        tel_ids = np.array(list(self.hillas_dict.keys()), dtype=int)
+        cam_ids = np.array([self.camera_dict[tel_id].cam_id for tel_id in tel_ids])
+
+        intensity = np.array([self.hillas_dict[tel_id].intensity for tel_id in tel_ids])
+        ratio = np.array([self.LUTgenerator.get_hillas_feature(self.hillas_dict[tel_id], "ratio")
+                          for tel_id in tel_ids], dtype=float)
+        ratio_cut = np.array([self.dirreco["wl_ratio_cut"][cam_id] for cam_id in cam_ids])
+        offangle = self.get_offangles(tel_ids)
+
+        if self.LUTgenerator.resolved:
+            weights, valid = self.LUTgenerator.get_resolved_weights(
+                intensity, ratio, cam_ids, ratio_cut=ratio_cut, offangle=offangle)
+        else:
+            weights, valid = self.LUTgenerator.get_weights_from_diffuse_LUT(
+                intensity, ratio, offangle, cam_ids,
+                min_stat=self.dirreco["min_stat"], ratio_cut=ratio_cut)
+
+        return tel_ids, weights, ~valid
+
     def get_weight(self, method, camera, tel_id, hillas_par, offangle=None):
         """
         Get the weighting for HillasReconustructor. Possible methods are
@@ -147,11 +272,24 @@ class PrepareList(Cutter):
         'doublepass' which might be used for diffuse simulations. In this
         case it returns the weights for the first pass.
 
+        If the tables of the LUT were precomputed with `resolve`, the
+        weights are taken from them without raising exceptions.
+
         method : sting
             method to get the weighting.
         camera: CameraDescription
         tel_id: integer
         hillas_par: HillasParameterContainer
+
+        Returns
+        -------
+        found : bool
+            False if no weight was found in the resolved LUT
+
+        Raises
+        ------
+        LookupFailedError
+            if no weight was found in a LUT which is not resolved
         """
         if method == "default":
             pass
@@ -160,6 +298,9 @@ class PrepareList(Cutter):
             if np.isnan(hillas_par.width) & (not np.isnan(hillas_par.length)):
                 hillas_par.width = 0 * u.m
 
+            if self.LUTgenerator.resolved:
+                return self.set_resolved_weight(camera, tel_id, hillas_par)
+
             self.weights[tel_id] = self.LUTgenerator.get_weight_from_LUT(hillas_par,
                                                                          camera.cam_id,
                                                                          min_stat=self.dirreco["min_stat"],
@@ -176,6 +317,10 @@ class PrepareList(Cutter):
 
         elif method == "second_pass":
             # weights for second pass
+            if self.LUTgenerator.resolved:
+                return self.set_resolved_weight(camera, tel_id, self.hillas_dict[tel_id],
+                                                offangle=offangle)
+
             self.weights[tel_id] = self.LUTgenerator.get_weight_from_diffuse_LUT(self.hillas_dict[tel_id],
                                                                                  offangle, camera.cam_id,
                                                                                  min_stat=self.dirreco[
@@ -188,6 +333,33 @@ class PrepareList(Cutter):
         else:
             raise KeyError("Weighting method {} not known.".format(method))
 
+        return True
+
+    def set_resolved_weight(self, camera, tel_id, hillas_par, **features):
+        """
+        Set the weight of a telescope from the resolved LUT.
+
+        camera: CameraDescription
+        tel_id: integer
+        hillas_par: HillasParameterContainer
+        features: further features of the LUT axes, e.g. offangle
+
+        Returns
+        -------
+        found : bool
+            False if no weight was found
+        """
+        weight, valid = self.LUTgenerator.get_resolved_weights(
+            hillas_par.intensity,
+            self.LUTgenerator.get_hillas_feature(hillas_par, "ratio"),
+            camera.cam_id, ratio_cut=self.dirreco["wl_ratio_cut"][camera.cam_id],
+            **features)
+
+        if valid[0]:
+            self.weights[tel_id] = weight[0]
+
+        return valid[0]
+
     def prepare(self):
         '''
         Prepare event performimng calibration, image cleaning,
@@ -201,6 +373,9 @@ class PrepareList(Cutter):
         # calibrate event
         self.calibrator.calibrate(self.event)
 
+        # images grouped by camera type
+        images = {}
+
         # loop over all telescopeswith data in it
         for tel_id in self.event.r0.tels_with_data:
 
@@ -223,22 +398,40 @@ class PrepareList(Cutter):
             else:
                 image = np.squeeze(image)
 
-            # image cleaning
-            mask = tailcuts_clean(
-                camera, image,
-                picture_thresh=self.tail_thresholds[camera.cam_id][1],
-                boundary_thresh=self.tail_thresholds[camera.cam_id][0],
-                min_number_picture_neighbors=self.min_neighbors)
+            images.setdefault(camera.cam_id, {})[tel_id] = image
+
+        # image cleaning and hillas parametrization of all images of a camera type at once
+        hillas_pars = {}
+        for cam_id, cam_images in images.items():
+            tel_ids = list(cam_images)
+            geometry = self.geometry_cache.get(self.camera_dict[tel_ids[0]])
+            stack = np.stack(list(cam_images.values()))
 
-            # go to next telescope if no pixels survived cleaning
-            if not any(mask):
+            masks = tailcuts_clean_batch(geometry.neighbor_matrix_sparse, stack,
+                                         picture_thresh=self.tail_thresholds[cam_id][1],
+                                         boundary_thresh=self.tail_thresholds[cam_id][0],
+                                         min_number_picture_neighbors=self.min_neighbors)
+
+            # skip telescopes if no pixels survived cleaning
+            survived = masks.any(axis=1)
+            if not survived.any():
                 continue
 
-            cleaned_image = np.copy(image)
-            cleaned_image[~mask] = 0
+            tel_ids = [tel_id for tel_id, keep in zip(tel_ids, survived) if keep]
+            cleaned_images = np.where(masks[survived], stack[survived], 0)
+            hillas = hillas_parameters_batch(geometry.pix_x, geometry.pix_y, cleaned_images)
+
+            for tel_id, hillas_par, cleaned_image in zip(tel_ids, hillas, cleaned_images):
+                hillas_pars[tel_id] = (hillas_container(hillas_par, geometry.pix_unit),
+                                       cleaned_image)
+
+        # keep the order of the telescopes in the event
+        for tel_id in self.camera_dict:
+            if tel_id not in hillas_pars:
+                continue
 
-            # calculate the hillas parameters
-            hillas_par = hillas_parameters(camera, cleaned_image)
+            camera = self.camera_dict[tel_id]
+            hillas_par, cleaned_image = hillas_pars[tel_id]
 
             # quality cuts
             leakage = leakage = self.leakage_cut(camera=camera, hillas_parameters=hillas_par,
@@ -257,8 +450,11 @@ class PrepareList(Cutter):
 
             # get the weighting for HillasReconstructor
             try:
-               self.get_weight(self.dirreco["weights"], camera, tel_id, hillas_par)
+                found = self.get_weight(self.dirreco["weights"], camera, tel_id, hillas_par)
             except LookupFailedError:
+                found = False
+
+            if not found:
                 # this telescope will be ignored, should only happen for method LUT here
                 no_weight.append(tel_id)
                 continue
@@ -277,12 +473,7 @@ class PrepareList(Cutter):
             raise TooFewTelescopesException("No image survived the leakage "
                                             "or size cuts.")
 
-        # collect some additional information
-        for tel_id in self.hillas_dict:
-            self.tot_signal += self.hillas_dict[tel_id].intensity  # total size
-
-            self.true_az[tel_id] = self.event.mc.tel[tel_id].azimuth_raw * u.rad
-            self.true_alt[tel_id] = self.event.mc.tel[tel_id].altitude_raw * u.rad
+        self.collect_signals()
 
         # wil raise exception if cut was not passed
         # self.multiplicity_cut(self.quality_cuts["multiplicity"]["cuts"],
@@ -301,20 +492,10 @@ class PrepareList(Cutter):
         if self.dirreco["weights"] == "doublepass":
             # take the reconstructed direction to get an estimate of the offangle and
             # get weights from the second pass from the diffuse LUT.
-            self.weights = {} # reset the weights from earlier
-            no_weight = []
-            for tel_id in self.hillas_dict:
-                predicted_offangle = self.get_offangle(tel_id, direction="reco")
-                predicted_offangle = predicted_offangle.to(u.deg).value
-
-                camera = self.camera_dict[tel_id] # reload camera_information
-
-                # get the weighting for HillasReconstructor
-                try:
-                    self.get_weight("second_pass", camera, tel_id,
-                                    self.hillas_dict[tel_id], predicted_offangle)
-                except LookupFailedError:
-                    no_weight.append(tel_id)
+            tel_ids, weights, drop = self.get_second_pass_weights()
+            self.weights = {int(tel_id): weight for tel_id, weight
+                            in zip(tel_ids[~drop], weights[~drop])}
+            no_weight = [int(tel_id) for tel_id in tel_ids[drop]]
 
             print("Removed {} of {} telescopes due LUT problems".format(
                                     len(no_weight), len(self.hillas_dict)))
@@ -353,6 +534,24 @@ class PrepareList(Cutter):
 
         self.impact = self.get_impact(self.hillas_dict)  # impact parameter
 
+    def collect_signals(self):
+        '''
+        Collect the total signal and the pointing of the telescopes
+        in self.hillas_dict.
+        '''
+        for tel_id in self.hillas_dict:
+            self.tot_signal += self.hillas_dict[tel_id].intensity  # total size
+
+            self.true_az[tel_id] = self.event.mc.tel[tel_id].azimuth_raw * u.rad
+            self.true_alt[tel_id] = self.event.mc.tel[tel_id].altitude_raw * u.rad
+
+    def get_result(self):
+        '''
+        Return the parameters for writing to table as `EventResult`,
+        see `get_reconstructed_parameters`.
+        '''
+        return EventResult(*self.get_reconstructed_parameters())
+
     def get_reconstructed_parameters(self):
         '''
         Return the parameters for writing to table.
@@ -377,3 +576,84 @@ class PrepareList(Cutter):
 
         return (self.impact, self.max_signal, self.tot_signal, self.n_tels_per_type,
                 self.hillas_dict, self.mc_offset, self.reco_result)
+
+
+class EventPipeline(object):
+    '''
+    Analysis chain of one run. One PrepareList with the calibrator, the
+    reconstructor and the LUT is created from the configuration and reset
+    for each event, which is prepared with `process`. The geometries of
+    the cameras are cached in `camera_geometry_cache` of konsta_cta.cutter.
+    '''
+
+    def __init__(self, telescope_list, camera_types, ChargeExtration, pe_thresh,
+                 min_neighbors, tail_thresholds, DirReco, quality_cuts, LUT=None):
+        '''
+        Parmeters
+        ---------
+        telescope_list : list with telescope configuration or "all"
+        camera_types : list with camera types to analyze
+        ChargeExtration : dict with the products of the charge extractor
+            and the waveform cleaner
+        pe_thresh : dict with thresholds for gain selection
+        min_neighbors : minimum number of neighbours in image cleaning
+        tail_thresholds : dict with thresholds for image cleaning
+        DirReco : dict with the configuration of the direction reconstruction
+        quality_cuts : dict containing quality cuts
+        LUT : LookupGenerator or DiffuseLUT for the weights or None
+        '''
+        self.options = dict(telescope_list=telescope_list, camera_types=camera_types,
+                            ChargeExtration=ChargeExtration, pe_thresh=pe_thresh,
+                            min_neighbors=min_neighbors, tail_thresholds=tail_thresholds,
+                            DirReco=DirReco, quality_cuts=quality_cuts, LUT=LUT)
+
+        self.preparer = PrepareList(None, calibrator=PrepareList.make_calibrator(ChargeExtration),
+                                    reconstructor=HillasReconstructor(), **self.options)
+        self.LUTgenerator = LUT
+        self.geometry_cache = camera_geometry_cache
+
+    @property
+    def calibrator(self):
+        return self.preparer.calibrator
+
+    @calibrator.setter
+    def calibrator(self, calibrator):
+        self.preparer.calibrator = calibrator
+
+    @property
+    def reconstructor(self):
+        return self.preparer.reconstructor
+
+    @reconstructor.setter
+    def reconstructor(self, reconstructor):
+        self.preparer.reconstructor = reconstructor
+
+    @classmethod
+    def from_config(cls, config, telescope_list, camera_types, LUT=None):
+        '''
+        Create the pipeline from the "Preparer" section of the configuration.
+        '''
+        return cls(telescope_list, camera_types, LUT=LUT, **config["Preparer"])
+
+    def process(self, event):
+        '''
+        Calibrate and parametrize the images of an event and reconstruct
+        the direction.
+
+        Parameters
+        ----------
+        event : ctapipe event container
+
+        Returns
+        -------
+        result : EventResult
+            prepared parameters, see `PrepareList.get_reconstructed_parameters`
+
+        Raises
+        ------
+        TooFewTelescopesException, MultiplicityException
+            if the event does not pass the cuts
+        '''
+        self.preparer.reset(event)
+
+        return self.preparer.get_result()
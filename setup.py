@@ -9,5 +9,5 @@ setup(
     packages=['konsta_cta'],
     scripts=[],
     install_requires=['numpy', 'scipy', 'scikit-learn', 'astropy', 'pandas',
-                      'matplotlib', 'ctapipe']
+                      'matplotlib', 'tables', 'ctapipe']
 )
\ No newline at end of file
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from konsta_cta.reco.binning import bin_indices, binned_statistic, binned_mean
+from konsta_cta.reco.direction_LUT import LookupGenerator
+
+
+@pytest.fixture
+def entries():
+    rng = np.random.RandomState(0)
+    edges = [np.array([0, 0.5, 1, 2, 4]), np.linspace(0, 1, 6)]
+
+    sample = np.column_stack([rng.uniform(-0.5, 4.5, 500), rng.uniform(-0.1, 1.1, 500)])
+    # entries on the edges, including the rightmost ones
+    sample[:5] = [[0, 0], [0.5, 0.2], [4, 1], [2, 1], [4, 0.4]]
+    values = rng.exponential(0.01, 500)
+
+    return values, sample, edges
+
+
+def test_bin_indices_edges():
+    index, valid = bin_indices(np.array([0, 0.5, 1, 2, -0.1, 2.1, np.nan]),
+                               [np.array([0, 1, 2])])
+
+    np.testing.assert_array_equal(valid, [True, True, True, True, False, False, False])
+    np.testing.assert_array_equal(index, [0, 0, 1, 1])
+
+
+def test_binned_statistic_histogramdd(entries):
+    values, sample, edges = entries
+    count, total, total_sq = binned_statistic(values, sample, edges)
+
+    np.testing.assert_array_equal(count, np.histogramdd(sample, edges)[0])
+    np.testing.assert_allclose(total, np.histogramdd(sample, edges, weights=values)[0])
+    np.testing.assert_allclose(total_sq, np.histogramdd(sample, edges, weights=values ** 2)[0])
+
+
+def test_binned_mean_empty_bins():
+    count, total, mean = binned_mean([1, 3, 5], [[0.1], [0.2], [2.5]], [np.array([0, 1, 2, 3])])
+
+    np.testing.assert_array_equal(count, [2, 0, 1])
+    np.testing.assert_allclose(total, [4, 0, 5])
+    np.testing.assert_allclose(mean, [2, np.nan, 5])
+
+
+def test_make_lookup():
+    rng = np.random.RandomState(1)
+    n = 1000
+    data = np.column_stack([rng.exponential(0.01, n), 10 ** rng.uniform(0.5, 4.5, n),
+                            rng.uniform(0, 1, n)])
+    size_max = {"LSTCam": 1e4}
+    bins = [4, 5]
+    edges = LookupGenerator.get_bin_edges(size_max["LSTCam"], bins)
+
+    count = np.histogramdd(data[:, 1:], edges)[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.histogramdd(data[:, 1:], edges, weights=data[:, 0])[0] / count
+
+    lut = LookupGenerator()
+    lut.data = {"LSTCam": data}
+    lut.make_lookup(size_max, bins)
+
+    # entries accumulated in fixed bins while they are collected
+    streamed = LookupGenerator(size_max=size_max, bins=bins, buffer_size=100)
+    for batch in np.array_split(data, 7):
+        streamed.add_entries("LSTCam", batch)
+    streamed.make_lookup(size_max, bins)
+
+    for table in (lut.lookup["LSTCam"], streamed.lookup["LSTCam"]):
+        np.testing.assert_array_equal(table.counts, count)
+        np.testing.assert_allclose(table.values, mean)
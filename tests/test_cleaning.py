@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from ctapipe.image.cleaning import tailcuts_clean
+
+from konsta_cta.cleaning import tailcuts_clean_batch
+
+
+@pytest.fixture
+def camera():
+    """
+    Square camera with 15 x 15 pixels, each pixel with its four
+    direct neighbours.
+    """
+    n = 15
+    row, col = np.divmod(np.arange(n * n), n)
+    distance = np.abs(row[:, np.newaxis] - row) + np.abs(col[:, np.newaxis] - col)
+    neighbor_matrix = csr_matrix(distance == 1)
+
+    return SimpleNamespace(neighbor_matrix_sparse=neighbor_matrix)
+
+
+@pytest.fixture
+def images(camera):
+    """
+    Noise with a few bright spots of one to three pixels.
+    """
+    rng = np.random.RandomState(0)
+    images = rng.normal(0, 3, (40, camera.neighbor_matrix_sparse.shape[0]))
+    spots = rng.randint(0, images.shape[1] - 16, (40, 5))
+    for offset in (0, 1, 15):
+        images[np.arange(40)[:, np.newaxis], spots + offset] += rng.uniform(0, 30, spots.shape)
+
+    return images
+
+
+@pytest.mark.parametrize("keep_isolated_pixels", [False, True])
+@pytest.mark.parametrize("min_number_picture_neighbors", [0, 1, 2])
+def test_ctapipe(camera, images, keep_isolated_pixels, min_number_picture_neighbors):
+    masks = tailcuts_clean_batch(camera.neighbor_matrix_sparse, images, picture_thresh=7,
+                                 boundary_thresh=4, keep_isolated_pixels=keep_isolated_pixels,
+                                 min_number_picture_neighbors=min_number_picture_neighbors)
+
+    for mask, image in zip(masks, images):
+        np.testing.assert_array_equal(
+            mask, tailcuts_clean(camera, image, picture_thresh=7, boundary_thresh=4,
+                                 keep_isolated_pixels=keep_isolated_pixels,
+                                 min_number_picture_neighbors=min_number_picture_neighbors))
+
+
+def test_thresholds_per_image(camera, images):
+    picture = np.linspace(5, 10, len(images))[:, np.newaxis]
+    masks = tailcuts_clean_batch(camera.neighbor_matrix_sparse, images,
+                                 picture_thresh=picture, boundary_thresh=picture / 2)
+
+    for mask, image, thresh in zip(masks, images, picture[:, 0]):
+        np.testing.assert_array_equal(
+            mask, tailcuts_clean(camera, image, picture_thresh=thresh,
+                                 boundary_thresh=thresh / 2))
+
+
+def test_shape_mismatch(camera):
+    with pytest.raises(AttributeError):
+        tailcuts_clean_batch(camera.neighbor_matrix_sparse, np.zeros((2, 10)))
@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.coordinates import SkyCoord, angular_separation
+from ctapipe.coordinates import CameraFrame, HorizonFrame
+
+from konsta_cta.coordinates import horizon_to_camera
+from konsta_cta.reco.direction_LUT import LookupGenerator
+
+# maximum distance between the positions in m
+TOLERANCE = 1e-6
+
+# equivalent focal lengths of the cameras in m
+FOCAL_LENGTHS = [28.0, 16.0, 2.15, 2.283, 5.6, 5.586]
+
+# the TelescopeFrame of ctapipe >= 0.6.2 is defined by the pointing only
+telescope_frames = hasattr(CameraFrame, "telescope_pointing")
+
+
+def offset_direction(alt, az, offset, position_angle):
+    """
+    Direction at the angular distance offset from (alt, az) in the
+    direction of the position angle, all in radians.
+    """
+    offset_alt = np.arcsin(np.sin(alt) * np.cos(offset)
+                           + np.cos(alt) * np.sin(offset) * np.cos(position_angle))
+    offset_az = az + np.arctan2(np.sin(position_angle) * np.sin(offset) * np.cos(alt),
+                                np.cos(offset) - np.sin(alt) * np.sin(offset_alt))
+
+    return offset_alt, offset_az
+
+
+def to_telescope_frame(x, y, focal_length):
+    """
+    Convert gnomonic positions in the focal plane to the mapping of the
+    TelescopeFrame of ctapipe >= 0.6.2: the latitude and longitude of
+    the direction in the frame centred on the pointing scaled with the
+    focal length.
+    """
+    x = x / focal_length
+    y = y / focal_length
+
+    return (focal_length * np.arcsin(x / np.sqrt(1 + x ** 2 + y ** 2)),
+            focal_length * np.arctan(y))
+
+
+@pytest.fixture
+def directions():
+    """
+    Random pointings and directions up to 5 deg away from them.
+    """
+    rng = np.random.RandomState(0)
+    pointing_alt = rng.uniform(np.radians(30), np.radians(85), 20)
+    pointing_az = rng.uniform(0, 2 * np.pi, 20)
+    offset = np.radians(5) * np.sqrt(rng.uniform(0, 1, 20))
+    alt, az = offset_direction(pointing_alt, pointing_az, offset,
+                               rng.uniform(0, 2 * np.pi, 20))
+
+    return alt, az, pointing_alt, pointing_az
+
+
+def test_pointing_in_camera_centre(directions):
+    _, _, pointing_alt, pointing_az = directions
+    x, y = horizon_to_camera(pointing_alt, pointing_az, pointing_alt, pointing_az, 28.0)
+
+    np.testing.assert_allclose(x, 0, atol=1e-12)
+    np.testing.assert_allclose(y, 0, atol=1e-12)
+
+
+def test_gnomonic_distance(directions):
+    alt, az, pointing_alt, pointing_az = directions
+    x, y = horizon_to_camera(alt, az, pointing_alt, pointing_az, 28.0)
+    offset = angular_separation(az, alt, pointing_az, pointing_alt)
+
+    np.testing.assert_allclose(np.hypot(x, y), 28.0 * np.tan(offset), rtol=1e-10)
+
+
+def test_orientation():
+    # above the pointing along x, towards larger azimuth along y
+    x, y = horizon_to_camera(np.array([1.01, 1.0]), np.array([0.5, 0.51]), 1.0, 0.5, 1.0)
+
+    assert (x[0] > 0) and np.isclose(y[0], 0)
+    assert y[1] > 0
+
+
+def test_broadcast(directions):
+    alt, az, pointing_alt, pointing_az = directions
+    focal_length = np.array(FOCAL_LENGTHS)[:, np.newaxis]
+    x, y = horizon_to_camera(alt, az, pointing_alt, pointing_az, focal_length)
+    x_0, y_0 = horizon_to_camera(alt, az, pointing_alt, pointing_az, 1.0)
+
+    assert x.shape == y.shape == (len(FOCAL_LENGTHS), len(alt))
+    np.testing.assert_allclose(x, focal_length * x_0)
+    np.testing.assert_allclose(y, focal_length * y_0)
+
+
+@pytest.mark.parametrize("focal_length", FOCAL_LENGTHS)
+def test_ctapipe(directions, focal_length):
+    alt, az, pointing_alt, pointing_az = directions
+    x, y = horizon_to_camera(alt, az, pointing_alt, pointing_az, focal_length)
+    if telescope_frames:
+        x, y = to_telescope_frame(x, y, focal_length)
+
+    for i in range(len(alt)):
+        pointing = SkyCoord(alt=pointing_alt[i] * u.rad, az=pointing_az[i] * u.rad,
+                            frame=HorizonFrame())
+        if telescope_frames:
+            frame = CameraFrame(focal_length=focal_length * u.m, telescope_pointing=pointing)
+        else:
+            frame = CameraFrame(focal_length=focal_length * u.m, array_direction=pointing,
+                                pointing_direction=pointing)
+
+        cam_coord = SkyCoord(alt=alt[i] * u.rad, az=az[i] * u.rad,
+                             frame=HorizonFrame()).transform_to(frame)
+
+        assert np.hypot(x[i] - cam_coord.x.to_value(u.m),
+                        y[i] - cam_coord.y.to_value(u.m)) < TOLERANCE
+
+
+@pytest.mark.skipif(telescope_frames, reason="get_position_in_cam needs ctapipe < 0.6.2")
+def test_get_position_in_cam(directions):
+    alt, az, pointing_alt, pointing_az = directions
+    optics = SimpleNamespace(equivalent_focal_length=28.0 * u.m)
+
+    for i in range(len(alt)):
+        event = SimpleNamespace(
+            mc=SimpleNamespace(alt=alt[i] * u.rad, az=az[i] * u.rad,
+                               tel={1: SimpleNamespace(altitude_raw=pointing_alt[i],
+                                                       azimuth_raw=pointing_az[i])}),
+            inst=SimpleNamespace(subarray=SimpleNamespace(tel={1: SimpleNamespace(optics=optics)})))
+
+        x, y = LookupGenerator(use_astropy=False).get_positions_in_cam(event, [1])
+        x_ref, y_ref = LookupGenerator(use_astropy=True).get_positions_in_cam(event, [1])
+
+        assert np.hypot(x - x_ref, y - y_ref).max() < TOLERANCE
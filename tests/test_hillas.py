@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy import units as u
+from ctapipe.image import hillas_parameters
+
+from konsta_cta.hillas import hillas_parameters_batch, hillas_container
+
+
+@pytest.fixture
+def camera():
+    """
+    Square camera with 21 x 21 pixels.
+    """
+    pix_x, pix_y = np.meshgrid(np.linspace(-0.5, 0.5, 21), np.linspace(-0.5, 0.5, 21))
+
+    return SimpleNamespace(pix_x=pix_x.ravel() * u.m, pix_y=pix_y.ravel() * u.m)
+
+
+@pytest.fixture
+def images(camera):
+    """
+    Elliptical showers with random position, orientation and size,
+    cleaned with a simple threshold.
+    """
+    rng = np.random.RandomState(0)
+    pix_x = camera.pix_x.value
+    pix_y = camera.pix_y.value
+
+    images = []
+    for _ in range(50):
+        cog_x, cog_y = rng.uniform(-0.3, 0.3, 2)
+        length = rng.uniform(0.05, 0.15)
+        width = length * rng.uniform(0.2, 0.8)
+        psi = rng.uniform(0, np.pi)
+
+        longitudinal = (pix_x - cog_x) * np.cos(psi) + (pix_y - cog_y) * np.sin(psi)
+        transversal = -(pix_x - cog_x) * np.sin(psi) + (pix_y - cog_y) * np.cos(psi)
+        image = (100 + rng.exponential(500)) * np.exp(-0.5 * (longitudinal / length) ** 2
+                                                      - 0.5 * (transversal / width) ** 2)
+        image += rng.normal(0, 2, len(image))
+        images.append(np.where(image > 10, image, 0))
+
+    return np.array(images)
+
+
+def test_ctapipe(camera, images):
+    hillas = hillas_parameters_batch(camera.pix_x.value, camera.pix_y.value, images)
+
+    for par, image in zip(hillas, images):
+        container = hillas_container(par, u.m)
+        reference = hillas_parameters(camera, image)
+
+        for name in ("x", "y", "r", "length", "width"):
+            assert u.isclose(getattr(container, name), getattr(reference, name),
+                             rtol=1e-8, atol=1e-12 * u.m)
+        assert np.isclose(container.intensity, reference.intensity, rtol=1e-12)
+        assert np.isclose(container.phi.rad, reference.phi.rad, rtol=1e-8)
+        assert np.isclose(container.kurtosis, reference.kurtosis, rtol=1e-8)
+
+        # psi of showers along the y-axis is pi / 2 or -pi / 2 depending on
+        # rounding, the sign of the skewness changes with it
+        flip = np.sign(np.cos(container.psi.rad - reference.psi.rad))
+        assert np.isclose(flip * np.tan(container.psi.rad), flip * np.tan(reference.psi.rad),
+                          rtol=1e-8)
+        assert np.isclose(flip * container.skewness, reference.skewness, rtol=1e-8, atol=1e-10)
+
+
+def test_degenerate_images(camera):
+    images = np.zeros((3, len(camera.pix_x)))
+    # single pixel
+    images[1, 100] = 10
+    # all pixels in one row
+    images[2, 21:42] = np.arange(1, 22)
+
+    hillas = hillas_parameters_batch(camera.pix_x.value, camera.pix_y.value, images)
+
+    assert hillas["intensity"][0] == 0
+    for name in hillas.dtype.names[1:]:
+        assert np.isnan(hillas[name][0])
+
+    assert hillas["length"][1] == hillas["width"][1] == 0
+    assert (hillas["length"][2] > 0) and (hillas["width"][2] == 0)
+    assert np.isclose(hillas["y"][2], camera.pix_y.value[21])
+
+
+def test_shape_mismatch(camera):
+    with pytest.raises(AttributeError):
+        hillas_parameters_batch(camera.pix_x.value, camera.pix_y.value, np.zeros((2, 10)))
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from konsta_cta.reco import lookup_base
+from konsta_cta.reco.lookup_base import LookupBase
+from konsta_cta.reco.lut_table import LUTTable, SparseLUTTable, make_table
+
+
+@pytest.fixture
+def dense():
+    """
+    Table with 16 x 16 x 16 bins of which about 5 % are filled.
+    """
+    rng = np.random.RandomState(0)
+    shape = (16, 16, 16)
+
+    counts = np.where(rng.uniform(0, 1, shape) < 0.05, rng.randint(1, 20, shape), 0)
+    values = np.where(counts > 0, rng.exponential(0.01, shape), np.nan)
+    edges = [np.linspace(0, 1, n + 1) for n in shape]
+
+    return LUTTable(counts, edges, values)
+
+
+def assert_tables_equal(table, other):
+    np.testing.assert_array_equal(table.counts, other.counts)
+    np.testing.assert_array_equal(table.values, other.values)
+    for edge, other_edge in zip(table.edges, other.edges):
+        np.testing.assert_array_equal(edge, other_edge)
+
+
+def test_to_dense(dense):
+    sparse = SparseLUTTable.from_dense(dense)
+
+    assert len(sparse.index) == np.count_nonzero(dense.counts)
+    assert_tables_equal(sparse.to_dense(), dense)
+
+
+def test_make_table(dense):
+    assert isinstance(make_table(dense.counts, dense.edges, dense.values), SparseLUTTable)
+    assert isinstance(make_table(dense.counts, dense.edges, dense.values, sparse=False),
+                      LUTTable)
+
+    # tables with less than SPARSE_MIN_SIZE bins are kept dense
+    small = make_table(dense.counts[:4, :4, :4], [edge[:5] for edge in dense.edges],
+                       dense.values[:4, :4, :4])
+    assert isinstance(small, LUTTable)
+
+
+def test_unsorted_index():
+    with pytest.raises(AttributeError):
+        SparseLUTTable([3, 1], [1, 1], [0.1, 0.2], [np.linspace(0, 1, 5)])
+
+
+def test_look_up(dense):
+    sparse = SparseLUTTable.from_dense(dense)
+    rng = np.random.RandomState(1)
+    params = rng.uniform(-0.1, 1.1, (3, 1000))
+
+    for result, expected in zip(LookupBase._look_up_table(sparse, params),
+                                LookupBase._look_up_table(dense, params)):
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_save_load(dense, tmp_path):
+    lut = LookupBase()
+    lut.lookup = {"LSTCam": SparseLUTTable.from_dense(dense)}
+    lut.save(str(tmp_path / "lut.npz"))
+
+    loaded = LookupBase.load(str(tmp_path / "lut.npz"), cache=False)
+
+    assert isinstance(loaded.lookup["LSTCam"], SparseLUTTable)
+    assert_tables_equal(loaded.lookup["LSTCam"], dense)
+
+
+@pytest.mark.parametrize("fill", ["nearest", "invalid"])
+def test_resolve(dense, fill):
+    luts = []
+    for table in (dense, SparseLUTTable.from_dense(dense)):
+        lut = LookupBase()
+        lut.lookup = {"LSTCam": table}
+        lut.resolve(min_stat=5, fill=fill)
+        luts.append(lut)
+
+    for resolved, expected in zip(luts[1].resolved["LSTCam"], luts[0].resolved["LSTCam"]):
+        np.testing.assert_array_equal(resolved, expected)
+
+
+def test_resolve_warns(dense, monkeypatch):
+    monkeypatch.setattr(lookup_base, "RESOLVE_WARN_SIZE", 1000)
+    lut = LookupBase()
+    lut.lookup = {"LSTCam": SparseLUTTable.from_dense(dense)}
+
+    with pytest.warns(UserWarning):
+        lut.resolve(min_stat=5, fill="invalid")
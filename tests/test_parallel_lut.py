@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import tables as tb
+
+from konsta_cta.reco.direction_LUT import LookupGenerator
+
+SIZE_MAX = {"LSTCam": 10000000, "FlashCam": 2000000, "CHEC": 50000}
+
+
+# same columns as DCAFeatures of analyse_file_write_list.py
+class DCAFeatures(tb.IsDescription):
+    intensity = tb.Float32Col(dflt=1, pos=1)
+    width = tb.Float32Col(dflt=1, pos=2)
+    length = tb.Float32Col(dflt=1, pos=3)
+    skewness = tb.Float32Col(dflt=1, pos=4)
+    kurtosis = tb.Float32Col(dflt=1, pos=5)
+    r = tb.Float32Col(dflt=1, pos=6)
+    offangle = tb.Float32Col(dflt=1, pos=7)
+    cam_id = tb.StringCol(dflt=1, pos=8, itemsize=16)
+    dca2 = tb.Float32Col(dflt=1, pos=9)
+
+
+@pytest.fixture(scope="module")
+def dca_lists(tmp_path_factory):
+    """
+    Synthetic DCA feature lists and all of their entries.
+    """
+    rng = np.random.RandomState(0)
+    tmpdir = tmp_path_factory.mktemp("dca_lists")
+
+    files, entries = [], []
+    for i in range(5):
+        with tb.open_file(str(tmpdir / "output{}.h5".format(i)), "w") as h5file:
+            table = h5file.create_table("/", "dca_list", DCAFeatures)
+            rows = np.zeros(2000, dtype=table.dtype)
+            rows["intensity"] = 10 ** rng.uniform(1, 6.5, len(rows))
+            rows["length"] = rng.uniform(0.01, 0.3, len(rows))
+            rows["width"] = rows["length"] * rng.uniform(0, 1, len(rows))
+            rows["cam_id"] = rng.choice(list(SIZE_MAX), len(rows))
+            rows["dca2"] = rng.exponential(0.01, len(rows))
+            table.append(rows)
+
+            files.append(h5file.filename)
+            entries.append(rows)
+
+    return files, np.concatenate(entries)
+
+
+def test_counts(dca_lists):
+    files, entries = dca_lists
+    lut = LookupGenerator.load_data_from_files(files, SIZE_MAX, n_workers=1)
+
+    for cam_id, size_max in SIZE_MAX.items():
+        rows = entries[entries["cam_id"] == cam_id.encode()]
+        sample = np.column_stack([rows["intensity"], rows["width"] / rows["length"]])
+        edges = LookupGenerator.get_bin_edges(size_max, [10, 10])
+
+        np.testing.assert_array_equal(lut.lookup[cam_id].counts,
+                                      np.histogramdd(sample, edges)[0])
+
+
+@pytest.mark.parametrize("n_workers", [2, 3])
+def test_parallel_equals_serial(dca_lists, n_workers):
+    files, _ = dca_lists
+    serial = LookupGenerator.load_data_from_files(files, SIZE_MAX, n_workers=1).accumulator
+    parallel = LookupGenerator.load_data_from_files(files, SIZE_MAX,
+                                                    n_workers=n_workers).accumulator
+
+    assert set(parallel.count) == set(serial.count)
+    for cam_id in serial.count:
+        for name in ("count", "sum", "sumsq"):
+            np.testing.assert_array_equal(getattr(parallel, name)[cam_id],
+                                          getattr(serial, name)[cam_id])